@@ -1,11 +1,26 @@
 from q_learning_agent import QLearningAgent
+from linear_agent import LinearQAgent
+from rng_streams import as_seed_sequence
 
-def build_agents(env):
-    agents = {}
-    for i in env.intersection_ids:
-        agents[i] = QLearningAgent(
-            state_size=env.state_size,
-            action_size=env.action_size,
-            agent_id=i
+AGENT_TYPES = {
+    "tabular": QLearningAgent,
+    "linear": LinearQAgent,
+}
+
+
+def build_agents(env, agent_type="tabular", seed=None, **kwargs):
+    # one agent per intersection of a MultiIntersectionEnv; agent_type
+    # "tabular" (QLearningAgent) or "linear" (LinearQAgent), kwargs go to
+    # the agent constructor. Agent i gets child i of seed.
+    cls = AGENT_TYPES[agent_type]
+    seeds = as_seed_sequence(seed).spawn(env.n)
+    return {
+        i: cls(
+            state_size=env.observation_space.shape[0],
+            action_size=2,
+            agent_id=i,
+            seed=seeds[i],
+            **kwargs
         )
-    return agents
+        for i in range(env.n)
+    }
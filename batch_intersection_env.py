@@ -0,0 +1,206 @@
+import numpy as np
+from gymnasium.spaces import Box
+from rng_streams import BatchBlockStream, as_seed_sequence, make_generator
+from scenarios import get_scenario
+from road_network import LinkBuffers, get_network
+
+
+#          BATCHED TRAFFIC ENVIRONMENT (N INTERSECTIONS)
+#
+# Same dynamics as TrafficIntersectionEnv, but every intersection's state
+# lives in a NumPy array and one step() advances all of them at once.
+# Intersection i draws arrivals from its own generator (a BatchBlockStream
+# row), so it follows exactly the trajectory of a TrafficIntersectionEnv
+# seeded with the same SeedSequence.
+
+class BatchIntersectionEnv:
+    YELLOW = 2
+
+    def __init__(self, n=4, seed=None, seeds=None, scenario=None, network=None):
+        # seeds: one SeedSequence / int per intersection; otherwise they
+        # are spawned from seed. scenario: time-varying demand (scenarios.py)
+        self.n = n
+        self.seed_streams(seed, seeds)
+
+        self.scenario = get_scenario(scenario)
+        if self.scenario is not None:
+            self._demand_base, self._demand_frac = self.scenario.tiled(n)
+
+        # network: discharged vehicles travel to neighbouring intersections
+        # (road_network.py); n may hold several copies of the network
+        self.network = get_network(network)
+        self.links = None
+        if self.network is not None:
+            if n % self.network.n:
+                raise ValueError(f"n={n} is not a multiple of the network's {self.network.n} intersections")
+            self.links = LinkBuffers(self.network.tiled(n // self.network.n))
+
+        self.observation_space = Box(
+            low=np.array([0, 0, 0]),
+            high=np.array([50, 50, 3]),
+            dtype=np.int32
+        )
+
+        # config (matches TrafficIntersectionEnv)
+        self.min_green = 5
+        self.max_red = 20
+        self.yellow_time = 2
+        self.arrival_rate_NS = 0.9
+        self.arrival_rate_EW = 0.1
+        self.pass_rate = 2
+
+        # internal states, one entry per intersection
+        self.queue_NS = np.zeros(n, dtype=np.int64)
+        self.queue_EW = np.zeros(n, dtype=np.int64)
+        self.phase = np.zeros(n, dtype=np.int64)
+        self.next_phase = np.zeros(n, dtype=np.int64)
+        self.phase_timer = np.zeros(n, dtype=np.int64)
+        self.red_timer = np.zeros(n, dtype=np.int64)
+        self.yellow_timer = np.zeros(n, dtype=np.int64)
+        self.timestep = 0
+
+        # stats
+        self.total_waiting_time = np.zeros(n, dtype=np.int64)
+
+        # observation buffer, rewritten in place every step
+        self._obs = np.zeros((n, 3), dtype=np.int32)
+
+    def _get_obs(self):
+        self._obs[:, 0] = self.queue_NS
+        self._obs[:, 1] = self.queue_EW
+        self._obs[:, 2] = self.phase
+        return self._obs.copy()
+
+    def seed_streams(self, seed=None, seeds=None):
+        if seeds is None:
+            seeds = as_seed_sequence(seed).spawn(self.n)
+        self.arrivals = BatchBlockStream([make_generator(s) for s in seeds], 2)
+        self.demand_t = 0
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.seed_streams(seed)
+
+        self.queue_NS[:] = 0
+        self.queue_EW[:] = 0
+        self.phase[:] = 0
+        self.phase_timer[:] = 0
+        self.red_timer[:] = 0
+        self.total_waiting_time[:] = 0
+        self.timestep = 0
+        if self.links is not None:
+            self.links.reset()
+        return self._get_obs(), {}
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        self.timestep += 1
+
+        # clip queues to observation bounds
+        np.clip(self.queue_NS, 0, 50, out=self.queue_NS)
+        np.clip(self.queue_EW, 0, 50, out=self.queue_EW)
+
+        prev_phase = self.phase.copy()
+
+        # ----------------------------
+        # Phase control logic
+        # ----------------------------
+
+        # yellow countdown → switch to the pending green
+        in_yellow = prev_phase == self.YELLOW
+        self.yellow_timer[in_yellow] += 1
+        to_green = in_yellow & (self.yellow_timer >= self.yellow_time)
+        self.phase[to_green] = self.next_phase[to_green]
+        self.phase_timer[to_green] = 0
+        self.red_timer[to_green] = 0
+        self.yellow_timer[to_green] = 0
+
+        # normal control for everything not in yellow
+        active = ~in_yellow
+        self.red_timer[active] += 1
+
+        wants_switch = active & (actions != prev_phase)
+        can_switch = self.phase_timer >= self.min_green
+        start_yellow = wants_switch & can_switch
+        # phase_timer only advances when no yellow is started
+        self.phase_timer[active & ~start_yellow] += 1
+
+        self.phase[start_yellow] = self.YELLOW
+        self.next_phase[start_yellow] = actions[start_yellow]
+        self.yellow_timer[start_yellow] = 0
+
+        # force switch if max-red exceeded
+        forced = (
+            active
+            & (self.red_timer >= self.max_red)
+            & (self.phase_timer >= self.min_green)
+        )
+        self.phase[forced] = self.YELLOW
+        self.next_phase[forced] = 1 - prev_phase[forced]
+        self.yellow_timer[forced] = 0
+
+        # ----------------------------
+        # Traffic dynamics
+        # ----------------------------
+
+        # spawn vehicles: column 0 = NS stream, column 1 = EW stream
+        draws = self.arrivals.take(1)[:, 0]
+        if self.scenario is None:
+            self.queue_NS += draws[:, 0] < self.arrival_rate_NS
+            self.queue_EW += draws[:, 1] < self.arrival_rate_EW
+        else:
+            t = self.demand_t % self.scenario.horizon
+            arrivals = self._demand_base[t] + (draws < self._demand_frac[t])
+            self.queue_NS += arrivals[:, 0]
+            self.queue_EW += arrivals[:, 1]
+            self.demand_t += 1
+
+        # vehicles pass ONLY during green
+        ns_green = self.phase == 0
+        ew_green = self.phase == 1
+        if self.links is None:
+            self.queue_NS[ns_green] = np.maximum(0, self.queue_NS[ns_green] - self.pass_rate)
+            self.queue_EW[ew_green] = np.maximum(0, self.queue_EW[ew_green] - self.pass_rate)
+        else:
+            self._network_flow(ns_green, ew_green)
+
+        # ----------------------------
+        # Reward
+        # ----------------------------
+
+        waiting = self.queue_NS + self.queue_EW
+        rewards = -0.1 * waiting
+
+        # stats
+        self.total_waiting_time += waiting
+
+        terminated = np.zeros(self.n, dtype=bool)
+        truncated = np.zeros(self.n, dtype=bool)
+
+        return self._get_obs(), rewards, terminated, truncated, {}
+
+    def _network_flow(self, ns_green, ew_green):
+        # queues as slots (junction * 2 + approach), see road_network.py
+        queues = np.stack([self.queue_NS, self.queue_EW], axis=1).reshape(-1)
+        queues += self.links.deliver(len(queues))
+
+        green = np.stack([ns_green, ew_green], axis=1).reshape(-1)
+        wanted = np.where(green, np.minimum(queues, self.pass_rate), 0)
+        discharged = np.minimum(wanted, self.links.room(queues)).astype(np.int64)
+        queues -= discharged
+        self.links.send(discharged)
+
+        queues = queues.reshape(-1, 2)
+        self.queue_NS[:] = queues[:, 0]
+        self.queue_EW[:] = queues[:, 1]
+
+    def render(self):
+        for i in range(self.n):
+            print(
+                f"[{i}] t={self.timestep} | "
+                f"Phase={self.phase[i]} | "
+                f"NS={self.queue_NS[i]} EW={self.queue_EW[i]}"
+            )
+
+    def close(self):
+        pass
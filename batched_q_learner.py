@@ -0,0 +1,195 @@
+import numpy as np
+from q_learning_agent import QLearningAgent
+from discretizer import StateDiscretizer
+from rng_streams import BatchBlockStream, as_seed_sequence, make_generator
+
+
+#          BATCHED MULTI-AGENT Q-LEARNING
+#
+# Every agent's Q-table is one slice of a stacked
+# (n_agents, num_states, action_size) array, so epsilon-greedy selection
+# and the TD update for all agents are a handful of fancy-indexed NumPy
+# ops per step instead of 2 * n_agents Python method calls.
+# Hyperparameters may be scalars or per-agent sequences.
+#
+# States may also carry a leading batch axis, (num_envs, n_agents), when
+# several environment copies run in lockstep (or for a replay minibatch).
+# All TD errors are taken against the Q-table before the update, so when
+# several transitions hit the same (agent, state, action) their steps are
+# averaged, not summed: summing K steps computed from the same stale Q
+# moves the entry by K * alpha * (mean target - Q), which overshoots and
+# diverges once K * alpha > 2. Epsilon still decays once per selection
+# call.
+#
+# Agent i draws exploration from its own stream (seeds[i]), consuming one
+# (explore?, random action) pair per selection and copy, exactly like a
+# QLearningAgent with the same seed.
+
+class BatchedQLearner:
+    def __init__(
+        self,
+        n_agents,
+        discretizer,
+        action_size,
+        alpha=0.1,
+        gamma=0.99,
+        epsilon=1.0,
+        epsilon_min=0.05,
+        epsilon_decay=0.995,
+        dtype=np.float64,
+        seed=None,
+        seeds=None
+    ):
+        self.n_agents = n_agents
+        self.action_size = action_size
+        self.dtype = np.dtype(dtype)
+
+        # per-agent hyperparameters
+        self.alpha = self._per_agent(alpha)
+        self.gamma = self._per_agent(gamma)
+        self.epsilon = self._per_agent(epsilon)
+        self.epsilon_min = self._per_agent(epsilon_min)
+        self.epsilon_decay = self._per_agent(epsilon_decay)
+
+        # discretizer, or per-dimension highs for one bin per integer value
+        if not isinstance(discretizer, StateDiscretizer):
+            discretizer = StateDiscretizer.from_bounds(discretizer)
+        if not discretizer.clip:
+            raise ValueError("BatchedQLearner needs a clipping discretizer (every obs must map to a row)")
+        self.discretizer = discretizer
+        self.num_states = discretizer.num_states
+
+        self.q = np.zeros((n_agents, self.num_states, action_size), dtype=self.dtype)
+        self.visited = np.zeros((n_agents, self.num_states), dtype=bool)
+        # rows updated since the last checkpoint save, per agent
+        self.dirty = np.zeros((n_agents, self.num_states), dtype=bool)
+
+        self._agents = np.arange(n_agents)
+
+        if seeds is None:
+            seeds = as_seed_sequence(seed).spawn(n_agents)
+        self.stream = BatchBlockStream([make_generator(s) for s in seeds], 2)
+
+    def _per_agent(self, value):
+        return np.broadcast_to(np.asarray(value, dtype=np.float64), (self.n_agents,)).copy()
+
+    def encode(self, obs):
+        # obs: (..., state_dim) → state ids
+        return self.discretizer.encode_batch(obs)
+
+    def select_actions(self, states):
+        # states: ([num_envs,] n_agents) state ids → actions of the same shape
+        self.visited[self._agents, states] = True
+
+        greedy = self.q[self._agents, states].argmax(axis=-1)
+
+        # (n_agents, copies, 2) → per-copy rows in the states' layout
+        copies = states.size // self.n_agents
+        draws = self.stream.take(copies)
+        if states.ndim == 1:
+            draws = draws[:, 0]
+        else:
+            draws = draws.transpose(1, 0, 2)
+        explore = draws[..., 0] < self.epsilon
+        random_actions = (draws[..., 1] * self.action_size).astype(np.int64)
+        actions = np.where(explore, random_actions, greedy)
+
+        # epsilon decay, once per selection like QLearningAgent
+        self.epsilon = np.maximum(self.epsilon_min, self.epsilon * self.epsilon_decay)
+
+        return actions
+
+    def update(self, states, actions, rewards, next_states, weights=None):
+        # one TD step per transition: arrays are ([batch,] n_agents), the
+        # batch being lockstep copies or a replay minibatch; weights
+        # (batch,) scale each transition's step (importance sampling).
+        # Returns the TD errors.
+        self.visited[self._agents, next_states] = True
+        self.dirty[self._agents, states] = True
+
+        best_next = self.q[self._agents, next_states].max(axis=-1)
+        td_target = rewards + self.gamma * best_next
+        td_error = td_target - self.q[self._agents, states, actions]
+
+        step = self.alpha * td_error
+        if weights is not None:
+            step = step * np.asarray(weights)[:, None]
+
+        if states.ndim == 1:
+            self.q[self._agents, states, actions] += step
+        else:
+            # rows may hit the same (agent, state, action): average them
+            agents = np.broadcast_to(self._agents, states.shape)
+            flat = np.ravel_multi_index((agents, states, actions), self.q.shape).ravel()
+            cells, inverse, counts = np.unique(flat, return_inverse=True, return_counts=True)
+            total = np.bincount(inverse, weights=step.ravel(), minlength=len(cells))
+            self.q.reshape(-1)[cells] += (total / counts).astype(self.dtype)
+        return td_error
+
+    def num_states_seen(self):
+        return self.visited.sum(axis=1)
+
+    # ----------------------------
+    # Conversion to / from per-agent objects
+    # ----------------------------
+
+    def to_agents(self):
+        # QLearningAgents whose dense tables are views into self.q, so they
+        # always see the latest values without copying
+        agents = {}
+        for i in range(self.n_agents):
+            agent = QLearningAgent(
+                state_size=self.num_states,
+                action_size=self.action_size,
+                agent_id=i,
+                alpha=float(self.alpha[i]),
+                gamma=float(self.gamma[i]),
+                epsilon=float(self.epsilon[i]),
+                epsilon_min=float(self.epsilon_min[i]),
+                epsilon_decay=float(self.epsilon_decay[i]),
+                dtype=self.dtype
+            )
+            agent.discretizer = self.discretizer
+            agent.num_states = self.num_states
+            agent.q_dense = self.q[i]
+            agent.visited = self.visited[i]
+            agent.dirty = self.dirty[i]
+            agent._index_cache = {}
+            agent.stream = self.stream.stream(i)
+            agents[i] = agent
+        return agents
+
+    def sync_epsilons(self, agents):
+        for i, agent in agents.items():
+            agent.epsilon = float(self.epsilon[i])
+
+    def sync_streams(self, agents):
+        # hand each agent a copy of its stream continuing from here
+        for i, agent in agents.items():
+            agent.stream = self.stream.stream(i)
+
+    @classmethod
+    def from_agents(cls, agents):
+        # stack dense QLearningAgents that share the same discretizer
+        ids = sorted(agents)
+        first = agents[ids[0]]
+        if any(not agents[i].dense or agents[i].discretizer != first.discretizer for i in ids):
+            raise ValueError("from_agents needs dense agents with identical discretizers")
+
+        learner = cls(
+            n_agents=len(ids),
+            discretizer=first.discretizer,
+            action_size=first.action_size,
+            alpha=[agents[i].alpha for i in ids],
+            gamma=[agents[i].gamma for i in ids],
+            epsilon=[agents[i].epsilon for i in ids],
+            epsilon_min=[agents[i].epsilon_min for i in ids],
+            epsilon_decay=[agents[i].epsilon_decay for i in ids],
+            dtype=first.dtype
+        )
+        for k, i in enumerate(ids):
+            learner.q[k] = agents[i].q_dense
+            learner.visited[k] = agents[i].visited
+            learner.dirty[k] = agents[i].dirty
+        learner.stream = BatchBlockStream.from_streams([agents[i].stream for i in ids])
+        return learner
@@ -0,0 +1,447 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from traffic_env import TrafficIntersectionEnv
+from multi_intersection_env import MultiIntersectionEnv
+from q_learning_agent import QLearningAgent
+from batched_q_learner import BatchedQLearner
+from linear_agent import LinearQAgent
+from replay_buffer import ReplayBuffer
+from greedy_policy import GreedyPolicy
+from marl_trainer import MARLTrainer
+from discretizer import log_queue_discretizer
+from reward_mixing import make_mixer
+from checkpoint import save_agents, load_agents
+from mock_traci import MockTraci
+from sumo_eval import run_sumo_eval
+from sumo_fixed_eval import run_fixed_gui
+from sumo_trace import TraceRecorder, TraceReplay
+
+
+# ============================================================
+# BENCHMARK SUITE
+# ============================================================
+# Each benchmark returns (ops, unit) after doing its work; the runner
+# times it (best of --repeat runs), measures peak traced memory in a
+# separate pass, and reports ops/sec. Results are saved as JSON and can be compared against a
+# stored baseline: a rate more than --threshold below the baseline is
+# flagged as a regression (exit code 1).
+#
+#   python benchmarks.py --out bench_results.json
+#   python benchmarks.py --baseline bench_baseline.json
+#   python benchmarks.py --only multi_env
+
+TLS_TO_AGENT = {"J1": 0, "J2": 1, "J3": 2, "J4": 3}
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+# ----------------------------
+# Environments
+# ----------------------------
+
+@benchmark("env_single_step")
+def bench_env_single(scale):
+    env = TrafficIntersectionEnv(seed=0)
+    env.reset()
+    steps = 20000 * scale
+    for t in range(steps):
+        env.step(t // 10 % 2)
+    return steps, "steps"
+
+
+def _multi_env_loop(n, scale):
+    env = MultiIntersectionEnv(n=n, seed=0)
+    env.reset()
+    steps = max(2, 20000 * scale // n)
+    actions = {i: 0 for i in range(n)}
+    for _ in range(steps):
+        env.step(actions)
+    return steps * n, "intersection-steps"
+
+
+def _multi_env_batch(n, scale, scenario=None, network=None):
+    env = MultiIntersectionEnv(n=n, vectorized=True, seed=0, scenario=scenario, network=network)
+    env.reset_batch()
+    steps = max(20, 200000 * scale // n)
+    actions = np.zeros(n, dtype=np.int64)
+    for _ in range(steps):
+        env.step_batch(actions)
+    return steps * n, "intersection-steps"
+
+
+for _n in (4, 64, 1024):
+    benchmark(f"multi_env_loop_{_n}")(lambda scale, n=_n: _multi_env_loop(n, scale))
+    benchmark(f"multi_env_batch_{_n}")(lambda scale, n=_n: _multi_env_batch(n, scale))
+
+
+@benchmark("multi_env_batch_64_rush_hour")
+def bench_multi_env_scenario(scale):
+    return _multi_env_batch(64, scale, scenario="rush_hour")
+
+
+@benchmark("multi_env_batch_64_network")
+def bench_multi_env_network(scale):
+    # 16 copies of the coupled 4-junction SUMO grid
+    return _multi_env_batch(64, scale, network="sumo")
+
+
+def _reward_mixing(spec, scale, n=4096):
+    mixer = make_mixer(spec, n)
+    rewards = np.random.default_rng(0).normal(size=n)
+    steps = 2000 * scale
+    for _ in range(steps):
+        mixer.mix(rewards)
+    return steps * n, "rewards"
+
+
+for _spec in ("global", "1hop", "distance"):
+    benchmark(f"reward_mixing_4096_{_spec}")(lambda scale, spec=_spec: _reward_mixing(spec, scale))
+
+
+# ----------------------------
+# Agents
+# ----------------------------
+
+def _transitions(count, seed=0):
+    rng = np.random.default_rng(seed)
+    obs = rng.integers(0, 52, size=(count + 1, 3))
+    obs[:, 2] %= 3
+    states = [tuple(o) for o in obs.astype(np.int32)]
+    actions = rng.integers(0, 2, size=count).tolist()
+    rewards = (-0.1 * obs[1:, :2].sum(axis=1)).tolist()
+    return states, actions, rewards
+
+
+def _agent_updates(agent, scale):
+    count = 20000 * scale
+    states, actions, rewards = _transitions(count)
+    for t in range(count):
+        agent.select_action(states[t])
+        agent.update(states[t], actions[t], rewards[t], states[t + 1])
+    return count, "updates"
+
+
+@benchmark("agent_update_dict")
+def bench_agent_dict(scale):
+    return _agent_updates(QLearningAgent(3, 2, seed=0), scale)
+
+
+@benchmark("agent_update_dense")
+def bench_agent_dense(scale):
+    return _agent_updates(QLearningAgent(3, 2, state_bounds=(50, 50, 3), seed=0), scale)
+
+
+@benchmark("agent_update_discretized")
+def bench_agent_discretized(scale):
+    return _agent_updates(QLearningAgent(3, 2, discretizer=log_queue_discretizer(), seed=0), scale)
+
+
+@benchmark("agent_update_linear")
+def bench_agent_linear(scale):
+    return _agent_updates(LinearQAgent(3, 2, seed=0), scale)
+
+
+@benchmark("agent_update_linear_minibatch_256")
+def bench_agent_linear_batch(scale):
+    agent = LinearQAgent(3, 2, seed=0)
+    count = 20000 * scale
+    states, actions, rewards = _transitions(count)
+    states = np.array(states)
+    actions = np.array(actions)
+    rewards = np.array(rewards)
+    for start in range(0, count, 256):
+        end = min(start + 256, count)
+        agent.update_batch(states[start:end], actions[start:end], rewards[start:end], states[start + 1:end + 1])
+    return count, "updates"
+
+
+def _replay(scale, prioritized):
+    # one add + one 32-row minibatch (+ priority update) per step
+    buffer = ReplayBuffer(50000, 4, prioritized=prioritized, seed=0)
+    rng = np.random.default_rng(0)
+    ids = rng.integers(0, 500, size=(4,))
+    rewards = rng.random(4)
+    td_error = rng.random((32, 4))
+    steps = 5000 * scale
+    for _ in range(steps):
+        buffer.add(ids, ids, rewards, ids)
+        idx, rows, weights = buffer.sample(32)
+        buffer.update_priorities(idx, td_error)
+    return steps, "steps"
+
+
+@benchmark("replay_uniform")
+def bench_replay_uniform(scale):
+    return _replay(scale, prioritized=False)
+
+
+@benchmark("replay_prioritized")
+def bench_replay_prioritized(scale):
+    return _replay(scale, prioritized=True)
+
+
+def _frozen_policy():
+    discretizer = log_queue_discretizer()
+    actions = np.random.default_rng(0).integers(0, 2, size=(4, discretizer.num_states))
+    return GreedyPolicy(actions, discretizer)
+
+
+@benchmark("policy_act")
+def bench_policy_act(scale):
+    policy = _frozen_policy()
+    count = 200000 * scale
+    states, _, _ = _transitions(1000)
+    for t in range(count):
+        policy.act(t & 3, states[t % 1000])
+    return count, "decisions"
+
+
+@benchmark("policy_select_actions_1024")
+def bench_policy_batch(scale):
+    policy = _frozen_policy()
+    rng = np.random.default_rng(0)
+    ids = rng.integers(0, 4, size=1024)
+    states = rng.integers(0, 52, size=(1024, 3))
+    states[:, 2] %= 3
+    calls = 200 * scale
+    for _ in range(calls):
+        policy.select_actions(ids, states)
+    return calls * 1024, "decisions"
+
+
+@benchmark("batched_learner_update_64")
+def bench_batched_learner(scale):
+    n_agents = 64
+    learner = BatchedQLearner(n_agents, log_queue_discretizer(), 2, seed=0)
+    rng = np.random.default_rng(0)
+    steps = 2000 * scale
+    ids = rng.integers(0, learner.num_states, size=(steps + 1, n_agents))
+    rewards = rng.random((steps, n_agents))
+    for t in range(steps):
+        actions = learner.select_actions(ids[t])
+        learner.update(ids[t], actions, rewards[t], ids[t + 1])
+    return steps * n_agents, "updates"
+
+
+# ----------------------------
+# Training
+# ----------------------------
+
+def _trainer_episodes(scale, **kwargs):
+    episodes = 4 * scale * kwargs.get("num_envs", 1)
+    trainer = MARLTrainer(n_agents=4, episodes=episodes, max_steps=200, seed=0, verbose=False, **kwargs)
+    trainer.train()
+    return episodes, "episodes"
+
+
+@benchmark("trainer_episode_serial")
+def bench_trainer_serial(scale):
+    return _trainer_episodes(scale)
+
+
+@benchmark("trainer_episode_batched")
+def bench_trainer_batched(scale):
+    return _trainer_episodes(scale, batched=True)
+
+
+@benchmark("trainer_episode_batched_replay")
+def bench_trainer_replay(scale):
+    return _trainer_episodes(scale, batched=True, replay_capacity=50000, replay_batch=32, replay_ratio=4)
+
+
+@benchmark("trainer_episode_lockstep_16")
+def bench_trainer_lockstep(scale):
+    return _trainer_episodes(scale, num_envs=16)
+
+
+# ----------------------------
+# Checkpoints
+# ----------------------------
+
+@benchmark("checkpoint_load")
+def bench_checkpoint_load(scale):
+    trainer = MARLTrainer(n_agents=4, episodes=1, batched=True, seed=0, verbose=False)
+    trainer.learner.q[:] = np.random.default_rng(0).random(trainer.learner.q.shape)
+    path = tempfile.mkdtemp(prefix="bench_ckpt_")
+    try:
+        save_agents(trainer.agents, path)
+        loads = 50 * scale
+        for _ in range(loads):
+            load_agents(path, mmap=True)
+        return loads, "loads"
+    finally:
+        shutil.rmtree(path)
+
+
+# ----------------------------
+# SUMO evaluation (stubbed TraCI)
+# ----------------------------
+
+@benchmark("sumo_eval_mock")
+def bench_sumo_eval(scale):
+    agents = {i: QLearningAgent(3, 2, epsilon=0.0, discretizer=log_queue_discretizer(), seed=i) for i in range(4)}
+    steps = 1000 * scale
+    run_sumo_eval(agents, TLS_TO_AGENT, "mock.sumocfg", steps=steps, conn=MockTraci(), profile="fast")
+    return steps, "sim-steps"
+
+
+@benchmark("sumo_eval_mock_policy")
+def bench_sumo_eval_policy(scale):
+    agents = {i: QLearningAgent(3, 2, epsilon=0.0, discretizer=log_queue_discretizer(), seed=i) for i in range(4)}
+    steps = 1000 * scale
+    run_sumo_eval(GreedyPolicy.from_agents(agents), TLS_TO_AGENT, "mock.sumocfg", steps=steps, conn=MockTraci(), profile="fast")
+    return steps, "sim-steps"
+
+
+@benchmark("sumo_fixed_eval_mock")
+def bench_sumo_fixed(scale):
+    steps = 1000 * scale
+    run_fixed_gui("mock.sumocfg", steps=steps, conn=MockTraci(), profile="fast")
+    return steps, "sim-steps"
+
+
+_TRACES = {}
+
+
+def _mock_trace(steps):
+    # recorded once per size and reused across the repeats of a benchmark,
+    # so replay runs time only the Python side
+    trace = _TRACES.get(steps)
+    if trace is None:
+        trace = _TRACES[steps] = tempfile.TemporaryDirectory(prefix="bench_trace_")
+        conn = TraceRecorder(os.path.join(trace.name, "trace"), MockTraci())
+        run_fixed_gui("mock.sumocfg", steps=steps, conn=conn, profile="fast")
+    return os.path.join(trace.name, "trace")
+
+
+def _drop_traces():
+    for trace in _TRACES.values():
+        trace.cleanup()
+    _TRACES.clear()
+
+
+@benchmark("sumo_eval_replay")
+def bench_sumo_eval_replay(scale):
+    agents = {i: QLearningAgent(3, 2, epsilon=0.0, discretizer=log_queue_discretizer(), seed=i) for i in range(4)}
+    steps = 1000 * scale
+    conn = TraceReplay(_mock_trace(steps))
+    run_sumo_eval(GreedyPolicy.from_agents(agents), TLS_TO_AGENT, "mock.sumocfg", steps=steps, conn=conn, profile="fast")
+    return steps, "sim-steps"
+
+
+@benchmark("sumo_fixed_eval_replay")
+def bench_sumo_fixed_replay(scale):
+    steps = 1000 * scale
+    run_fixed_gui("mock.sumocfg", steps=steps, conn=TraceReplay(_mock_trace(steps)), profile="fast")
+    return steps, "sim-steps"
+
+
+# ============================================================
+# RUNNER
+# ============================================================
+
+def run_benchmark(name, scale=1, repeat=3):
+    fn = BENCHMARKS[name]
+
+    try:
+        seconds = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            ops, unit = fn(scale)
+            seconds = min(seconds, time.perf_counter() - start)
+
+        # second pass under tracemalloc for peak memory (slower, not timed)
+        tracemalloc.start()
+        fn(scale)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        _drop_traces()
+
+    return {
+        "ops": ops,
+        "unit": unit,
+        "seconds": seconds,
+        "rate": ops / seconds,
+        "peak_memory_bytes": peak,
+    }
+
+
+def run_suite(names=None, scale=1, repeat=3):
+    names = names or list(BENCHMARKS)
+    results = {}
+    for name in names:
+        results[name] = run_benchmark(name, scale=scale, repeat=repeat)
+        r = results[name]
+        print(f"{name:32s} {r['rate']:14,.1f} {r['unit']}/s   peak {r['peak_memory_bytes'] / 1e6:8.2f} MB")
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "scale": scale,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold=0.2):
+    # names whose rate dropped more than `threshold` below the baseline
+    regressions = []
+    for name, r in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        change = r["rate"] / base["rate"] - 1.0
+        flag = "REGRESSION" if change < -threshold else ""
+        print(f"{name:32s} {change:+8.1%} {flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark envs, agents, training and evaluation")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", default=None, help="JSON from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative slowdown")
+    parser.add_argument("--scale", type=int, default=1, help="multiply the work per benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark (best is kept)")
+    parser.add_argument("--only", default=None, help="run benchmarks whose name contains this")
+    parser.add_argument("--list", action="store_true")
+    args = parser.parse_args()
+
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        raise SystemExit(0)
+
+    if args.baseline and not os.path.exists(args.baseline):
+        raise SystemExit(f"baseline {args.baseline} not found")
+
+    names = [n for n in BENCHMARKS if args.only is None or args.only in n]
+    current = run_suite(names, scale=args.scale, repeat=args.repeat)
+
+    with open(args.out, "w") as f:
+        json.dump(current, f, indent=2)
+    print(f"Saved {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(current, baseline, args.threshold):
+            raise SystemExit(1)
@@ -0,0 +1,463 @@
+import json
+import os
+import shutil
+
+import numpy as np
+from q_learning_agent import QLearningAgent
+from linear_agent import LinearQAgent, TileCoder
+from discretizer import StateDiscretizer
+from greedy_policy import GreedyPolicy
+
+
+# ============================================================
+# AGENT CHECKPOINTS
+# ============================================================
+# A checkpoint is a directory:
+#
+#   header.json       agent ids, hyperparameters, discretizer, dtype
+#   q.npy             (n_agents, num_states, actions) dense Q-tables
+#   visited.npy       (n_agents, num_states) rows touched in training
+#   keys_<k>.npy      dict-stored states of agent k, (n, state_dim)
+#   values_<k>.npy    their Q-values, (n, actions)
+#
+# Linear agents (linear_agent.LinearQAgent) store weights.npy, stacked
+# (n_agents, memory_size, actions), and touched.npy instead of the
+# Q-tables; the header names the agent type and the tile coder.
+#
+# q.npy is a plain .npy file, so evaluators can memory-map it and start
+# acting immediately, and several worker processes share one copy of the
+# tables through the page cache. Nothing is unpickled on load.
+
+FORMAT_VERSION = 1
+
+HYPERPARAMS = ("alpha", "gamma", "epsilon", "epsilon_min", "epsilon_decay")
+
+
+def _discretizer_to_json(discretizer):
+    if discretizer is None:
+        return None
+    return {
+        "bin_edges": [e.tolist() for e in discretizer.bin_edges],
+        "max_values": list(discretizer.max_values),
+        "clip": discretizer.clip,
+    }
+
+
+def _discretizer_from_json(data):
+    if data is None:
+        return None
+    return StateDiscretizer(data["bin_edges"], data["max_values"], clip=data["clip"])
+
+
+def _agent_type(agent):
+    return "linear" if isinstance(agent, LinearQAgent) else "tabular"
+
+
+def _array_table(agent):
+    # (values, rows in use) of a dense or linear agent, else None
+    if isinstance(agent, LinearQAgent):
+        return agent.weights, agent.touched
+    if agent.dense:
+        return agent.q_dense, agent.visited
+    return None
+
+
+def _dict_table(agent):
+    return getattr(agent, "q_table", {})
+
+
+def _clear_dirty(agent):
+    # after a checkpoint save: nothing written since
+    if _array_table(agent) is not None:
+        agent.dirty[:] = False
+    if hasattr(agent, "dirty_keys"):
+        agent.dirty_keys.clear()
+
+
+def _agent_header(agents, ids):
+    return [
+        {
+            "agent_id": i,
+            "state_size": int(agents[i].state_size),
+            "action_size": int(agents[i].action_size),
+            **{h: float(getattr(agents[i], h)) for h in HYPERPARAMS},
+        }
+        for i in ids
+    ]
+
+
+def _save_linear_agents(agents, ids, path):
+    first = agents[ids[0]]
+    if any(_agent_type(agents[i]) != "linear" or agents[i].tile_coder != first.tile_coder for i in ids):
+        raise ValueError("linear agents in one checkpoint must share a tile coder")
+    np.save(os.path.join(path, "weights.npy"), np.stack([agents[i].weights for i in ids]))
+    np.save(os.path.join(path, "touched.npy"), np.stack([agents[i].touched for i in ids]))
+
+    header = {
+        "format": FORMAT_VERSION,
+        "agent_type": "linear",
+        "dtype": first.dtype.str,
+        "tile_coder": first.tile_coder.to_json(),
+        "agents": _agent_header(agents, ids),
+    }
+    with open(os.path.join(path, "header.json"), "w") as f:
+        json.dump(header, f, indent=2)
+
+
+def _load_linear_agents(header, path, mmap):
+    dtype = np.dtype(header["dtype"])
+    tile_coder = TileCoder.from_json(header["tile_coder"])
+    weights = np.load(os.path.join(path, "weights.npy"), mmap_mode="r" if mmap else None)
+    touched = np.load(os.path.join(path, "touched.npy"))
+
+    agents = {}
+    for k, meta in enumerate(header["agents"]):
+        agent = LinearQAgent(
+            state_size=meta["state_size"],
+            action_size=meta["action_size"],
+            agent_id=meta["agent_id"],
+            tile_coder=tile_coder,
+            dtype=dtype,
+            **{h: meta[h] for h in HYPERPARAMS}
+        )
+        agent.weights = weights[k]
+        agent.touched = touched[k]
+        agents[meta["agent_id"]] = agent
+    return agents
+
+
+def save_agents(agents, path):
+    # agents: {agent_id: QLearningAgent or LinearQAgent}, all of one type;
+    # dense agents must share a discretizer, linear ones a tile coder
+    os.makedirs(path, exist_ok=True)
+    ids = list(agents)
+    first = agents[ids[0]]
+
+    if _agent_type(first) == "linear":
+        _save_linear_agents(agents, ids, path)
+        return
+    if any(_agent_type(agents[i]) != "tabular" for i in ids):
+        raise ValueError("cannot mix linear and tabular agents in one checkpoint")
+
+    if first.dense:
+        if any(not agents[i].dense or agents[i].discretizer != first.discretizer for i in ids):
+            raise ValueError("dense agents in one checkpoint must share a discretizer")
+        np.save(os.path.join(path, "q.npy"), np.stack([agents[i].q_dense for i in ids]))
+        np.save(os.path.join(path, "visited.npy"), np.stack([agents[i].visited for i in ids]))
+    elif any(agents[i].dense for i in ids):
+        raise ValueError("cannot mix dense and dict-only agents in one checkpoint")
+
+    # dict rows (all of a dict-only agent, or a dense agent's overflow)
+    for k, i in enumerate(ids):
+        table = agents[i].q_table
+        if table:
+            keys = np.array([tuple(int(v) for v in state) for state in table], dtype=np.int64)
+            values = np.stack(list(table.values()))
+        else:
+            keys = np.zeros((0, 0), dtype=np.int64)
+            values = np.zeros((0, first.action_size), dtype=first.dtype)
+        np.save(os.path.join(path, f"keys_{k}.npy"), keys)
+        np.save(os.path.join(path, f"values_{k}.npy"), values)
+
+    header = {
+        "format": FORMAT_VERSION,
+        "dense": first.dense,
+        "dtype": first.dtype.str,
+        "discretizer": _discretizer_to_json(first.discretizer),
+        "agents": _agent_header(agents, ids),
+    }
+    with open(os.path.join(path, "header.json"), "w") as f:
+        json.dump(header, f, indent=2)
+
+
+def load_agents(path, mmap=True):
+    # mmap=True maps q.npy read-only (evaluation); mmap=False loads a
+    # writable copy (e.g. to keep training)
+    with open(os.path.join(path, "header.json")) as f:
+        header = json.load(f)
+    if header["format"] != FORMAT_VERSION:
+        raise ValueError(f"unsupported checkpoint format {header['format']}")
+    if header.get("agent_type", "tabular") == "linear":
+        return _load_linear_agents(header, path, mmap)
+
+    dtype = np.dtype(header["dtype"])
+    discretizer = _discretizer_from_json(header["discretizer"])
+
+    q = visited = None
+    if header["dense"]:
+        q = np.load(os.path.join(path, "q.npy"), mmap_mode="r" if mmap else None)
+        visited = np.load(os.path.join(path, "visited.npy"))
+
+    agents = {}
+    for k, meta in enumerate(header["agents"]):
+        agent = QLearningAgent(
+            state_size=meta["state_size"],
+            action_size=meta["action_size"],
+            agent_id=meta["agent_id"],
+            dtype=dtype,
+            **{h: meta[h] for h in HYPERPARAMS}
+        )
+        if q is not None:
+            agent.discretizer = discretizer
+            agent.num_states = discretizer.num_states
+            agent.q_dense = q[k]
+            agent.visited = visited[k]
+            agent.dirty = np.zeros(agent.num_states, dtype=bool)
+            agent._index_cache = {}
+
+        keys = np.load(os.path.join(path, f"keys_{k}.npy"))
+        values = np.load(os.path.join(path, f"values_{k}.npy"))
+        for key, row in zip(keys.tolist(), values):
+            agent.q_table[tuple(key)] = row.copy()
+
+        agents[meta["agent_id"]] = agent
+    return agents
+
+
+# ============================================================
+# FROZEN POLICIES
+# ============================================================
+# A greedy_policy.GreedyPolicy is saved as
+#
+#   policy.json       agent ids, default action, discretizer
+#   actions.npy       (n_agents, num_states) int8 greedy actions
+#
+# load_policy() memory-maps actions.npy read-only by default, so many
+# evaluation processes share one copy through the page cache.
+
+def is_policy_dir(path):
+    return os.path.exists(os.path.join(path, "policy.json"))
+
+
+def save_policy(policy, path):
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "actions.npy"), np.asarray(policy.actions))
+    header = {
+        "format": FORMAT_VERSION,
+        "agent_ids": list(policy.agent_ids),
+        "default_action": policy.default_action,
+        "discretizer": _discretizer_to_json(policy.discretizer),
+    }
+    with open(os.path.join(path, "policy.json"), "w") as f:
+        json.dump(header, f, indent=2)
+
+
+def load_policy(path, mmap=True):
+    with open(os.path.join(path, "policy.json")) as f:
+        header = json.load(f)
+    if header["format"] != FORMAT_VERSION:
+        raise ValueError(f"unsupported policy format {header['format']}")
+    actions = np.load(os.path.join(path, "actions.npy"), mmap_mode="r" if mmap else None)
+    return GreedyPolicy(
+        actions,
+        _discretizer_from_json(header["discretizer"]),
+        header["agent_ids"],
+        header["default_action"]
+    )
+
+
+# ============================================================
+# RESUMABLE TRAINING CHECKPOINTS
+# ============================================================
+# A training checkpoint directory holds a chain of numbered checkpoints:
+#
+#   ckpt_<n>/
+#     agents/           full save_agents() output   (full checkpoints)
+#     rows_<k>.npy      dense rows (linear agents: weight rows) of agent k
+#     values_<k>.npy    updated since ckpt n-1, and their values (deltas)
+#     visited_<k>.npy   agent k's visited dense rows, bit-packed (deltas)
+#     keys_<k>.npy      changed dict states of agent k,
+#     dict_values_<k>.npy  and their Q-values        (delta checkpoints)
+#     rewards.npy       episode rewards since the previous checkpoint
+#                       (full: the trainer's whole reward history)
+#     rng_rows.npz      unconsumed pre-drawn rows of every random stream
+#     arrays.npz        extra trainer arrays (e.g. the replay buffer,
+#                       whole or the rows added since ckpt n-1)
+#     state.json        kind, episode counter, epsilons, stream generator
+#                       states (see rng_streams), extra trainer state
+#   LATEST              number of the newest complete checkpoint
+#
+# Agents mark the rows (and dict states) their updates write in a dirty
+# mask; lookups (action selection, bootstrap reads) do not. A delta
+# stores those rows and clears the mask, so it costs in proportion to
+# what was learned and no copy of the tables is kept; the visited mask
+# of a dense table, which lookups do change, rides along at one bit per
+# row. Dict rows only ever read are zeros and are recreated on demand.
+# Full checkpoints clear the masks as well. LATEST is replaced only
+# after a checkpoint is fully written, so an interrupted save leaves the
+# previous one usable.
+
+def _ckpt_dir(path, n):
+    return os.path.join(path, f"ckpt_{n:05d}")
+
+
+def latest_checkpoint(path):
+    # number of the newest complete checkpoint, or None
+    try:
+        with open(os.path.join(path, "LATEST")) as f:
+            return int(f.read())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _read_state(path, n):
+    with open(os.path.join(_ckpt_dir(path, n), "state.json")) as f:
+        return json.load(f)
+
+
+class TrainingCheckpointer:
+    def __init__(self, path, agents, full_every=10, resume=False, overwrite=False):
+        # agents: the trainer's live agents (their dirty masks are cleared:
+        # the first delta holds what changed from here on);
+        # full_every: every full_every-th checkpoint is a full one, which
+        # bounds the delta chain a resume has to replay; starting over in a
+        # directory that holds checkpoints needs overwrite=True
+        self.path = path
+        self.full_every = full_every
+        os.makedirs(path, exist_ok=True)
+
+        latest = latest_checkpoint(path) if resume else None
+        if latest is None:
+            old = sorted(name for name in os.listdir(path) if name.startswith("ckpt_") or name == "LATEST")
+            if old and not overwrite:
+                raise ValueError(
+                    f"{path} already holds training checkpoints; resume from them "
+                    "or pass overwrite=True to delete them"
+                )
+            for name in old:
+                if name == "LATEST":
+                    os.remove(os.path.join(path, name))
+                else:
+                    shutil.rmtree(os.path.join(path, name))
+            self.next = 0
+            self.episode = 0
+        else:
+            self.next = latest + 1
+            self.episode = _read_state(path, latest)["episode"]
+
+        for agent in agents.values():
+            _clear_dirty(agent)
+
+    @property
+    def next_full(self):
+        # whether the next save() writes a full checkpoint
+        return self.next % self.full_every == 0
+
+    def save(self, agents, episode, episode_rewards, rng_state=(), extra=None, arrays=None):
+        # rng_state: [(bit generator state, unconsumed rows), ...];
+        # extra: JSON-able trainer state (e.g. the env's demand clock);
+        # arrays: {name: array} trainer state stored as-is; a resume gets
+        # those of the base full checkpoint and every delta after it, so
+        # they may hold only what changed when next_full is False
+        n = self.next
+        out = _ckpt_dir(self.path, n)
+        if os.path.exists(out):
+            shutil.rmtree(out)   # leftover of an interrupted save
+        os.makedirs(out)
+
+        full = self.next_full
+        rewards = list(episode_rewards)
+        if full:
+            save_agents(agents, os.path.join(out, "agents"))
+            for agent in agents.values():
+                _clear_dirty(agent)
+        else:
+            rewards = rewards[max(0, len(rewards) - (episode - self.episode)):]
+            for k, agent in enumerate(agents.values()):
+                self._save_delta(out, k, agent)
+
+        np.save(os.path.join(out, "rewards.npy"), np.asarray(rewards, dtype=np.float64))
+
+        np.savez(os.path.join(out, "rng_rows.npz"), *[rows for _, rows in rng_state])
+        if arrays:
+            np.savez(os.path.join(out, "arrays.npz"), **arrays)
+        state = {
+            "kind": "full" if full else "delta",
+            "episode": int(episode),
+            "epsilon": {str(i): float(agent.epsilon) for i, agent in agents.items()},
+            "rng": [bit_state for bit_state, _ in rng_state],
+            "extra": extra or {},
+        }
+        with open(os.path.join(out, "state.json"), "w") as f:
+            json.dump(state, f, indent=2)
+
+        tmp = os.path.join(self.path, "LATEST.tmp")
+        with open(tmp, "w") as f:
+            f.write(str(n))
+        os.replace(tmp, os.path.join(self.path, "LATEST"))
+
+        self.next = n + 1
+        self.episode = episode
+
+    def _save_delta(self, out, k, agent):
+        table = _array_table(agent)
+        if table is not None:
+            rows = np.flatnonzero(agent.dirty)
+            np.save(os.path.join(out, f"rows_{k}.npy"), rows)
+            np.save(os.path.join(out, f"values_{k}.npy"), table[0][rows])
+            if not isinstance(agent, LinearQAgent):
+                np.save(os.path.join(out, f"visited_{k}.npy"), np.packbits(table[1]))
+
+        q_table = _dict_table(agent)
+        dirty_keys = getattr(agent, "dirty_keys", ())
+        keys = [tuple(int(v) for v in state) for state in dirty_keys]
+        values = [q_table[state] for state in dirty_keys]
+        _clear_dirty(agent)
+        np.save(os.path.join(out, f"keys_{k}.npy"), np.array(keys, dtype=np.int64))
+        np.save(
+            os.path.join(out, f"dict_values_{k}.npy"),
+            np.array(values, dtype=agent.dtype).reshape(-1, agent.action_size)
+        )
+
+
+def load_training_checkpoint(path, n=None):
+    # → (agents, state): agents rebuilt from the newest full checkpoint at
+    # or before n (default LATEST) plus the deltas after it; state holds
+    # the episode counter, epsilons, random stream states and reward history
+    if n is None:
+        n = latest_checkpoint(path)
+    if n is None:
+        raise FileNotFoundError(f"no training checkpoint in {path}")
+
+    base = n
+    while _read_state(path, base)["kind"] != "full":
+        base -= 1
+
+    agents = load_agents(os.path.join(_ckpt_dir(path, base), "agents"), mmap=False)
+    ids = list(agents)
+    rewards = [np.load(os.path.join(_ckpt_dir(path, base), "rewards.npy"))]
+
+    for m in range(base + 1, n + 1):
+        src = _ckpt_dir(path, m)
+        for k, i in enumerate(ids):
+            agent = agents[i]
+            table = _array_table(agent)
+            if table is not None:
+                rows = np.load(os.path.join(src, f"rows_{k}.npy"))
+                table[0][rows] = np.load(os.path.join(src, f"values_{k}.npy"))
+                table[1][rows] = True
+                visited_path = os.path.join(src, f"visited_{k}.npy")
+                if os.path.exists(visited_path):
+                    table[1][:] = np.unpackbits(np.load(visited_path), count=len(table[1])).astype(bool)
+            keys = np.load(os.path.join(src, f"keys_{k}.npy"))
+            values = np.load(os.path.join(src, f"dict_values_{k}.npy"))
+            for key, row in zip(keys.tolist(), values):
+                agent.q_table[tuple(key)] = row.copy()
+        rewards.append(np.load(os.path.join(src, "rewards.npy")))
+
+    state = _read_state(path, n)
+    for i in ids:
+        agents[i].epsilon = state["epsilon"][str(i)]
+
+    with np.load(os.path.join(_ckpt_dir(path, n), "rng_rows.npz")) as rows:
+        state["rng"] = [(bit_state, rows[f"arr_{j}"]) for j, bit_state in enumerate(state["rng"])]
+    state["episode_rewards"] = np.concatenate(rewards).tolist()
+
+    # trainer arrays of checkpoints base..n that saved any, oldest first
+    state["arrays"] = []
+    for m in range(base, n + 1):
+        arrays_path = os.path.join(_ckpt_dir(path, m), "arrays.npz")
+        if os.path.exists(arrays_path):
+            with np.load(arrays_path) as arrays:
+                state["arrays"].append({name: arrays[name] for name in arrays.files})
+    return agents, state
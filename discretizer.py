@@ -0,0 +1,124 @@
+import numpy as np
+
+
+#          STATE DISCRETIZER
+#
+# Maps raw observations (queue_NS, queue_EW, phase) to compact integer
+# state ids. Each dimension has its own bin edges; a value v falls into
+# bin k = number of edges <= v. Bins are combined mixed-radix into one id
+# in [0, num_states).
+#
+# The per-dimension binning is compiled into lookup tables (raw integer
+# value → bin * stride), so a scalar encode is a few list lookups and a
+# batch encode is one gather per dimension.
+#
+# clip=True clamps values outside the table onto the edge bins;
+# clip=False returns -1 for them instead (callers fall back to a dict).
+
+class StateDiscretizer:
+    def __init__(self, bin_edges, max_values, clip=True):
+        # bin_edges[d]: increasing thresholds for dimension d
+        # max_values[d]: largest raw value the lookup table covers
+        self.bin_edges = [np.asarray(e, dtype=np.int64) for e in bin_edges]
+        self.max_values = tuple(int(m) for m in max_values)
+        self.clip = clip
+
+        self.sizes = tuple(len(e) + 1 for e in self.bin_edges)
+        strides = []
+        stride = 1
+        for size in reversed(self.sizes):
+            strides.append(stride)
+            stride *= size
+        self.strides = tuple(reversed(strides))
+        self.num_states = stride
+
+        # compiled lookup tables
+        self._lut_arrays = [
+            np.searchsorted(edges, np.arange(cap + 1), side="right") * s
+            for edges, cap, s in zip(self.bin_edges, self.max_values, self.strides)
+        ]
+        self._luts = [lut.tolist() for lut in self._lut_arrays]
+        self._caps = np.array(self.max_values, dtype=np.int64)
+
+    # pickle only the definition; lookup tables are rebuilt on load
+    def __getstate__(self):
+        return {"bin_edges": self.bin_edges, "max_values": self.max_values, "clip": self.clip}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, StateDiscretizer)
+            and self.max_values == other.max_values
+            and self.clip == other.clip
+            and all(np.array_equal(a, b) for a, b in zip(self.bin_edges, other.bin_edges))
+        )
+
+    def __hash__(self):
+        return hash((self.max_values, self.clip, tuple(tuple(e.tolist()) for e in self.bin_edges)))
+
+    @property
+    def state_dim(self):
+        return len(self.sizes)
+
+    def encode(self, obs):
+        # one observation → state id (or -1 when out of range and clip=False)
+        idx = 0
+        for v, lut, cap in zip(obs, self._luts, self.max_values):
+            v = int(v)
+            if v < 0:
+                if not self.clip:
+                    return -1
+                v = 0
+            elif v > cap:
+                if not self.clip:
+                    return -1
+                v = cap
+            idx += lut[v]
+        return idx
+
+    def encode_batch(self, obs):
+        # (..., state_dim) observations → (...) state ids
+        obs = np.asarray(obs)
+        ids = np.zeros(obs.shape[:-1], dtype=np.int64)
+        for d, lut in enumerate(self._lut_arrays):
+            ids += lut[np.clip(obs[..., d], 0, self.max_values[d])]
+
+        if not self.clip:
+            outside = ((obs < 0) | (obs > self._caps)).any(axis=-1)
+            ids[outside] = -1
+        return ids
+
+    def decode(self, state_id):
+        # state id → per-dimension bin indices
+        bins = []
+        for stride, size in zip(self.strides, self.sizes):
+            bins.append((state_id // stride) % size)
+        return tuple(bins)
+
+    # ----------------------------
+    # Constructors
+    # ----------------------------
+
+    @classmethod
+    def from_bounds(cls, highs, clip=True):
+        # one bin per integer value 0..high in every dimension
+        highs = [int(h) for h in highs]
+        return cls([np.arange(1, h + 1) for h in highs], highs, clip=clip)
+
+
+def log_bins(max_value, n_bins):
+    # bin edges growing geometrically: fine resolution for short queues,
+    # coarse for long ones; always starts with a bin for exactly 0
+    edges = np.unique(np.geomspace(1, max_value + 1, n_bins).astype(np.int64))
+    return edges[edges <= max_value]
+
+
+def log_queue_discretizer(max_queue=51, n_bins=8, n_phases=3):
+    # (queue_NS, queue_EW, phase) with log-binned queues
+    edges = log_bins(max_queue, n_bins)
+    return StateDiscretizer(
+        [edges, edges, np.arange(1, n_phases)],
+        [max_queue, max_queue, n_phases - 1]
+    )
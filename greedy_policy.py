@@ -0,0 +1,140 @@
+import numpy as np
+from discretizer import StateDiscretizer
+from linear_agent import LinearQAgent
+
+
+#          FROZEN GREEDY POLICY
+#
+# Inference-only export of trained agents: one precomputed greedy action
+# per (agent, state id) in a read-only int8 array, plus a default action
+# for states the agent never visited (and, with a non-clipping
+# discretizer, states outside its range).
+#
+# Acting is a table lookup: no RNG draws, no epsilon decay, no Q-table
+# rows created for unseen states, nothing mutated, so one policy can be
+# shared by threads, or memory-mapped by many processes (save_policy /
+# load_policy in checkpoint.py). Greedy ties break towards the lowest
+# action, as in QLearningAgent, and default_action=0 is what an agent's
+# zero-initialized row for an unseen state would pick.
+
+class GreedyPolicy:
+    def __init__(self, actions, discretizer, agent_ids=None, default_action=0):
+        # actions: (n_agents, num_states) greedy action per state id
+        actions = np.asarray(actions, dtype=np.int8)
+        if actions.ndim != 2 or actions.shape[1] != discretizer.num_states:
+            raise ValueError("actions must have shape (n_agents, discretizer.num_states)")
+        if actions.flags.writeable:
+            actions = actions.copy()
+            actions.flags.writeable = False
+
+        self.actions = actions
+        self.discretizer = discretizer
+        self.agent_ids = tuple(range(len(actions)) if agent_ids is None else agent_ids)
+        self.default_action = int(default_action)
+
+        self._row = {agent_id: k for k, agent_id in enumerate(self.agent_ids)}
+        self._identity = self.agent_ids == tuple(range(len(self.agent_ids)))
+        self._tables = [row.tolist() for row in actions]
+        self._luts = discretizer._luts
+
+    @property
+    def n_agents(self):
+        return len(self.agent_ids)
+
+    def act(self, agent_id, state):
+        # one observation → action: a few list lookups, no allocation;
+        # values outside the lookup tables go through encode (clip or -1)
+        idx = 0
+        for v, lut in zip(state, self._luts):
+            if 0 <= v < len(lut):
+                idx += lut[v]
+            else:
+                idx = self.discretizer.encode(state)
+                break
+        if idx < 0:
+            return self.default_action
+        return self._tables[self._row[agent_id]][idx]
+
+    def act_id(self, agent_id, idx):
+        # state id (e.g. from MultiIntersectionEnv with the same
+        # discretizer) → action
+        return self._tables[self._row[agent_id]][idx]
+
+    def select_actions(self, agent_ids, states):
+        # agent_ids (n,), states (n, state_dim) → actions (n,)
+        agent_ids = np.asarray(agent_ids)
+        rows = agent_ids if self._identity else np.array([self._row[i] for i in agent_ids.tolist()])
+        idx = self.discretizer.encode_batch(states)
+        actions = self.actions[rows, np.maximum(idx, 0)].astype(np.int64)
+        actions[idx < 0] = self.default_action
+        return actions
+
+    def agent(self, agent_id):
+        # per-agent view with the select_action(state) interface
+        return _AgentView(self, agent_id)
+
+    # ----------------------------
+    # Export
+    # ----------------------------
+
+    @classmethod
+    def from_agents(cls, agents, discretizer=None, default_action=0):
+        # agents: {agent_id: QLearningAgent or LinearQAgent}.
+        # Dense agents use their own discretizer (and unvisited rows fall
+        # back to default_action); dict-only agents get one bin per value
+        # up to the largest state they saw; linear agents are evaluated at
+        # every state of `discretizer`, which they require.
+        ids = list(agents)
+        first = agents[ids[0]]
+
+        if discretizer is None:
+            if isinstance(first, LinearQAgent):
+                raise ValueError("exporting linear agents needs a discretizer for the state grid")
+            if first.dense:
+                discretizer = first.discretizer
+            else:
+                keys = [state for i in ids for state in agents[i].q_table]
+                highs = np.max(np.array(keys, dtype=np.int64), axis=0) if keys else [0] * first.state_size
+                discretizer = StateDiscretizer.from_bounds(np.maximum(highs, 0), clip=False)
+
+        actions = np.full((len(ids), discretizer.num_states), default_action, dtype=np.int8)
+        for k, i in enumerate(ids):
+            _fill_actions(actions[k], agents[i], discretizer)
+        return cls(actions, discretizer, ids, default_action)
+
+
+class _AgentView:
+    def __init__(self, policy, agent_id):
+        self.policy = policy
+        self.agent_id = agent_id
+
+    def select_action(self, state):
+        return self.policy.act(self.agent_id, state)
+
+
+def bin_values(discretizer):
+    # (num_states, state_dim) representative raw observation of every
+    # state id: the lowest value of each bin
+    grids = []
+    for edges, size in zip(discretizer.bin_edges, discretizer.sizes):
+        grids.append(np.concatenate([[0], edges])[:size])
+    mesh = np.meshgrid(*grids, indexing="ij")
+    return np.stack([m.ravel() for m in mesh], axis=1)
+
+
+def _fill_actions(out, agent, discretizer):
+    if isinstance(agent, LinearQAgent):
+        out[:] = agent.q_values_batch(bin_values(discretizer)).argmax(axis=1)
+        return
+
+    if agent.dense:
+        if agent.discretizer != discretizer:
+            raise ValueError("dense agents must be exported with their own discretizer")
+        visited = np.flatnonzero(agent.visited)
+        out[visited] = agent.q_dense[visited].argmax(axis=1)
+
+    # dict rows: in-range states only
+    for state, row in agent.q_table.items():
+        idx = discretizer.encode(state)
+        if idx >= 0:
+            out[idx] = int(row.argmax())
@@ -1,31 +1,62 @@
-from marl_trainer import MARLTrainer
+from sweep import make_grid, run_sweep, format_results, agents_from_result
 from sumo_eval import run_sumo_eval
+from greedy_policy import GreedyPolicy
 
 GLOBAL_REWARD_WEIGHT = 0.25
 
-for outer in range(3):   # 3 hybrid rounds is enough
-    print(f"\n=== HYBRID ROUND {outer} ===")
-
-    trainer = MARLTrainer(
-        n_agents=4,
-        episodes=300,
-        max_steps=200
-    )
-
-    trainer.env.global_reward_weight = GLOBAL_REWARD_WEIGHT
-    trainer.train()
-
-    metrics = run_sumo_eval(
-        agent=trainer.agents[3],   # one agent is enough
-        sumo_cfg="intersection.sumocfg"
-    )
-
-    print("SUMO metrics:", metrics)
-
-    # Simple heuristic adjustment
-    if metrics["avg_queue"] > 10:
-        GLOBAL_REWARD_WEIGHT += 0.05
-    else:
-        GLOBAL_REWARD_WEIGHT -= 0.02
-
-    GLOBAL_REWARD_WEIGHT = max(0.1, min(GLOBAL_REWARD_WEIGHT, 0.5))
+TLS_TO_AGENT = {"J1": 0, "J2": 1, "J3": 2, "J4": 3}
+
+# later rounds warm-start from the previous round's best agents, so they
+# only need a short fine-tuning run instead of exploring from scratch.
+# Experience replay reuses every transition several times, which reaches
+# the old 300-episode evaluation reward in well under 100 episodes.
+FIRST_ROUND_EPISODES = 100
+WARM_ROUND_EPISODES = 40
+REPLAY = {"replay_capacity": 50000, "replay_batch": 32, "replay_ratio": 4}
+
+if __name__ == "__main__":
+    best = None
+    for outer in range(3):   # 3 hybrid rounds is enough
+        print(f"\n=== HYBRID ROUND {outer} ===")
+
+        # train a small grid around the current weight in parallel
+        grid = make_grid(
+            global_reward_weight=sorted({
+                max(0.1, GLOBAL_REWARD_WEIGHT - 0.05),
+                GLOBAL_REWARD_WEIGHT,
+                min(0.5, GLOBAL_REWARD_WEIGHT + 0.05),
+            }),
+            alpha=[0.1, 0.2],
+            epsilon_decay=[0.99, 0.995],
+        )
+        results = run_sweep(
+            grid,
+            root_seed=outer,
+            n_agents=4,
+            episodes=FIRST_ROUND_EPISODES if best is None else WARM_ROUND_EPISODES,
+            max_steps=200,
+            warm_start=best,
+            replay=REPLAY
+        )
+        print(format_results(results))
+
+        best = results[0]
+        GLOBAL_REWARD_WEIGHT = best["config"]["global_reward_weight"]
+
+        # headless, undelayed (libsumo when available) so every round can afford it
+        metrics = run_sumo_eval(
+            agents=GreedyPolicy.from_agents(agents_from_result(best)),
+            tls_to_agent=TLS_TO_AGENT,
+            sumo_cfg="./sumo/intersection.sumocfg",
+            profile="fast"
+        )
+
+        print("SUMO metrics:", metrics)
+
+        # Simple heuristic adjustment
+        if metrics["avg_queue"] > 10:
+            GLOBAL_REWARD_WEIGHT += 0.05
+        else:
+            GLOBAL_REWARD_WEIGHT -= 0.02
+
+        GLOBAL_REWARD_WEIGHT = max(0.1, min(GLOBAL_REWARD_WEIGHT, 0.5))
@@ -0,0 +1,152 @@
+import cProfile
+import json
+import time
+from collections import defaultdict
+
+
+# ============================================================
+# HOT-PATH INSTRUMENTATION
+# ============================================================
+# Stage timing works by laps: start() marks the beginning of a step,
+# and each lap(stage) charges the time since the previous mark to that
+# stage. Counters track events (env steps, decisions), and series record
+# per-episode values such as Q-table growth.
+#
+# Code under measurement always holds a profiler; when instrumentation
+# is off it holds NULL_PROFILER, whose methods do nothing, so the
+# disabled cost is one no-op method call per lap.
+#
+# Exports: summary() / export_json() for structured metrics,
+# export_chrome_trace() for chrome://tracing or Perfetto (needs
+# trace=True), and profile_call() for a cProfile/pstats dump.
+
+class Profiler:
+    enabled = True
+
+    def __init__(self, trace=False, max_events=1_000_000):
+        self.totals = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+        self.series = defaultdict(list)
+
+        self.trace = trace
+        self.max_events = max_events
+        self.events = []
+
+        self._origin = time.perf_counter()
+        self._first = None
+        self._mark = self._origin
+
+    def start(self):
+        self._mark = time.perf_counter()
+        if self._first is None:
+            self._first = self._mark
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        elapsed = now - self._mark
+        self.totals[stage] += elapsed
+        self.calls[stage] += 1
+        if self.trace and len(self.events) < self.max_events:
+            self.events.append((stage, self._mark, elapsed))
+        self._mark = now
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def record(self, name, x, value):
+        self.series[name].append((x, value))
+
+    # ----------------------------
+    # Export
+    # ----------------------------
+
+    def wall_time(self):
+        if self._first is None:
+            return 0.0
+        return self._mark - self._first
+
+    def summary(self):
+        wall = self.wall_time()
+        timed = sum(self.totals.values())
+        stages = {
+            stage: {
+                "seconds": total,
+                "calls": self.calls[stage],
+                "mean_us": 1e6 * total / self.calls[stage],
+                "share": total / timed if timed else 0.0,
+            }
+            for stage, total in sorted(self.totals.items(), key=lambda kv: -kv[1])
+        }
+        rates = {
+            f"{name}_per_sec": n / wall
+            for name, n in self.counters.items()
+            if wall > 0
+        }
+        return {
+            "wall_seconds": wall,
+            "stages": stages,
+            "counters": dict(self.counters),
+            "rates": rates,
+            "series": {name: list(values) for name, values in self.series.items()},
+        }
+
+    def report(self):
+        s = self.summary()
+        lines = [f"wall {s['wall_seconds']:.3f}s"]
+        for stage, st in s["stages"].items():
+            lines.append(
+                f"  {stage:20s} {st['seconds']:9.3f}s {st['share']:6.1%} "
+                f"{st['calls']:10d} calls {st['mean_us']:9.2f} us/call"
+            )
+        for name, rate in s["rates"].items():
+            lines.append(f"  {name:20s} {rate:12,.1f}")
+        return "\n".join(lines)
+
+    def export_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def export_chrome_trace(self, path, pid=0, tid=0):
+        # Chrome trace-event format: complete ("X") events in microseconds
+        events = [
+            {
+                "name": stage,
+                "ph": "X",
+                "ts": (start - self._origin) * 1e6,
+                "dur": elapsed * 1e6,
+                "pid": pid,
+                "tid": tid,
+            }
+            for stage, start, elapsed in self.events
+        ]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+class NullProfiler:
+    enabled = False
+
+    def start(self):
+        pass
+
+    def lap(self, stage):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+    def record(self, name, x, value):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+def profile_call(fn, *args, path="profile.prof", **kwargs):
+    # run fn under cProfile and dump pstats-compatible stats to path
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(fn, *args, **kwargs)
+    finally:
+        profiler.dump_stats(path)
@@ -0,0 +1,227 @@
+import numpy as np
+from rng_streams import BlockStream, make_generator
+
+
+#          LINEAR FUNCTION-APPROXIMATION AGENT
+#
+# Drop-in alternative to QLearningAgent (same select_action / update /
+# epsilon interface) whose Q-values are linear in tile-coded features:
+#
+#   Q(s, a) = sum over tilings t of  w[h(t, tile_t(s)), a]
+#
+# Each of n_tilings grids covers the observation with tiles of
+# tile_widths[d] raw units along dimension d, every grid shifted by a
+# different fraction of a tile. The integer tile coordinates are hashed
+# into a fixed table of memory_size rows, so memory never depends on how
+# many distinct observations show up (more features, longer queues), and
+# nearby queue levels share tiles, which generalises to ones never seen.
+#
+# The step size alpha is split across tilings (alpha / n_tilings per
+# active weight), so alpha means roughly what it does for the tabular
+# agent. update_batch() applies a whole minibatch of transitions with a
+# few array ops.
+
+FEATURE_CACHE = 65536
+
+# odd 64-bit multipliers for hashing (tiling, coordinates) → row
+_HASH_MULTIPLIERS = np.array([
+    0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9,
+    0xD6E8FEB86659FD93, 0xFF51AFD7ED558CCD, 0xC4CEB9FE1A85EC53,
+    0x2545F4914F6CDD1D, 0x9FB21C651E98DF25,
+], dtype=np.uint64)
+
+
+class TileCoder:
+    def __init__(self, tile_widths, n_tilings=8, memory_size=4096):
+        self.tile_widths = np.asarray(tile_widths, dtype=np.float64)
+        self.n_tilings = int(n_tilings)
+        self.memory_size = int(memory_size)
+
+        dims = len(self.tile_widths)
+        if dims + 1 > len(_HASH_MULTIPLIERS):
+            raise ValueError(f"TileCoder supports at most {len(_HASH_MULTIPLIERS) - 1} dimensions")
+
+        # tiling t is shifted by t * (1, 3, 5, ...) / n_tilings of a tile
+        # (asymmetric offsets, so tilings don't line up on the diagonal)
+        odd = 2 * np.arange(dims) + 1
+        self.offsets = (np.arange(self.n_tilings)[:, None] * odd / self.n_tilings) % 1.0
+        self._tilings = np.arange(self.n_tilings, dtype=np.uint64) * _HASH_MULTIPLIERS[0]
+        self._multipliers = _HASH_MULTIPLIERS[1:dims + 1]
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, TileCoder)
+            and self.n_tilings == other.n_tilings
+            and self.memory_size == other.memory_size
+            and np.array_equal(self.tile_widths, other.tile_widths)
+        )
+
+    def __hash__(self):
+        return hash((self.n_tilings, self.memory_size, tuple(self.tile_widths.tolist())))
+
+    @property
+    def state_dim(self):
+        return len(self.tile_widths)
+
+    def active_batch(self, obs):
+        # (..., state_dim) observations → (..., n_tilings) active rows
+        obs = np.asarray(obs, dtype=np.float64)
+        coords = np.floor(obs[..., None, :] / self.tile_widths + self.offsets).astype(np.int64)
+        h = (coords.astype(np.uint64) * self._multipliers).sum(axis=-1, dtype=np.uint64)
+        h += self._tilings
+        h ^= h >> np.uint64(29)
+        return (h % np.uint64(self.memory_size)).astype(np.int64)
+
+    def active(self, obs):
+        # one observation → (n_tilings,) active rows
+        return self.active_batch(obs)
+
+    def to_json(self):
+        return {
+            "tile_widths": self.tile_widths.tolist(),
+            "n_tilings": self.n_tilings,
+            "memory_size": self.memory_size,
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data["tile_widths"], data["n_tilings"], data["memory_size"])
+
+
+def traffic_tile_coder(queue_width=5, n_tilings=8, memory_size=4096, n_queues=2):
+    # (queue_NS, queue_EW, ..., phase): queues in tiles of queue_width
+    # vehicles, the phase kept categorical (unit tiles, offsets < 1)
+    return TileCoder([queue_width] * n_queues + [1], n_tilings, memory_size)
+
+
+class LinearQAgent:
+    def __init__(
+        self,
+        state_size,
+        action_size,
+        agent_id=None,
+        alpha=0.1,
+        gamma=0.99,
+        epsilon=1.0,
+        epsilon_min=0.05,
+        epsilon_decay=0.995,
+        tile_coder=None,
+        dtype=np.float64,
+        seed=None
+    ):
+        self.state_size = state_size
+        self.action_size = action_size
+        self.agent_id = agent_id
+
+        self.alpha = alpha
+        self.gamma = gamma
+
+        self.epsilon = epsilon
+        self.epsilon_min = epsilon_min
+        self.epsilon_decay = epsilon_decay
+
+        self.dtype = np.dtype(dtype)
+
+        # exploration draws: one (explore?, random action) uniform pair per
+        # select_action, as in QLearningAgent
+        self.stream = BlockStream(make_generator(seed), 2)
+
+        self.tile_coder = tile_coder or traffic_tile_coder()
+        self.weights = np.zeros((self.tile_coder.memory_size, action_size), dtype=self.dtype)
+        self.touched = np.zeros(self.tile_coder.memory_size, dtype=bool)
+        # rows written since the last checkpoint save
+        self.dirty = np.zeros(self.tile_coder.memory_size, dtype=bool)
+
+        # state → active rows, bounded so memory stays flat
+        self._feature_cache = {}
+
+    def features(self, state):
+        rows = self._feature_cache.get(state)
+        if rows is None:
+            rows = self.tile_coder.active(state)
+            if len(self._feature_cache) >= FEATURE_CACHE:
+                self._feature_cache.clear()
+            self._feature_cache[state] = rows
+        return rows
+
+    def q_values(self, state):
+        return self.weights[self.features(state)].sum(axis=0)
+
+    def q_values_batch(self, states):
+        # (batch, state_dim) → (batch, actions)
+        return self.weights[self.tile_coder.active_batch(states)].sum(axis=-2)
+
+    def num_states_seen(self):
+        # weight rows touched so far (the trainer logs this as q_states)
+        return int(np.count_nonzero(self.touched))
+
+    def memory_usage(self):
+        return self.weights.nbytes + self.touched.nbytes
+
+    # ----------------------------
+    # Pickling: the feature cache is rebuilt on demand
+    # ----------------------------
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_feature_cache"] = {}
+        return state
+
+
+    def select_action(self, state):
+        u, v = self.stream.next()
+        if u < self.epsilon:
+            action = int(v * self.action_size)
+        else:
+            action = int(self.q_values(state).argmax())
+
+        self.epsilon = max(self.epsilon_min, self.epsilon * self.epsilon_decay)
+
+        return action
+
+
+    def update(self, state, action, reward, next_state):
+        rows = self.features(state)
+        w = self.weights
+        q = w[rows, action].sum()
+        best_next = w[self.features(next_state)].sum(axis=0).max()
+
+        td_target = reward + self.gamma * best_next
+        w[rows, action] += (self.alpha / self.tile_coder.n_tilings) * (td_target - q)
+        self.touched[rows] = True
+        self.dirty[rows] = True
+
+    def update_batch(self, states, actions, rewards, next_states, dones=None, weights=None):
+        # one semi-gradient step for a minibatch of transitions, all TD
+        # errors taken against the weights before the step; dones masks
+        # the bootstrap term, weights scale each transition's step
+        # (importance sampling). Transitions sharing a (row, action) weight
+        # share one averaged step, as in QLearningAgent.update_batch.
+        # Returns the TD errors (e.g. for priorities).
+        rows = self.tile_coder.active_batch(states)
+        next_rows = self.tile_coder.active_batch(next_states)
+        actions = np.asarray(actions, dtype=np.int64)
+        w = self.weights
+
+        q = w[rows, actions[:, None]].sum(axis=1)
+        best_next = w[next_rows].sum(axis=1).max(axis=1)
+        if dones is not None:
+            best_next = np.where(dones, 0.0, best_next)
+
+        td_error = np.asarray(rewards, dtype=np.float64) + self.gamma * best_next - q
+        step = (self.alpha / self.tile_coder.n_tilings) * td_error
+        if weights is not None:
+            step = step * weights
+        flat = np.ravel_multi_index((rows, np.broadcast_to(actions[:, None], rows.shape)), w.shape).ravel()
+        cells, inverse, counts = np.unique(flat, return_inverse=True, return_counts=True)
+        total = np.bincount(inverse, weights=np.repeat(step, rows.shape[1]), minlength=len(cells))
+        w[cells // w.shape[1], cells % w.shape[1]] += (total / counts).astype(self.dtype)
+        self.touched[rows.ravel()] = True
+        self.dirty[rows.ravel()] = True
+        return td_error
+
+    def reseed(self, seed):
+        self.stream = BlockStream(make_generator(seed), 2)
+
+    def decay_epsilon(self, min_eps=0.05, decay=0.999):
+        self.epsilon = max(min_eps, self.epsilon * decay)
@@ -1,6 +1,26 @@
+import time
+from collections import deque
+
 import numpy as np
 from multi_intersection_env import MultiIntersectionEnv
 from q_learning_agent import QLearningAgent
+from linear_agent import LinearQAgent
+from batched_q_learner import BatchedQLearner
+from discretizer import StateDiscretizer
+from instrumentation import NULL_PROFILER
+from metrics_log import MetricsWriter
+from replay_buffer import ReplayBuffer
+from greedy_policy import GreedyPolicy
+from rng_streams import as_seed_sequence
+from checkpoint import TrainingCheckpointer, latest_checkpoint, load_training_checkpoint
+
+
+def per_agent(value, i):
+    # hyperparameters may be a scalar or one value per agent
+    if np.ndim(value) == 0:
+        return value
+    return value[i]
+
 
 class MARLTrainer:
     def __init__(
@@ -10,46 +30,344 @@ class MARLTrainer:
         max_steps=200,
         epsilon_start=1.0,
         epsilon_min=0.05,
-        epsilon_decay=0.995
+        epsilon_decay=0.995,
+        alpha=0.1,
+        gamma=0.99,
+        dense_q=False,
+        q_dtype=np.float64,
+        batched=False,
+        num_envs=1,
+        discretizer=None,
+        profiler=None,
+        metrics_path=None,
+        reward_history=10000,
+        checkpoint_dir=None,
+        checkpoint_every=100,
+        resume=False,
+        overwrite_checkpoints=False,
+        seed=None,
+        scenario=None,
+        network=None,
+        reward_mixing=None,
+        agent_type="tabular",
+        tile_coder=None,
+        replay_capacity=None,
+        replay_batch=64,
+        replay_ratio=1,
+        prioritized_replay=False,
+        verbose=True
     ):
         self.n_agents = n_agents
+        self.verbose = verbose
+
+        # opt-in stage timing (instrumentation.Profiler); off by default
+        self.profiler = profiler or NULL_PROFILER
         self.episodes = episodes
         self.max_steps = max_steps
 
+        # num_envs > 1 runs that many env copies in lockstep (batched only)
+        self.num_envs = num_envs
+        self.batched = batched or num_envs > 1
+
+        # agent_type="linear": tile-coded linear Q-functions
+        # (linear_agent.LinearQAgent, fixed memory) instead of Q-tables
+        if agent_type not in ("tabular", "linear"):
+            raise ValueError(f"unknown agent_type {agent_type!r}")
+        if agent_type == "linear" and self.batched:
+            raise ValueError("linear agents train serially (batched=False, num_envs=1)")
+        self.agent_type = agent_type
+
+        # every env and agent draws from its own stream spawned from seed
+        env_seed, agent_seed, self._eval_seed, replay_seed = as_seed_sequence(seed).spawn(4)
+        agent_seeds = agent_seed.spawn(n_agents)
+
         # Environment
-        self.env = MultiIntersectionEnv(n=n_agents)
+        self.env = MultiIntersectionEnv(
+            n=n_agents, vectorized=self.batched, num_envs=num_envs, seed=env_seed,
+            scenario=scenario,
+            network=network,
+            reward_mixing=reward_mixing
+        )
+
+        # state ids shared by env, trainer, agents and evaluator; the
+        # batched learner needs one, by default a bin per raw observation
+        # value. The env emits the ids of a clipping discretizer; with a
+        # non-clipping one agents encode raw observations themselves and
+        # keep out-of-range states in their dicts.
+        if discretizer is None and self.batched:
+            discretizer = StateDiscretizer.from_bounds(self.env.observation_space.high)
+        self.discretizer = discretizer
+        if discretizer is not None and discretizer.clip and agent_type == "tabular":
+            self.env.discretizer = discretizer
 
-        # Agents
-        self.agents = {
-            i: QLearningAgent(
-                state_size=4,
+        if discretizer is not None:
+            state_size = discretizer.num_states
+        else:
+            state_size = self.env.observation_space.shape[0]
+
+        if self.batched:
+            # all agents in one stacked Q-table array; self.agents are
+            # per-agent views onto it for evaluation / saving
+            self.learner = BatchedQLearner(
+                n_agents=n_agents,
+                discretizer=discretizer,
                 action_size=2,
-                agent_id=i
+                alpha=alpha,
+                gamma=gamma,
+                epsilon=epsilon_start,
+                epsilon_min=epsilon_min,
+                epsilon_decay=epsilon_decay,
+                dtype=q_dtype,
+                seeds=agent_seeds
+            )
+            self.agents = self.learner.to_agents()
+        elif agent_type == "linear":
+            self.agents = {
+                i: LinearQAgent(
+                    state_size=self.env.observation_space.shape[0],
+                    action_size=2,
+                    agent_id=i,
+                    alpha=per_agent(alpha, i),
+                    gamma=per_agent(gamma, i),
+                    epsilon=per_agent(epsilon_start, i),
+                    epsilon_min=per_agent(epsilon_min, i),
+                    epsilon_decay=per_agent(epsilon_decay, i),
+                    tile_coder=tile_coder,
+                    dtype=q_dtype,
+                    seed=agent_seeds[i]
+                )
+                for i in range(self.n_agents)
+            }
+        else:
+            # Agents (dense_q → array-backed Q-tables over the bounded obs
+            # space; a discretizer always gives dense tables)
+            state_bounds = self.env.observation_space.high if dense_q else None
+            self.agents = {
+                i: QLearningAgent(
+                    state_size=state_size,
+                    action_size=2,
+                    agent_id=i,
+                    alpha=per_agent(alpha, i),
+                    gamma=per_agent(gamma, i),
+                    epsilon=per_agent(epsilon_start, i),
+                    epsilon_min=per_agent(epsilon_min, i),
+                    epsilon_decay=per_agent(epsilon_decay, i),
+                    state_bounds=state_bounds,
+                    dtype=q_dtype,
+                    discretizer=discretizer,
+                    seed=agent_seeds[i]
+                )
+                for i in range(self.n_agents)
+            }
+
+        # experience replay (replay_buffer.ReplayBuffer): every transition
+        # is stored and replay_ratio minibatches of replay_batch rows are
+        # replayed after each env step, on top of the online update. Rows
+        # hold what the env emits (state ids with a discretizer, else raw
+        # observations); serial agents replay through their update_batch
+        # (dense tabular or linear agents).
+        self.replay = None
+        self.replay_batch = replay_batch
+        self.replay_ratio = replay_ratio
+        if replay_capacity:
+            if agent_type == "tabular" and not self.batched and not self.agents[0].dense:
+                raise ValueError("replay needs dense Q-tables (dense_q or a discretizer) or linear agents")
+            if self.env.discretizer is not None:
+                state_shape, state_dtype = (), np.int64
+            else:
+                state_shape, state_dtype = self.env.observation_space.shape, np.int32
+            self.replay = ReplayBuffer(
+                replay_capacity, n_agents, state_shape, state_dtype,
+                prioritized=prioritized_replay, seed=replay_seed
             )
-            for i in range(self.n_agents)
-        }
 
+        # only the last reward_history episode totals stay in memory; the
+        # full per-episode record streams to metrics_path (metrics_log)
+        self.episode_rewards = deque(maxlen=reward_history)
+        self.metrics_path = metrics_path
+        self.metrics = None
+
+        # periodic incremental checkpoints (checkpoint.TrainingCheckpointer);
+        # resume=True continues from the newest one in checkpoint_dir;
+        # overwrite_checkpoints=True lets a fresh run delete old ones
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_every = checkpoint_every
+        self.resume = resume
+        self.overwrite_checkpoints = overwrite_checkpoints
+        self.checkpointer = None
+        self.start_episode = 0
 
-        self.episode_rewards = []
+    def _log(self, message):
+        if self.verbose:
+            print(message)
+
+    def _record_episode(self, ep, agent_reward, steps, epsilon, q_states):
+        if self.metrics is not None:
+            self.metrics.log(
+                ep, agent_reward, steps, epsilon, q_states,
+                time.perf_counter() - self._train_start
+            )
+
+    def warm_start(self, agents, epsilon=True):
+        # copy Q-values (and epsilons) from trained agents, e.g. a loaded
+        # checkpoint or the previous hybrid round's best agents
+        for i, src in agents.items():
+            dst = self.agents[i]
+            if isinstance(dst, LinearQAgent) or isinstance(src, LinearQAgent):
+                if type(dst) is not type(src) or dst.tile_coder != src.tile_coder:
+                    raise ValueError("warm_start needs agents with the same tile coder")
+                dst.weights[:] = src.weights
+                dst.touched[:] = src.touched
+                if epsilon:
+                    dst.epsilon = src.epsilon
+                continue
+            if dst.dense != src.dense or (dst.dense and dst.discretizer != src.discretizer):
+                raise ValueError("warm_start needs agents with the same Q-table layout")
+            if dst.dense:
+                dst.q_dense[:] = src.q_dense
+                dst.visited[:] = src.visited
+            dst.q_table = {state: row.copy() for state, row in src.q_table.items()}
+            if epsilon:
+                dst.epsilon = src.epsilon
+
+        if self.batched and epsilon:
+            self.learner.epsilon[:] = [self.agents[i].epsilon for i in range(self.n_agents)]
+
+    def rng_streams(self):
+        # env streams then agent streams (order used by checkpoints)
+        if self.batched:
+            return self.env.rng_streams() + [self.learner.stream]
+        return self.env.rng_streams() + [a.stream for a in self.agents.values()]
+
+    def rng_state(self):
+        return [row for stream in self.rng_streams() for row in stream.get_state()]
+
+    def set_rng_state(self, state):
+        pos = 0
+        for stream in self.rng_streams():
+            rows = len(stream.get_state())
+            stream.set_state(state[pos:pos + rows])
+            pos += rows
+
+    def _resume(self):
+        agents, state = load_training_checkpoint(self.checkpoint_dir)
+        self.warm_start(agents)
+        self.set_rng_state(state["rng"])
+        self.env.demand_t = state["extra"].get("demand_t", 0)
+        if self.replay is not None and "replay" in state["extra"]:
+            self.replay.set_state(state["arrays"], state["extra"]["replay"])
+        self.episode_rewards.clear()
+        self.episode_rewards.extend(state["episode_rewards"])
+        self.start_episode = state["episode"]
+        self._log(f"Resuming from episode {self.start_episode}")
+
+    def save_checkpoint(self, episode):
+        if self.batched:
+            self.learner.sync_epsilons(self.agents)
+        extra = {"demand_t": self.env.demand_t}
+        arrays = None
+        if self.replay is not None:
+            arrays, extra["replay"] = self.replay.get_state(full=self.checkpointer.next_full)
+        self.checkpointer.save(
+            self.agents, episode, self.episode_rewards, self.rng_state(),
+            extra=extra, arrays=arrays
+        )
+
+    def _maybe_checkpoint(self, before, after):
+        # after finishing episodes [before, after)
+        if self.checkpointer is None:
+            return
+        every = self.checkpoint_every
+        if after // every > before // every or after >= self.episodes:
+            self.save_checkpoint(after)
+
+    # ----------------------------
+    # Experience replay
+    # ----------------------------
+
+    def _replay_serial(self):
+        replay = self.replay
+        if len(replay) < self.replay_batch:
+            return
+        for _ in range(self.replay_ratio):
+            idx, rows, weights = replay.sample(self.replay_batch)
+            td_error = np.stack([
+                agent.update_batch(
+                    rows["state"][:, i], rows["action"][:, i], rows["reward"][:, i],
+                    rows["next_state"][:, i], weights=weights
+                )
+                for i, agent in self.agents.items()
+            ], axis=1)
+            replay.update_priorities(idx, td_error)
+
+    def _replay_batched(self):
+        replay = self.replay
+        if len(replay) < self.replay_batch:
+            return
+        for _ in range(self.replay_ratio):
+            idx, rows, weights = replay.sample(self.replay_batch)
+            td_error = self.learner.update(
+                rows["state"], rows["action"], rows["reward"], rows["next_state"], weights=weights
+            )
+            replay.update_priorities(idx, td_error)
 
     def train(self):
-        print(f"Starting MARL training with {self.n_agents} agents")
+        self._log(f"Starting MARL training with {self.n_agents} agents")
+
+        self.start_episode = 0
+        resuming = (
+            self.resume
+            and self.checkpoint_dir is not None
+            and latest_checkpoint(self.checkpoint_dir) is not None
+        )
+        if resuming:
+            self._resume()
+        if self.checkpoint_dir is not None:
+            self.checkpointer = TrainingCheckpointer(
+                self.checkpoint_dir, self.agents, resume=resuming, overwrite=self.overwrite_checkpoints
+            )
+
+        self._train_start = time.perf_counter()
+        if self.metrics_path is not None:
+            self.metrics = MetricsWriter(
+                self.metrics_path, self.n_agents,
+                resume_from=self.start_episode if resuming else None
+            )
+        try:
+            if self.batched:
+                self._train_batched()
+            else:
+                self._train_serial()
+        finally:
+            if self.metrics is not None:
+                self.metrics.close()
+                self.metrics = None
+
+    def _train_serial(self):
+        prof = self.profiler
 
-        for ep in range(self.episodes):
+        for ep in range(self.start_episode, self.episodes):
             states = self.env.reset()
             done = False
             step = 0
             episode_reward = 0.0
+            agent_reward = [0.0] * self.n_agents
 
             while not done and step < self.max_steps:
+                prof.start()
+
                 # --- select actions ---
                 actions = {
                     i: self.agents[i].select_action(states[i])
                     for i in self.agents
                 }
+                prof.lap("select")
 
                 # --- environment step ---
-                next_states, rewards, done = self.env.step(actions)
+                next_states, rewards, done = self.env.step(actions, mix=False)
+                prof.lap("env")
+                rewards = self.env.mix_rewards(rewards)
+                prof.lap("mix")
 
                 # --- learning ---
                 for i in self.agents:
@@ -60,47 +378,162 @@ class MARLTrainer:
                         next_states[i]
                     )
                     episode_reward += rewards[i]
+                    agent_reward[i] += rewards[i]
+                prof.lap("update")
+
+                if self.replay is not None:
+                    self.replay.add(states, actions, rewards, next_states)
+                    self._replay_serial()
+                    prof.lap("replay")
 
                 states = next_states
                 step += 1
 
+            prof.count("env_steps", step)
+            if prof.enabled:
+                for i, agent in self.agents.items():
+                    prof.record(f"states_seen_{i}", ep, agent.num_states_seen())
+
             self.episode_rewards.append(episode_reward)
+            if self.metrics is not None:
+                self._record_episode(
+                    ep, agent_reward, step,
+                    [a.epsilon for a in self.agents.values()],
+                    [a.num_states_seen() for a in self.agents.values()]
+                )
 
             # --- logging ---
             if ep % 10 == 0:
                 eps = {i: round(a.epsilon, 3) for i, a in self.agents.items()}
-                print(
+                self._log(
                     f"Episode {ep:4d} | "
                     f"Steps: {step:3d} | "
                     f"Total Reward: {episode_reward:.2f} | "
                     f"Epsilons: {eps}"
                 )
 
-        print("Training complete")
+            self._maybe_checkpoint(ep, ep + 1)
+
+        self._log("Training complete")
 
-    def evaluate(self, episodes=5):
-        print("Evaluating trained agents (epsilon = 0)")
+    def _train_batched(self):
+        learner = self.learner
+        num_envs = self.num_envs
+        prof = self.profiler
 
-        for agent in self.agents.values():
-            agent.epsilon = 0.0
+        # each round plays num_envs episodes side by side
+        ep = self.start_episode
+        while ep < self.episodes:
+            states = self.env.reset_batch()
+            done = False
+            step = 0
+            episode_reward = np.zeros(num_envs)
+            agent_reward = np.zeros((num_envs, self.n_agents))
+
+            while not done and step < self.max_steps:
+                prof.start()
+                actions = learner.select_actions(states)
+                prof.lap("select")
+                next_states, rewards, done = self.env.step_batch(actions, mix=False)
+                prof.lap("env")
+                rewards = self.env.mix_rewards(rewards)
+                prof.lap("mix")
+
+                learner.update(states, actions, rewards, next_states)
+                copy_rewards = rewards.reshape(num_envs, -1)
+                episode_reward += copy_rewards.sum(axis=1)
+                agent_reward += copy_rewards
+                prof.lap("update")
+
+                if self.replay is not None:
+                    self.replay.add_batch(
+                        states.reshape(num_envs, -1), actions.reshape(num_envs, -1),
+                        copy_rewards, next_states.reshape(num_envs, -1)
+                    )
+                    self._replay_batched()
+                    prof.lap("replay")
+
+                states = next_states
+                step += 1
 
+            prof.count("env_steps", step * num_envs)
+            if prof.enabled:
+                for i, seen in enumerate(learner.num_states_seen()):
+                    prof.record(f"states_seen_{i}", ep, int(seen))
+
+            finished = episode_reward[:self.episodes - ep].tolist()
+            self.episode_rewards.extend(finished)
+            if self.metrics is not None:
+                q_states = learner.num_states_seen()
+                for k in range(len(finished)):
+                    self._record_episode(ep + k, agent_reward[k], step, learner.epsilon, q_states)
+
+            for k, reward in enumerate(finished):
+                if (ep + k) % 10 == 0:
+                    eps = dict(enumerate(np.round(learner.epsilon, 3).tolist()))
+                    self._log(
+                        f"Episode {ep + k:4d} | "
+                        f"Steps: {step:3d} | "
+                        f"Total Reward: {reward:.2f} | "
+                        f"Epsilons: {eps}"
+                    )
+            ep += len(finished)
+            self._maybe_checkpoint(ep - len(finished), ep)
+
+        learner.sync_epsilons(self.agents)
+        learner.sync_streams(self.agents)
+        self._log("Training complete")
+
+    def export_policy(self, default_action=0):
+        # frozen greedy policy of the current agents (greedy_policy);
+        # linear agents are tabulated over the raw observation grid
+        discretizer = None
+        if self.agent_type == "linear":
+            discretizer = StateDiscretizer.from_bounds(self.env.observation_space.high)
+        return GreedyPolicy.from_agents(self.agents, discretizer, default_action)
+
+    def evaluate(self, episodes=5, rewards_path="episode_rewards.csv"):
+        # greedy rollouts of a frozen export: no exploration, and the
+        # agents (epsilons, streams, Q-tables) are left untouched
+        self._log("Evaluating trained agents (greedy policy)")
+        policy = self.export_policy()
+
+        # lockstep copies are for training; evaluate on a single env
+        env = self.env
+        if self.num_envs > 1:
+            env = MultiIntersectionEnv(
+                n=self.n_agents,
+                global_reward_weight=self.env.global_reward_weight,
+                vectorized=True,
+                seed=self._eval_seed,
+                scenario=self.env.scenario,
+                network=self.env.network,
+                reward_mixing=self.env.reward_mixer,
+                discretizer=self.env.discretizer
+            )
+        # state ids from the env index the policy's table directly
+        act = policy.act_id if env.discretizer is not None else policy.act
+
+        eval_rewards = []
         for ep in range(episodes):
-            states = self.env.reset()
+            states = env.reset()
             done = False
             step = 0
             total_reward = 0.0
 
             while not done and step < self.max_steps:
-                actions = {
-                    i: self.agents[i].select_action(states[i])
-                    for i in self.agents
-                }
+                actions = {i: act(i, states[i]) for i in self.agents}
 
-                next_states, rewards, done = self.env.step(actions)
+                next_states, rewards, done = env.step(actions)
 
                 total_reward += sum(rewards.values())
                 states = next_states
                 step += 1
 
-            print(f"[EVAL] Episode {ep} | Reward: {total_reward:.2f}")
-        np.savetxt("episode_rewards.csv", self.episode_rewards)
+            self._log(f"[EVAL] Episode {ep} | Reward: {total_reward:.2f}")
+            eval_rewards.append(total_reward)
+
+        if rewards_path is not None:
+            np.savetxt(rewards_path, self.episode_rewards)
+
+        return eval_rewards
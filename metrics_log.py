@@ -0,0 +1,198 @@
+import json
+import os
+
+import numpy as np
+
+
+# ============================================================
+# STREAMING TRAINING METRICS LOG
+# ============================================================
+# One fixed-size binary record per episode, appended to a file:
+#
+#   MAGIC (8 bytes) | header length (uint32) | JSON header | records...
+#
+# The header stores the record dtype, so any reader can map the records
+# straight into a structured array. Rows are buffered in a preallocated
+# chunk and written when it fills (or on flush/close), so a crash loses
+# at most one chunk.
+#
+# Smoothing statistics are computed while writing and stored in every
+# row (EMA, rolling-window mean, running mean/std), so a plot or
+# dashboard following a live run only needs to read the new rows.
+
+MAGIC = b"MARLLOG1"
+
+
+def record_dtype(n_agents):
+    return np.dtype([
+        ("episode", np.int64),
+        ("total_reward", np.float64),
+        ("agent_reward", np.float64, (n_agents,)),
+        ("steps", np.int32),
+        ("epsilon", np.float32, (n_agents,)),
+        ("q_states", np.int64, (n_agents,)),
+        ("wall_time", np.float64),
+        ("reward_ema", np.float64),
+        ("reward_rolling", np.float64),
+        ("reward_mean", np.float64),
+        ("reward_std", np.float64),
+    ])
+
+
+class RunningStats:
+    # EMA, mean over the last `window` values (ring buffer) and Welford
+    # mean/variance over everything seen
+    def __init__(self, ema_alpha=0.05, window=100):
+        self.ema_alpha = ema_alpha
+        self.ema = None
+
+        self.ring = np.zeros(window)
+        self.ring_sum = 0.0
+        self.count = 0
+
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def push(self, x):
+        self.ema = x if self.ema is None else self.ema + self.ema_alpha * (x - self.ema)
+
+        slot = self.count % len(self.ring)
+        self.ring_sum += x - self.ring[slot]
+        self.ring[slot] = x
+        self.count += 1
+
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    @property
+    def rolling(self):
+        return self.ring_sum / min(self.count, len(self.ring))
+
+    @property
+    def std(self):
+        return (self.m2 / self.count) ** 0.5 if self.count else 0.0
+
+
+class MetricsWriter:
+    def __init__(self, path, n_agents, chunk_size=256, ema_alpha=0.05, window=100, resume_from=None):
+        # resume_from=episode keeps an existing log's rows before that
+        # episode (dropping any written after the checkpoint being resumed)
+        # and rebuilds the running statistics from them
+        self.path = path
+        self.dtype = record_dtype(n_agents)
+        self.buffer = np.zeros(chunk_size, dtype=self.dtype)
+        self.pending = 0
+        self.stats = RunningStats(ema_alpha, window)
+
+        if resume_from is not None and os.path.exists(path):
+            with open(path, "rb") as f:
+                offset = read_header(f)["offset"]
+            kept = read_metrics(path, mmap=False)
+            kept = kept[kept["episode"] < resume_from]
+            for total in kept["total_reward"].tolist():
+                self.stats.push(total)
+
+            self.file = open(path, "r+b")
+            self.file.truncate(offset + kept.nbytes)
+            self.file.seek(0, os.SEEK_END)
+            return
+
+        header = json.dumps({
+            "n_agents": n_agents,
+            "dtype": self.dtype.descr,
+            "ema_alpha": ema_alpha,
+            "window": window,
+        }).encode()
+
+        self.file = open(path, "wb")
+        self.file.write(MAGIC)
+        self.file.write(np.uint32(len(header)).tobytes())
+        self.file.write(header)
+        self.file.flush()
+
+    def log(self, episode, agent_reward, steps, epsilon, q_states, wall_time):
+        total = float(np.sum(agent_reward))
+        stats = self.stats
+        stats.push(total)
+
+        row = self.buffer[self.pending]
+        row["episode"] = episode
+        row["total_reward"] = total
+        row["agent_reward"] = agent_reward
+        row["steps"] = steps
+        row["epsilon"] = epsilon
+        row["q_states"] = q_states
+        row["wall_time"] = wall_time
+        row["reward_ema"] = stats.ema
+        row["reward_rolling"] = stats.rolling
+        row["reward_mean"] = stats.mean
+        row["reward_std"] = stats.std
+
+        self.pending += 1
+        if self.pending == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.file.write(self.buffer[:self.pending].tobytes())
+            self.pending = 0
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ----------------------------
+# Reading
+# ----------------------------
+
+def read_header(f):
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not a training metrics log")
+    length = int(np.frombuffer(f.read(4), dtype=np.uint32)[0])
+    header = json.loads(f.read(length))
+    header["dtype"] = np.dtype([tuple(field) for field in header["dtype"]])
+    header["offset"] = len(MAGIC) + 4 + length
+    return header
+
+
+class MetricsReader:
+    # follows a log incrementally: poll() returns only rows written since
+    # the previous call (a partially written trailing row is left for later)
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.header = read_header(f)
+        self.dtype = self.header["dtype"]
+        self.position = self.header["offset"]
+
+    def poll(self):
+        size = os.path.getsize(self.path)
+        count = (size - self.position) // self.dtype.itemsize
+        if count <= 0:
+            return np.zeros(0, dtype=self.dtype)
+        rows = np.fromfile(self.path, dtype=self.dtype, count=count, offset=self.position)
+        self.position += count * self.dtype.itemsize
+        return rows
+
+
+def read_metrics(path, mmap=True):
+    # all complete rows; mmap=True maps the file instead of reading it
+    with open(path, "rb") as f:
+        header = read_header(f)
+    dtype = header["dtype"]
+    count = (os.path.getsize(path) - header["offset"]) // dtype.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    if mmap:
+        return np.memmap(path, dtype=dtype, mode="r", offset=header["offset"], shape=(count,))
+    return np.fromfile(path, dtype=dtype, count=count, offset=header["offset"])
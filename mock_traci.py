@@ -0,0 +1,255 @@
+from types import SimpleNamespace
+
+import numpy as np
+from traci_metrics import (
+    LAST_STEP_VEHICLE_HALTING_NUMBER,
+    VAR_ACCUMULATED_WAITING_TIME,
+    VAR_DEPARTED_VEHICLES_IDS,
+    VAR_TELEPORT_STARTING_VEHICLES_NUMBER,
+    TL_CURRENT_PHASE,
+)
+
+
+# ============================================================
+# MOCK TRACI
+# ============================================================
+# A small in-process stand-in for the traci module, so the evaluators can
+# be exercised and benchmarked without SUMO installed. It implements the
+# subset of the API sumo_eval / sumo_fixed_eval use, both the per-call
+# getters and the subscription interface, on top of a toy queueing model:
+# each TLS has 2 NS and 2 EW incoming lanes, vehicles arrive at random,
+# and a lane discharges one vehicle per step while its axis is green.
+#
+# `calls` counts API calls, i.e. the socket round trips real TraCI would
+# make, so the two collection paths can be compared.
+
+N_PHASES = 6   # phases 0-2 serve NS, 3-5 serve EW
+
+
+class _Domain:
+    def __init__(self, sim, name):
+        self._sim = sim
+        self._name = name
+        self._subscriptions = {}
+
+    def subscribe(self, object_id, var_ids):
+        self._sim.calls += 1
+        self._subscriptions[object_id] = tuple(var_ids)
+
+    def getAllSubscriptionResults(self):
+        self._sim.calls += 1
+        results = {}
+        for object_id, var_ids in self._subscriptions.items():
+            if self._sim._exists(self._name, object_id):
+                results[object_id] = {
+                    v: self._sim._value(self._name, object_id, v) for v in var_ids
+                }
+        return results
+
+
+class _Simulation:
+    def __init__(self, sim):
+        self._sim = sim
+        self._vars = ()
+
+    def subscribe(self, var_ids):
+        self._sim.calls += 1
+        self._vars = tuple(var_ids)
+
+    def getSubscriptionResults(self):
+        self._sim.calls += 1
+        return {v: self._sim._value("simulation", None, v) for v in self._vars}
+
+    def getStartingTeleportNumber(self):
+        self._sim.calls += 1
+        return self._sim.teleports
+
+
+class _Vehicle(_Domain):
+    def getIDList(self):
+        self._sim.calls += 1
+        return tuple(self._sim.vehicle_lane)
+
+    def getAccumulatedWaitingTime(self, veh):
+        self._sim.calls += 1
+        return self._sim.vehicle_wait[veh]
+
+
+class _Edge(_Domain):
+    def getIDList(self):
+        self._sim.calls += 1
+        return tuple(self._sim.edges)
+
+    def getLastStepHaltingNumber(self, edge):
+        self._sim.calls += 1
+        return self._sim._halting(edge + "_0")
+
+
+class _Lane(_Domain):
+    def getLastStepHaltingNumber(self, lane):
+        self._sim.calls += 1
+        return self._sim._halting(lane)
+
+    def getShape(self, lane):
+        self._sim.calls += 1
+        # NS lanes run north to south into the junction, EW lanes west to east
+        if int(lane.split("_")[1]) < 2:
+            return [(0.0, 100.0), (0.0, 0.0)]
+        return [(-100.0, 0.0), (0.0, 0.0)]
+
+
+class _TrafficLight(_Domain):
+
+    def getIDList(self):
+        self._sim.calls += 1
+        return tuple(self._sim.tls_ids)
+
+    def getControlledLanes(self, tls):
+        self._sim.calls += 1
+        # like SUMO: one entry per controlled link, so lanes repeat
+        return tuple(l for l in self._sim.tls_lanes[tls] for _ in range(2))
+
+    def getAllProgramLogics(self, tls):
+        self._sim.calls += 1
+        # 8 links (2 per lane), matching the toy dynamics above:
+        # phases 0-2 serve NS, 3-5 serve EW
+        states = ["GGGGrrrr"] * 3 + ["rrrrGGGG"] * 3
+        phases = [SimpleNamespace(state=state, duration=30.0) for state in states]
+        return [SimpleNamespace(programID="0", phases=phases)]
+
+    def getPhase(self, tls):
+        self._sim.calls += 1
+        return self._sim.phase[tls]
+
+    def setPhase(self, tls, phase):
+        self._sim.calls += 1
+        self._sim.phase[tls] = phase
+
+
+class MockTraci:
+    def __init__(self, tls_ids=("J1", "J2", "J3", "J4"), arrival_rate=0.15,
+                 time_to_teleport=300, seed=0):
+        self.tls_ids = list(tls_ids)
+        self.arrival_rate = arrival_rate
+        self.time_to_teleport = time_to_teleport
+        self.seed = seed
+
+        self.simulation = _Simulation(self)
+        self.vehicle = _Vehicle(self, "vehicle")
+        self.edge = _Edge(self, "edge")
+        self.lane = _Lane(self, "lane")
+        self.trafficlight = _TrafficLight(self, "trafficlight")
+
+        # lanes "<tls>_<k>_0" on edges "<tls>_<k>"; k 0-1 NS, 2-3 EW
+        self.tls_lanes = {
+            tls: [f"{tls}_{k}_0" for k in range(4)] for tls in self.tls_ids
+        }
+        self.edges = [lane[:-2] for lanes in self.tls_lanes.values() for lane in lanes]
+
+        self.calls = 0
+        self._reset()
+
+    def _reset(self):
+        self.rng = np.random.default_rng(self.seed)
+        self.time = 0
+        self.phase = {tls: 0 for tls in self.tls_ids}
+        self.queues = {lane: [] for lanes in self.tls_lanes.values() for lane in lanes}
+        self.vehicle_lane = {}
+        self.vehicle_wait = {}
+        self.departed = ()
+        self.teleports = 0
+        self._next_id = 0
+        for domain in (self.vehicle, self.edge, self.lane, self.trafficlight):
+            domain._subscriptions = {}
+        self.simulation._vars = ()
+
+    # ----------------------------
+    # Connection lifecycle
+    # ----------------------------
+
+    def start(self, cmd, label="default", **kwargs):
+        self.cmd = list(cmd)
+        self.label = label
+        if "--seed" in self.cmd:
+            self.seed = int(self.cmd[self.cmd.index("--seed") + 1])
+        self._reset()
+
+    def close(self):
+        pass
+
+    def simulationStep(self):
+        self.calls += 1
+        self.time += 1
+
+        # discharge one vehicle per green lane
+        for tls, lanes in self.tls_lanes.items():
+            green_axis = 0 if self.phase[tls] < N_PHASES // 2 else 1
+            for k, lane in enumerate(lanes):
+                queue = self.queues[lane]
+                if k // 2 == green_axis and queue:
+                    self._remove(queue.pop(0))
+
+        # waiting time for everyone still queued; teleport the starving
+        teleported = 0
+        for lane, queue in self.queues.items():
+            for veh in list(queue):
+                self.vehicle_wait[veh] += 1
+                if self.vehicle_wait[veh] >= self.time_to_teleport:
+                    queue.remove(veh)
+                    self._remove(veh)
+                    teleported += 1
+        self.teleports = teleported
+
+        # arrivals
+        lanes = list(self.queues)
+        arrivals = self.rng.random(len(lanes)) < self.arrival_rate
+        departed = []
+        for lane, arrived in zip(lanes, arrivals):
+            if arrived:
+                veh = f"veh{self._next_id}"
+                self._next_id += 1
+                self.queues[lane].append(veh)
+                self.vehicle_lane[veh] = lane
+                self.vehicle_wait[veh] = 0.0
+                departed.append(veh)
+        self.departed = tuple(departed)
+
+    def _remove(self, veh):
+        # vehicles leaving the network lose their subscriptions, as in SUMO
+        del self.vehicle_lane[veh]
+        del self.vehicle_wait[veh]
+        self.vehicle._subscriptions.pop(veh, None)
+
+    # ----------------------------
+    # Values
+    # ----------------------------
+
+    def _halting(self, lane):
+        # the head of a green lane is moving, everyone else is stopped
+        queue = self.queues[lane]
+        tls, k = lane.split("_")[:2]
+        green_axis = 0 if self.phase[tls] < N_PHASES // 2 else 1
+        if int(k) // 2 == green_axis:
+            return max(0, len(queue) - 1)
+        return len(queue)
+
+    def _exists(self, domain, object_id):
+        if domain == "vehicle":
+            return object_id in self.vehicle_lane
+        return True
+
+    def _value(self, domain, object_id, var):
+        if domain == "simulation":
+            if var == VAR_DEPARTED_VEHICLES_IDS:
+                return self.departed
+            if var == VAR_TELEPORT_STARTING_VEHICLES_NUMBER:
+                return self.teleports
+        elif domain == "vehicle" and var == VAR_ACCUMULATED_WAITING_TIME:
+            return self.vehicle_wait[object_id]
+        elif domain == "edge" and var == LAST_STEP_VEHICLE_HALTING_NUMBER:
+            return self._halting(object_id + "_0")
+        elif domain == "lane" and var == LAST_STEP_VEHICLE_HALTING_NUMBER:
+            return self._halting(object_id)
+        elif domain == "trafficlight" and var == TL_CURRENT_PHASE:
+            return self.phase[object_id]
+        raise KeyError(f"mock TraCI does not provide {domain} variable {var:#x}")
@@ -1,37 +1,198 @@
+import numpy as np
 from traffic_env import TrafficIntersectionEnv
+from batch_intersection_env import BatchIntersectionEnv
+from rng_streams import as_seed_sequence
+from reward_mixing import make_mixer
+from scenarios import get_scenario
 
 class MultiIntersectionEnv:
-    def __init__(self, n=4, global_reward_weight=0.25):
+    def __init__(self, n=4, global_reward_weight=0.25, vectorized=False, num_envs=1, seed=None,
+                 scenario=None, network=None, reward_mixing=None, discretizer=None):
+        # network: couple the intersections through a road network
+        # (road_network.py); only the vectorized env implements it.
+        # reward_mixing: None keeps the global term weighted by
+        # global_reward_weight; otherwise a reward_mixing spec or mixer.
+        # discretizer: a clipping discretizer.StateDiscretizer; reset/step
+        # then return state ids (dict interface: ints, array interface:
+        # arrays without the observation axis) instead of observations,
+        # the ids the trainer's agents and the SUMO evaluator use
         self.n = n
+        self.discretizer = discretizer
         self.global_reward_weight = global_reward_weight
-        self.envs = [TrafficIntersectionEnv() for _ in range(n)]
+        self.vectorized = vectorized or num_envs > 1 or network is not None
+        self.num_envs = num_envs
 
+        # intersection i of copy k gets child k * n + i of the root seed,
+        # so copy 0 (and the scalar mode) replays the same arrivals
+        seeds = as_seed_sequence(seed).spawn(n * num_envs)
+
+        # built once (from_routes scenarios parse the route file) and
+        # shared by every intersection
+        scenario = get_scenario(scenario)
+
+        if self.vectorized:
+            # all intersections (of every copy) advanced by one array step
+            self.batch_env = BatchIntersectionEnv(
+                n * num_envs, seeds=seeds, scenario=scenario, network=network
+            )
+        else:
+            self.envs = [
+                TrafficIntersectionEnv(seed=s, scenario=scenario, column=i)
+                for i, s in enumerate(seeds)
+            ]
+
+        self.reward_mixer = None
+        if reward_mixing is not None:
+            self.reward_mixer = make_mixer(
+                reward_mixing, n, weight=global_reward_weight, network=self.network
+            )
+
+    @property
+    def discretizer(self):
+        return self._discretizer
+
+    @discretizer.setter
+    def discretizer(self, discretizer):
+        if discretizer is not None and not discretizer.clip:
+            raise ValueError("MultiIntersectionEnv needs a clipping discretizer (every obs must map to a state id)")
+        self._discretizer = discretizer
+
+    def encode(self, obs):
+        # (..., 3) observations → what reset/step return: state ids
+        # through the discretizer, else the observations themselves
+        if self._discretizer is None:
+            return obs
+        return self._discretizer.encode_batch(obs)
+
+    def _dict_states(self, states):
+        # (n, ...) encoded states → {i: state id or observation tuple}
+        if self._discretizer is None:
+            return {i: tuple(states[i]) for i in range(self.n)}
+        return dict(enumerate(states.tolist()))
+
+    @property
+    def scenario(self):
+        if self.vectorized:
+            return self.batch_env.scenario
+        return self.envs[0].scenario
+
+    @property
+    def network(self):
+        return self.batch_env.network if self.vectorized else None
+
+    @property
+    def demand_t(self):
+        # scenario clock (steps since the streams were seeded)
+        if self.vectorized:
+            return self.batch_env.demand_t
+        return self.envs[0].demand_t
+
+    @demand_t.setter
+    def demand_t(self, value):
+        if self.vectorized:
+            self.batch_env.demand_t = value
+        else:
+            for env in self.envs:
+                env.demand_t = value
+
+    def rng_streams(self):
+        # arrival streams, for checkpointing (see rng_streams)
+        if self.vectorized:
+            return [self.batch_env.arrivals]
+        return [env._arrivals for env in self.envs]
+
+    @property
+    def observation_space(self):
+        # per-intersection observation space
+        if self.vectorized:
+            return self.batch_env.observation_space
+        return self.envs[0].observation_space
 
     def reset(self):
-        states = {}
-        for i, env in enumerate(self.envs):
-            obs, _ = env.reset()
-            states[i] = tuple(obs)
-        return states
+        if self.num_envs > 1:
+            raise ValueError("dict interface needs num_envs=1; use reset_batch/step_batch")
+
+        if self.vectorized:
+            return self._dict_states(self.reset_batch())
+
+        return self._dict_states(self.encode(np.array([env.reset()[0] for env in self.envs])))
+
+    def step(self, actions, mix=True):
+        # mix=False returns local rewards; mix_rewards() applies the
+        # global term afterwards (lets callers time the two separately)
+        if self.vectorized:
+            action_array = np.fromiter(
+                (actions[i] for i in range(self.n)), dtype=np.int64, count=self.n
+            )
+            states, rewards, done = self.step_batch(action_array, mix=mix)
+            # np.float64 values, as the scalar envs return
+            return self._dict_states(states), dict(enumerate(rewards)), done
 
-    def step(self, actions):
-        next_states = {}
+        obs = []
         rewards = {}
         dones = {}
 
         for i, env in enumerate(self.envs):
-            obs, reward, terminated, truncated, _ = env.step(actions[i])
-            next_states[i] = tuple(obs)
+            o, reward, terminated, truncated, _ = env.step(actions[i])
+            obs.append(o)
             rewards[i] = reward
             dones[i] = terminated or truncated
 
+        next_states = self._dict_states(self.encode(np.array(obs)))
         done = all(dones.values())
 
-        global_reward = sum(rewards.values())
+        if mix:
+            rewards = self.mix_rewards(rewards)
 
-        for i in rewards:
-            rewards[i] += self.global_reward_weight * global_reward
+        return next_states, rewards, done
 
+    def mix_rewards(self, rewards):
+        # local rewards → local + weight * sum over the copy, or the
+        # neighbourhood mix of self.reward_mixer (dict from step(), or
+        # array with intersections on the last axis)
+        if self.reward_mixer is not None:
+            if isinstance(rewards, dict):
+                local = np.fromiter((rewards[i] for i in range(self.n)), dtype=np.float64, count=self.n)
+                return dict(enumerate(self.reward_mixer.mix(local)))
+            return self.reward_mixer.mix(rewards)
 
+        if isinstance(rewards, dict):
+            global_reward = sum(rewards.values())
+            for i in rewards:
+                rewards[i] += self.global_reward_weight * global_reward
+            return rewards
 
-        return next_states, rewards, done
+        return rewards + self.global_reward_weight * rewards.sum(axis=-1, keepdims=True)
+
+    # ----------------------------
+    # Array interface (vectorized mode)
+    #
+    # Shapes carry a leading num_envs axis when several independent copies
+    # run in lockstep: actions (num_envs, n), obs (num_envs, n, 3), or
+    # state ids (num_envs, n) with a discretizer.
+    # ----------------------------
+
+    def _batch_shape(self):
+        if self.num_envs > 1:
+            return (self.num_envs, self.n)
+        return (self.n,)
+
+    def reset_batch(self):
+        obs, _ = self.batch_env.reset()
+        return self.encode(obs.reshape(self._batch_shape() + (3,)))
+
+    def step_batch(self, actions, mix=True):
+        # actions → obs (or state ids), rewards (mixed within each copy
+        # unless mix=False), done
+        actions = np.asarray(actions).reshape(-1)
+        obs, rewards, terminated, truncated, _ = self.batch_env.step(actions)
+        done = bool(np.all(terminated | truncated))
+
+        shape = self._batch_shape()
+        obs = obs.reshape(shape + (3,))
+        rewards = rewards.reshape(shape)
+
+        if mix:
+            rewards = self.mix_rewards(rewards)
+
+        return self.encode(obs), rewards, done
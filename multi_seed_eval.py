@@ -0,0 +1,140 @@
+import json
+import math
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sumo_eval import run_sumo_eval
+from sumo_fixed_eval import run_fixed_gui
+from checkpoint import load_agents, load_policy, is_policy_dir, save_agents, save_policy
+from greedy_policy import GreedyPolicy
+
+
+# ============================================================
+# PARALLEL MULTI-SEED EVALUATION
+# ============================================================
+# Every (policy, seed) pair runs in its own worker process with its own
+# headless SUMO instance started with --seed, so the learned controller
+# and the fixed-time baseline are evaluated over all seeds concurrently.
+# Per-metric mean and 95% confidence intervals are aggregated and written
+# to JSON for plot_eval_comparison.py.
+
+METRICS = ("avg_wait", "avg_queue", "teleportations")
+
+# two-sided 95% Student-t quantiles for df = 1..30 (normal beyond)
+T_975 = (
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+)
+
+
+def confidence_interval(values):
+    # (mean, half-width of the 95% CI)
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    mean = float(values.mean())
+    if n < 2:
+        return mean, float("nan")
+    t = T_975[n - 2] if n - 1 <= len(T_975) else 1.96
+    return mean, float(t * values.std(ddof=1) / math.sqrt(n))
+
+
+def _eval_worker(job):
+    policy, seed, sumo_cfg, steps, agents_src, tls_to_agent, conn_factory = job
+
+    conn = conn_factory() if conn_factory is not None else None
+
+    if policy == "fixed_time":
+        result = run_fixed_gui(sumo_cfg, steps=steps, conn=conn, profile="fast", seed=seed)
+    else:
+        # the checkpoint / policy directory is memory-mapped, so workers
+        # share one copy; agents are frozen into a greedy policy
+        if is_policy_dir(agents_src):
+            controller = load_policy(agents_src, mmap=True)
+        else:
+            controller = GreedyPolicy.from_agents(load_agents(agents_src, mmap=True))
+        result = run_sumo_eval(
+            controller, tls_to_agent, sumo_cfg,
+            steps=steps, conn=conn, profile="fast", seed=seed
+        )
+
+    result["seed"] = seed
+    return policy, result
+
+
+def run_multi_seed_eval(
+    agents,
+    tls_to_agent,
+    sumo_cfg,
+    seeds=(0, 1, 2, 3, 4),
+    steps=2000,
+    max_workers=None,
+    conn_factory=None,
+    results_path="eval_results.json"
+):
+    # agents: checkpoint or saved-policy directory (see checkpoint.py), an
+    # agents dict or a greedy_policy.GreedyPolicy; the latter two are
+    # saved once to a temporary directory that the workers memory-map.
+    # conn_factory: picklable callable returning a fresh connection per
+    # worker (e.g. mock_traci.MockTraci); None uses sumo_backend defaults
+    with tempfile.TemporaryDirectory() as tmp:
+        agents_src = agents
+        if not isinstance(agents, str):
+            agents_src = os.path.join(tmp, "agents")
+            if isinstance(agents, GreedyPolicy):
+                save_policy(agents, agents_src)
+            else:
+                save_agents(agents, agents_src)
+
+        jobs = [
+            (policy, seed, sumo_cfg, steps, agents_src, tls_to_agent, conn_factory)
+            for policy in ("learned", "fixed_time")
+            for seed in seeds
+        ]
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            outputs = list(pool.map(_eval_worker, jobs))
+
+    summary = {"seeds": list(seeds), "steps": steps, "policies": {}}
+    for policy in ("learned", "fixed_time"):
+        per_seed = [r for p, r in outputs if p == policy]
+        stats = {}
+        for metric in METRICS:
+            values = [r[metric] for r in per_seed]
+            mean, ci95 = confidence_interval(values)
+            stats[metric] = {"mean": mean, "ci95": ci95, "values": values}
+        summary["policies"][policy] = {"per_seed": per_seed, "summary": stats}
+
+    if results_path is not None:
+        with open(results_path, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    return summary
+
+
+def format_summary(summary):
+    lines = []
+    for policy, data in summary["policies"].items():
+        parts = [
+            f"{m}={s['mean']:.2f} ± {s['ci95']:.2f}"
+            for m, s in data["summary"].items()
+        ]
+        lines.append(f"{policy:>12s}: " + " | ".join(parts))
+    return "\n".join(lines)
+
+
+# ============================================================
+# ENTRY
+# ============================================================
+if __name__ == "__main__":
+    tls_to_agent = {"J1": 0, "J2": 1, "J3": 2, "J4": 3}
+
+    summary = run_multi_seed_eval(
+        "trained_agents",
+        tls_to_agent,
+        "./sumo/intersection.sumocfg",
+        seeds=range(10)
+    )
+    print(format_summary(summary))
+    print("Saved eval_results.json")
@@ -0,0 +1,366 @@
+import hashlib
+import os
+import warnings
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from sumo_backend import libsumo, traci
+
+
+# ============================================================
+# TLS PHASE MAPS FROM THE NETWORK
+# ============================================================
+# Everything the SUMO controller needs to know about a TLS, derived from
+# the network instead of written by hand:
+#
+#   controlled lanes   incoming lane of every link, in link index order
+#                      (what trafficlight.getControlledLanes returns)
+#   action_phases[t, a, k]   green phases of action a at TLS t (-1 padded),
+#                      best first; phase_map[t, a] is the first one
+#   action_yellows[t, a, k]  phase to show when leaving action_phases[t, a, k]
+#   approach lanes     lanes with a green link in any phase of action a,
+#                      whose halting counts make the agent's queue for a
+#
+# Every link is put on the NS (action 0) or EW (action 1) axis by the
+# heading of its incoming lane where it meets the junction (NS when
+# |dy| >= |dx|, as scenarios.from_routes does). Every green phase (some
+# G/g, no y) is scored per action as green links on axis a minus green
+# links on the other axis and goes to the action it scores higher for
+# (NS on ties). An action takes its phases best first (lowest index on
+# ties), skipping those that give no link a green that an earlier one
+# did not, so a program with three green phases (e.g. a T junction's)
+# gives one action two and every movement still gets a green. An action
+# that wins no phase gets the one it scores best for. A yellow is the
+# first yellow phase after its green in the cycle, or the green itself
+# when the program has none. TLSNetwork warns about lanes the program
+# never gives a green at all, since no action can serve them.
+#
+# load_net() parses net.net.xml once with a streaming parser (lane
+# shapes, tlLogic, connections; nothing else is kept) and caches the
+# result as a small .npz keyed by the file's hash, so later runs skip
+# the XML entirely. from_traci() derives the same index over a live
+# connection, for backends without a network file (MockTraci, traces).
+# resolve_network() checks that the index it picks matches the TLS and
+# controlled lanes the connection reports.
+
+NET_CACHE_VERSION = 2
+
+NS, EW = 0, 1
+
+
+class TLSNetwork:
+    def __init__(self, tls_ids, lanes, link_lane, link_offsets, lane_axis, action_phases, action_yellows, green):
+        self.tls_ids = tuple(tls_ids)
+        self.lanes = tuple(lanes)
+        self.link_lane = np.asarray(link_lane, dtype=np.int64)          # (links,) → lanes
+        self.link_offsets = np.asarray(link_offsets, dtype=np.int64)    # (n_tls + 1,)
+        self.lane_axis = np.asarray(lane_axis, dtype=np.int8)           # (lanes,) NS / EW
+        self.action_phases = np.asarray(action_phases, dtype=np.int64)  # (n_tls, 2, k), -1 padded
+        self.action_yellows = np.asarray(action_yellows, dtype=np.int64)
+        self.green = np.asarray(green, dtype=bool)                      # (links, 2) link green for action
+
+        self.n_phases = (self.action_phases >= 0).sum(axis=2)           # (n_tls, 2)
+        self.phase_map = self.action_phases[:, :, 0]
+        self.yellow_map = self.action_yellows[:, :, 0]
+
+        self._row = {tls: t for t, tls in enumerate(self.tls_ids)}
+        self._approach = {}
+        for t, tls in enumerate(self.tls_ids):
+            lanes = self.controlled_lanes(tls)
+            green = self.green[self.link_offsets[t]:self.link_offsets[t + 1]]
+            self._approach[tls] = {
+                action: tuple(sorted({lane for lane, g in zip(lanes, green[:, action]) if g}))
+                for action in (0, 1)
+            }
+            starved = sorted(set(lanes) - set(self._approach[tls][0]) - set(self._approach[tls][1]))
+            if starved:
+                warnings.warn(f"TLS {tls}: lanes {starved} get no green in any phase of its program")
+
+    def rows(self, tls_ids):
+        return np.array([self._row[tls] for tls in tls_ids], dtype=np.int64)
+
+    def controlled_lanes(self, tls):
+        t = self._row[tls]
+        lanes = self.lanes
+        return tuple(lanes[k] for k in self.link_lane[self.link_offsets[t]:self.link_offsets[t + 1]].tolist())
+
+    def approach_lanes(self, tls):
+        # {action: sorted lanes with a green link in phase_map[tls, action]}
+        return self._approach[tls]
+
+    def phase_maps(self):
+        # ({tls: {action: [phase, ...]}}, {tls: {action: [yellow phase, ...]}})
+        phases, yellows = {}, {}
+        for t, tls in enumerate(self.tls_ids):
+            n = self.n_phases[t]
+            phases[tls] = {a: self.action_phases[t, a, :n[a]].tolist() for a in (0, 1)}
+            yellows[tls] = {a: self.action_yellows[t, a, :n[a]].tolist() for a in (0, 1)}
+        return phases, yellows
+
+    # ----------------------------
+    # Cache file
+    # ----------------------------
+
+    def save(self, path):
+        tmp = path + ".tmp.npz"
+        np.savez(
+            tmp,
+            version=np.array(NET_CACHE_VERSION),
+            tls_ids=np.array(self.tls_ids, dtype=str),
+            lanes=np.array(self.lanes, dtype=str),
+            link_lane=self.link_lane.astype(np.int32),
+            link_offsets=self.link_offsets,
+            lane_axis=self.lane_axis,
+            action_phases=self.action_phases.astype(np.int16),
+            action_yellows=self.action_yellows.astype(np.int16),
+            green=self.green,
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["version"]) != NET_CACHE_VERSION:
+                raise ValueError(f"{path}: unsupported cache version {int(data['version'])}")
+            return cls(
+                data["tls_ids"].tolist(), data["lanes"].tolist(), data["link_lane"], data["link_offsets"],
+                data["lane_axis"], data["action_phases"], data["action_yellows"], data["green"]
+            )
+
+
+# ----------------------------
+# Classification
+# ----------------------------
+
+def _axis(shape):
+    # NS / EW from the last segment of a lane shape [(x, y), ...]
+    (x0, y0), (x1, y1) = shape[-2], shape[-1]
+    return NS if abs(y1 - y0) >= abs(x1 - x0) else EW
+
+
+def _is_green(state):
+    return ("G" in state or "g" in state) and "y" not in state and "Y" not in state
+
+
+def classify_phases(states, link_axis):
+    # phase states of one TLS + axis of each link → (green phases per
+    # action, best first; their yellow phases)
+    link_axis = np.asarray(link_axis)
+    green = [p for p, s in enumerate(states) if _is_green(s)]
+    if not green:
+        raise ValueError("TLS program has no green phase")
+
+    lit = np.array([[c in "Gg" for c in states[p]] for p in green])
+    score = np.stack([
+        2 * np.count_nonzero(lit & (link_axis == action), axis=1) - np.count_nonzero(lit, axis=1)
+        for action in (NS, EW)
+    ])                                                      # (2, green phases)
+    owner = np.where(score[EW] > score[NS], EW, NS)
+
+    phases, yellows = [], []
+    for action in (NS, EW):
+        mine = np.flatnonzero(owner == action)
+        if not len(mine):
+            mine = np.array([int(np.argmax(score[action]))])
+        chosen = []
+        served = np.zeros(lit.shape[1], dtype=bool)
+        for k in mine[np.argsort(-score[action, mine], kind="stable")].tolist():
+            if not chosen or (lit[k] & ~served).any():
+                chosen.append(green[k])
+                served |= lit[k]
+        phases.append(chosen)
+        yellows.append([_yellow_after(states, p) for p in chosen])
+    return phases, yellows
+
+
+def _yellow_after(states, phase):
+    n = len(states)
+    for k in range(1, n):
+        state = states[(phase + k) % n]
+        if _is_green(state):
+            break
+        if "y" in state or "Y" in state:
+            return (phase + k) % n
+    return phase
+
+
+def build_network(programs, controlled_lanes, lane_shapes):
+    # programs {tls: [phase state, ...]}, controlled_lanes {tls: [lane per
+    # link]}, lane_shapes {lane: [(x, y), ...]} → TLSNetwork
+    tls_ids = sorted(programs)
+    lanes = sorted({lane for tls in tls_ids for lane in controlled_lanes[tls]})
+    lane_pos = {lane: k for k, lane in enumerate(lanes)}
+    lane_axis = [_axis(lane_shapes[lane]) for lane in lanes]
+
+    link_lane, link_offsets = [], [0]
+    classified, green = [], []
+    for tls in tls_ids:
+        links = list(controlled_lanes[tls])
+        link_lane.extend(lane_pos[lane] for lane in links)
+        link_offsets.append(len(link_lane))
+
+        states = programs[tls]
+        phases, yellows = classify_phases(states, [lane_axis[lane_pos[lane]] for lane in links])
+        classified.append((phases, yellows))
+        green.extend(zip(*[
+            [any(states[p][link] in "Gg" for p in phases[action]) for link in range(len(links))]
+            for action in (NS, EW)
+        ]))
+
+    # (n_tls, 2, k) tables, -1 past each action's phases
+    k = max(len(phases[action]) for phases, _ in classified for action in (NS, EW))
+    action_phases = np.full((len(tls_ids), 2, k), -1, dtype=np.int64)
+    action_yellows = np.full((len(tls_ids), 2, k), -1, dtype=np.int64)
+    for t, (phases, yellows) in enumerate(classified):
+        for action in (NS, EW):
+            action_phases[t, action, :len(phases[action])] = phases[action]
+            action_yellows[t, action, :len(yellows[action])] = yellows[action]
+
+    return TLSNetwork(tls_ids, lanes, link_lane, link_offsets, lane_axis, action_phases, action_yellows, green)
+
+
+# ----------------------------
+# Sources
+# ----------------------------
+
+def parse_net(net_file):
+    # stream net.net.xml: keep lane shapes of normal edges, the first
+    # program of every tlLogic and the TLS-controlled connections
+    lane_shapes = {}
+    programs = {}
+    links = {}
+    internal = False
+    states = None
+    root = None
+    depth = 0
+
+    for event, elem in ET.iterparse(net_file, events=("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            if root is None:
+                root = elem
+            depth += 1
+            if tag == "edge":
+                internal = elem.get("function") == "internal"
+            elif tag == "tlLogic":
+                states = []
+            continue
+
+        depth -= 1
+        if tag == "lane" and not internal:
+            lane_shapes[elem.get("id")] = [
+                tuple(map(float, point.split(","))) for point in elem.get("shape").split()
+            ]
+        elif tag == "phase" and states is not None:
+            states.append(elem.get("state"))
+        elif tag == "tlLogic":
+            programs.setdefault(elem.get("id"), states)
+            states = None
+        elif tag == "connection" and elem.get("tl") is not None:
+            lane = f"{elem.get('from')}_{elem.get('fromLane')}"
+            links.setdefault(elem.get("tl"), {})[int(elem.get("linkIndex"))] = lane
+
+        # drop finished top-level elements so memory stays flat
+        if depth == 1:
+            root.clear()
+
+    controlled_lanes = {
+        tls: [links.get(tls, {})[k] for k in range(len(programs[tls][0]))]
+        for tls in programs
+    }
+    return build_network(programs, controlled_lanes, lane_shapes)
+
+
+def file_hash(path, block=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_net(net_file, cache_dir=None):
+    # TLSNetwork of a .net.xml, through the cache (default: .net_cache/
+    # next to the network file); cache_dir=False disables it
+    if cache_dir is False:
+        return parse_net(net_file)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(net_file)), ".net_cache")
+
+    path = os.path.join(cache_dir, f"{file_hash(net_file)[:24]}.npz")
+    if os.path.exists(path):
+        try:
+            return TLSNetwork.load(path)
+        except ValueError:
+            pass   # written by another version: rebuild
+
+    net = parse_net(net_file)
+    os.makedirs(cache_dir, exist_ok=True)
+    net.save(path)
+    return net
+
+
+def from_traci(conn, tls_ids=None):
+    # same index over a live connection: programs, controlled lanes and
+    # lane shapes come from TraCI (one query per TLS / lane)
+    tls_ids = conn.trafficlight.getIDList() if tls_ids is None else tls_ids
+    programs, controlled_lanes = {}, {}
+    for tls in tls_ids:
+        programs[tls] = [p.state for p in conn.trafficlight.getAllProgramLogics(tls)[0].phases]
+        controlled_lanes[tls] = list(conn.trafficlight.getControlledLanes(tls))
+    lanes = {lane for links in controlled_lanes.values() for lane in links}
+    lane_shapes = {lane: conn.lane.getShape(lane) for lane in lanes}
+    return build_network(programs, controlled_lanes, lane_shapes)
+
+
+def net_file_from_cfg(sumo_cfg):
+    # the net-file named in a .sumocfg, or None
+    if not os.path.isfile(sumo_cfg):
+        return None
+    for elem in ET.parse(sumo_cfg).getroot().iter("net-file"):
+        return os.path.join(os.path.dirname(sumo_cfg), elem.get("value"))
+    return None
+
+
+def _is_sumo(conn):
+    return any(conn is backend for backend in (traci, libsumo) if backend is not None)
+
+
+def check_network(net, conn, tls_ids):
+    # raise if net does not describe the TLS conn is simulating
+    missing = [tls for tls in tls_ids if tls not in net.tls_ids]
+    if missing:
+        raise ValueError(f"network has no TLS {missing}; it does not match the simulation")
+    for tls in tls_ids:
+        if tuple(conn.trafficlight.getControlledLanes(tls)) != net.controlled_lanes(tls):
+            raise ValueError(f"controlled lanes of TLS {tls} differ between the network and the simulation")
+
+
+def resolve_network(network, sumo_cfg, conn, tls_ids):
+    # network: TLSNetwork, a .net.xml path, or None: the sumocfg's network
+    # file when conn is SUMO itself (traci / libsumo) and the file exists,
+    # else derived over conn (MockTraci, trace replays, ...)
+    if isinstance(network, TLSNetwork):
+        net = network
+    elif network is not None:
+        net = load_net(network)
+    else:
+        net_file = net_file_from_cfg(sumo_cfg) if _is_sumo(conn) else None
+        if net_file is None or not os.path.isfile(net_file):
+            return from_traci(conn, tls_ids)
+        net = load_net(net_file)
+    check_network(net, conn, tls_ids)
+    return net
+
+
+# ============================================================
+# ENTRY
+# ============================================================
+if __name__ == "__main__":
+    import sys
+
+    net = load_net(sys.argv[1] if len(sys.argv) > 1 else "sumo/net.net.xml")
+    phases, yellows = net.phase_maps()
+    for tls in net.tls_ids:
+        print(tls, "phases:", phases[tls], "yellow:", yellows[tls], "approach lanes:", net.approach_lanes(tls))
@@ -1,29 +1,45 @@
-import matplotlib.pyplot as plt
-import numpy as np
+import argparse
+import json
 import os
 
-os.makedirs("plots", exist_ok=True)
+import matplotlib.pyplot as plt
+from plotting import plot_eval_comparison, EVAL_METRICS
+
+# Box plots of the stored multi-seed SUMO evaluations (multi_seed_eval.py
+# writes eval_results.json). Several result files, e.g. one per
+# checkpoint or sweep configuration, are compared side by side.
+#
+#   python plot_eval_comparison.py
+#   python plot_eval_comparison.py runs/a/eval_results.json runs/b/eval_results.json
+
+parser = argparse.ArgumentParser()
+parser.add_argument("paths", nargs="*", default=["eval_results.json"])
+parser.add_argument("--out", default="plots/eval_comparison.png")
+args = parser.parse_args()
+
+results = []
+for path in args.paths:
+    with open(path) as f:
+        results.append(json.load(f))
 
-# Replace these with your actual numbers
-random_policy = [-1600, -1500, -1700, -1550, -1650]
-independent_iql = [-1200, -1350, -1000, -1600, -1100]
-cooperative_iql = [-597, -627, -718, -1446, -652]
+# label boxes by file only when comparing several
+names = None
+if len(results) > 1:
+    names = [os.path.basename(os.path.dirname(os.path.abspath(p))) or p for p in args.paths]
+    if len(set(names)) < len(names):
+        names = [os.path.splitext(p)[0] for p in args.paths]
 
-labels = ["Random", "Independent IQL", "Cooperative IQL"]
-data = [
-    random_policy,
-    independent_iql,
-    cooperative_iql
-]
+n_boxes = sum(len(r["policies"]) for r in results)
+fig, axes = plt.subplots(1, len(EVAL_METRICS), figsize=(max(4, 1.2 * n_boxes) * len(EVAL_METRICS), 4))
 
-plt.figure()
-plt.boxplot(data, labels=labels, showmeans=True)
+plot_eval_comparison(axes, results, names)
 
-plt.ylabel("Evaluation Reward (lower is worse)")
-plt.title("Evaluation Performance Comparison")
-plt.grid(True)
+seeds = sorted({len(r["seeds"]) for r in results})
+fig.suptitle(f"SUMO Evaluation over {'/'.join(map(str, seeds))} seeds (mean ± 95% CI)")
+fig.tight_layout()
 
-plt.savefig("plots/eval_comparison.png")
-plt.close()
+os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+fig.savefig(args.out)
+plt.close(fig)
 
-print("Saved plots/eval_comparison.png")
+print(f"Saved {args.out}")
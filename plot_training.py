@@ -1,34 +1,56 @@
-import numpy as np
-import matplotlib.pyplot as plt
+import argparse
 import os
 
-os.makedirs("plots", exist_ok=True)
-
-# load rewards (or import trainer and access directly)
-episode_rewards = np.loadtxt("episode_rewards.csv")
-
-# moving average smoothing
-def moving_average(x, window=20):
-    return np.convolve(x, np.ones(window)/window, mode="valid")
-
-smoothed = moving_average(episode_rewards, window=20)
-
-plt.figure()
-plt.plot(episode_rewards, alpha=0.3, label="Raw Reward")
-plt.plot(
-    range(len(smoothed)),
-    smoothed,
-    linewidth=2,
-    label="Smoothed (window=20)"
+import matplotlib.pyplot as plt
+from metrics_log import read_metrics
+from plotting import plot_runs, lttb, BINS
+
+# Training curves from one or many runs, drawn at screen resolution (see
+# plotting.py): rolling mean with a 10%-90% band per run, plus the raw
+# min/max envelope for a single run.
+#
+#   python plot_training.py                          # training_metrics.bin or episode_rewards.csv
+#   python plot_training.py sweep_logs/*.bin --out plots/sweep.png
+#   python plot_training.py run.bin --lttb           # raw curve as LTTB-selected points
+
+METRICS_PATH = "training_metrics.bin"
+
+parser = argparse.ArgumentParser()
+parser.add_argument("paths", nargs="*", help="metrics logs (.bin) or reward CSVs")
+parser.add_argument("--column", default="total_reward")
+parser.add_argument("--window", type=int, default=100, help="rolling mean window (episodes)")
+parser.add_argument("--bins", type=int, default=BINS, help="points per curve")
+parser.add_argument("--lttb", action="store_true", help="draw the raw curve of a single .bin log with LTTB")
+parser.add_argument("--out", default="plots/marl_training_reward.png")
+args = parser.parse_args()
+
+paths = args.paths
+if not paths:
+    # streamed log written during training, else the rewards CSV saved
+    # by MARLTrainer.evaluate() (older runs)
+    paths = [METRICS_PATH if os.path.exists(METRICS_PATH) else "episode_rewards.csv"]
+
+os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+
+fig, ax = plt.subplots(figsize=(10, 5))
+
+single = len(paths) == 1
+if single and args.lttb and paths[0].endswith(".bin"):
+    log = read_metrics(paths[0])
+    x, y = lttb(log["episode"], log[args.column], args.bins)
+    ax.plot(x, y, alpha=0.3, linewidth=0.8, color="tab:blue", label="Raw (LTTB)")
+
+plot_runs(
+    ax, paths, column=args.column, bins=args.bins, window=args.window,
+    envelope=single and not args.lttb,
+    labels=[f"Rolling mean (window={args.window})"] if single else None
 )
 
-plt.xlabel("Episode")
-plt.ylabel("Total Reward (sum over agents)")
-plt.title("MARL Training Reward Progress")
-plt.legend()
-plt.grid(True)
+ax.set_ylabel("Total Reward (sum over agents)" if args.column == "total_reward" else args.column)
+ax.set_title("MARL Training Reward Progress" if single else f"MARL Training Reward Progress ({len(paths)} runs)")
 
-plt.savefig("plots/marl_training_reward.png")
-plt.close()
+fig.tight_layout()
+fig.savefig(args.out)
+plt.close(fig)
 
-print("Saved plots/marl_training_reward.png")
+print(f"Saved {args.out}")
@@ -0,0 +1,280 @@
+import os
+from itertools import islice
+
+import numpy as np
+import matplotlib.pyplot as plt
+from metrics_log import read_metrics
+
+
+# ============================================================
+# SCALABLE TRAINING PLOTS
+# ============================================================
+# A training curve is never drawn point by point. The series is read in
+# chunks (a memory-mapped metrics log, or a rewards CSV read a block of
+# lines at a time) and reduced on the fly to a fixed number of bins,
+# about the figure's width in pixels. Per bin it keeps:
+#
+#   mean, min / max envelope, quantile band (e.g. 10%-90%),
+#   rolling mean over the last `window` episodes at the bin's end
+#
+# so memory and drawing time depend on the number of bins, not on the
+# number of episodes, and the figure looks the same as the full series
+# would at that resolution. lttb() picks representative raw points
+# instead (Largest-Triangle-Three-Buckets), for a single thin line.
+#
+# Many runs (seeds, sweep configurations) are overlaid by summarizing
+# each one the same way; see plot_runs().
+
+CHUNK = 1 << 16
+
+BINS = 2000
+
+
+# ----------------------------
+# Reading
+# ----------------------------
+
+def _is_log(path):
+    return path.endswith(".bin")
+
+
+def series_length(path):
+    # number of values, without loading them
+    if _is_log(path):
+        return len(read_metrics(path))
+    count = 0
+    last = b"\n"
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            count += block.count(b"\n")
+            last = block[-1:]
+    return count + (last != b"\n")
+
+
+def iter_chunks(path, column="total_reward", chunk=CHUNK):
+    # float64 blocks of one column: a field of a metrics log (memory-mapped;
+    # per-agent fields are averaged over agents), or the values of a
+    # one-column text file such as episode_rewards.csv
+    if _is_log(path):
+        log = read_metrics(path)
+        for start in range(0, len(log), chunk):
+            values = np.asarray(log[column][start:start + chunk], dtype=np.float64)
+            if values.ndim > 1:
+                values = values.mean(axis=1)
+            yield values
+        return
+
+    with open(path) as f:
+        while True:
+            lines = list(islice(f, chunk))
+            if not lines:
+                return
+            yield np.loadtxt(lines, dtype=np.float64, ndmin=1)
+
+
+# ----------------------------
+# Streaming summary
+# ----------------------------
+
+class SeriesSummary:
+    # push() consecutive chunks of a series of known length n; bins are
+    # contiguous, near-equal ranges of episodes. Values of a bin that is
+    # still open at the end of a chunk are carried to the next one.
+    def __init__(self, n, bins=BINS, window=100, quantiles=(0.1, 0.9)):
+        self.n = n
+        self.window = window
+        self.quantiles = tuple(quantiles)
+        n_bins = max(1, min(bins, n))
+        self.edges = np.linspace(0, n, n_bins + 1).round().astype(np.int64)
+
+        self.mean = np.full(n_bins, np.nan)
+        self.min = np.full(n_bins, np.nan)
+        self.max = np.full(n_bins, np.nan)
+        self.rolling = np.full(n_bins, np.nan)
+        self.bands = np.full((len(self.quantiles), n_bins), np.nan)
+
+        self.pos = 0            # values consumed
+        self.next_bin = 0       # first bin not yet finished
+        self.carry = np.zeros(0)
+        self.tail = np.zeros(0)  # last window - 1 values, for the rolling mean
+
+    @property
+    def x(self):
+        # episode index at the end of each bin
+        return self.edges[1:] - 1
+
+    def push(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        start = self.pos - len(self.carry)
+        data = np.concatenate([self.carry, values]) if len(self.carry) else values
+        self.pos += len(values)
+
+        # bins that end inside what has been read so far
+        last = np.searchsorted(self.edges, self.pos, side="right") - 1
+        done = np.arange(self.next_bin, last)
+        if len(done):
+            self._bin_stats(done, data, start)
+        self._rolling(done, values)
+        self.next_bin = max(self.next_bin, last)
+
+        self.carry = data[self.edges[self.next_bin] - start:]
+
+    def _bin_stats(self, done, data, start):
+        lo = self.edges[done] - start
+        hi = self.edges[done + 1] - start
+        segment = data[lo[0]:hi[-1]]
+        starts = lo - lo[0]
+        counts = hi - lo
+
+        self.mean[done] = np.add.reduceat(segment, starts) / counts
+        self.min[done] = np.minimum.reduceat(segment, starts)
+        self.max[done] = np.maximum.reduceat(segment, starts)
+
+        # quantiles: sort within bins (one lexsort), then interpolate
+        # linearly between order statistics, as np.quantile does
+        bin_id = np.repeat(np.arange(len(done)), counts)
+        ordered = segment[np.lexsort((segment, bin_id))]
+        for k, q in enumerate(self.quantiles):
+            rank = q * (counts - 1)
+            below = np.floor(rank).astype(np.int64)
+            above = np.minimum(below + 1, counts - 1)
+            frac = rank - below
+            v0 = ordered[starts + below]
+            v1 = ordered[starts + above]
+            self.bands[k, done] = v0 + frac * (v1 - v0)
+
+    def _rolling(self, done, values):
+        # rolling mean at each finished bin's last episode, from a cumsum
+        # over (previous window - 1 values, this chunk)
+        w = self.window
+        seq = np.concatenate([self.tail, values])
+        offset = self.pos - len(seq)
+        if len(done):
+            cs = np.concatenate([[0.0], np.cumsum(seq)])
+            end = self.edges[done + 1] - offset
+            begin = np.maximum(end - w, 0)
+            self.rolling[done] = (cs[end] - cs[begin]) / (end - begin)
+        self.tail = seq[-(w - 1):] if w > 1 else seq[:0]
+
+    def result(self):
+        return {
+            "x": self.x,
+            "mean": self.mean,
+            "min": self.min,
+            "max": self.max,
+            "rolling": self.rolling,
+            "bands": {q: band for q, band in zip(self.quantiles, self.bands)},
+        }
+
+
+def summarize(path, column="total_reward", bins=BINS, window=100, quantiles=(0.1, 0.9), chunk=CHUNK):
+    summary = SeriesSummary(series_length(path), bins, window, quantiles)
+    for values in iter_chunks(path, column, chunk):
+        summary.push(values)
+    return summary.result()
+
+
+# ----------------------------
+# Downsampling
+# ----------------------------
+
+def minmax_envelope(y, bins=BINS):
+    # (x, low, high) per bin of an in-memory (or memory-mapped) array
+    summary = SeriesSummary(len(y), bins, window=1, quantiles=())
+    for start in range(0, len(y), CHUNK):
+        summary.push(y[start:start + CHUNK])
+    return summary.x, summary.min, summary.max
+
+
+def lttb(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: keep the first and last point and,
+    # from each of n_out - 2 buckets, the point forming the largest
+    # triangle with the point kept before it and the next bucket's mean.
+    # Reads one bucket at a time, so memory-mapped series stay on disk.
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.asarray(x), np.asarray(y)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.zeros(n_out, dtype=np.int64)
+    keep[-1] = n - 1
+    ax, ay = float(x[0]), float(y[0])
+
+    bucket_x = np.asarray(x[edges[0]:edges[1]], dtype=np.float64)
+    bucket_y = np.asarray(y[edges[0]:edges[1]], dtype=np.float64)
+    for b in range(n_out - 2):
+        if b + 2 < len(edges):
+            next_x = np.asarray(x[edges[b + 1]:edges[b + 2]], dtype=np.float64)
+            next_y = np.asarray(y[edges[b + 1]:edges[b + 2]], dtype=np.float64)
+            cx, cy = next_x.mean(), next_y.mean()
+        else:
+            next_x = next_y = None
+            cx, cy = float(x[n - 1]), float(y[n - 1])
+
+        area = np.abs((ax - cx) * (bucket_y - ay) - (ax - bucket_x) * (cy - ay))
+        k = int(np.argmax(area))
+        keep[b + 1] = edges[b] + k
+        ax, ay = bucket_x[k], bucket_y[k]
+        bucket_x, bucket_y = next_x, next_y
+
+    return np.asarray(x)[keep], np.asarray(y)[keep]
+
+
+# ----------------------------
+# Figures
+# ----------------------------
+
+def run_label(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def plot_runs(ax, paths, column="total_reward", bins=BINS, window=100, quantiles=(0.1, 0.9),
+              envelope=False, labels=None):
+    # one rolling-mean line and quantile band per run; envelope=True adds
+    # the min/max range, which only reads well for a few runs
+    labels = labels or [run_label(p) for p in paths]
+    if len(paths) <= 10:
+        colors = plt.get_cmap("tab10")(np.arange(len(paths)))
+    else:
+        colors = plt.get_cmap("viridis")(np.linspace(0, 1, len(paths)))
+
+    for path, label, color in zip(paths, labels, colors):
+        s = summarize(path, column, bins, window, quantiles)
+        if envelope:
+            ax.fill_between(s["x"], s["min"], s["max"], color=color, alpha=0.08, linewidth=0)
+        if len(quantiles) == 2:
+            lo, hi = (s["bands"][q] for q in quantiles)
+            ax.fill_between(s["x"], lo, hi, color=color, alpha=0.2, linewidth=0)
+        ax.plot(s["x"], s["rolling"], color=color, linewidth=1.5, label=label)
+
+    ax.set_xlabel("Episode")
+    ax.grid(True)
+    if len(paths) <= 20:
+        ax.legend(fontsize="small", ncol=1 + len(paths) // 10)
+
+
+EVAL_LABELS = {"learned": "Cooperative IQL", "fixed_time": "Fixed-time"}
+
+EVAL_METRICS = ("avg_wait", "avg_queue", "teleportations")
+
+
+def plot_eval_comparison(axes, results, names=None):
+    # results: eval summaries written by multi_seed_eval (one or several
+    # files, e.g. different checkpoints); one box per (file, policy) with
+    # its mean ± 95% CI beside it
+    names = names or [None] * len(results)
+    boxes = []
+    for result, name in zip(results, names):
+        for policy, data in result["policies"].items():
+            label = EVAL_LABELS.get(policy, policy)
+            boxes.append((label if name is None else f"{name}\n{label}", data["summary"]))
+
+    for ax, metric in zip(axes, EVAL_METRICS):
+        ax.boxplot([s[metric]["values"] for _, s in boxes], labels=[label for label, _ in boxes], showmeans=True)
+        for k, (_, s) in enumerate(boxes):
+            ax.errorbar(k + 1.25, s[metric]["mean"], yerr=np.nan_to_num(s[metric]["ci95"]),
+                        fmt="o", color="black", capsize=4)
+        ax.set_title(metric)
+        ax.grid(True)
+        if len(boxes) > 4:
+            ax.tick_params(axis="x", labelrotation=45)
@@ -1,6 +1,8 @@
 from collections import defaultdict
+import sys
 import numpy as np
-import random
+from discretizer import StateDiscretizer
+from rng_streams import BlockStream, make_generator
 
 class QLearningAgent:
     def __init__(
@@ -12,7 +14,11 @@ class QLearningAgent:
         gamma=0.99,
         epsilon=1.0,
         epsilon_min=0.05,
-        epsilon_decay=0.995
+        epsilon_decay=0.995,
+        state_bounds=None,
+        dtype=np.float64,
+        discretizer=None,
+        seed=None
     ):
         self.state_size = state_size
         self.action_size = action_size
@@ -25,17 +31,146 @@ class QLearningAgent:
         self.epsilon_min = epsilon_min
         self.epsilon_decay = epsilon_decay
 
+        self.dtype = np.dtype(dtype)
+
+        # exploration draws: one (explore?, random action) uniform pair per
+        # select_action from this agent's own generator
+        self.stream = BlockStream(make_generator(seed), 2)
+
+        # dict storage; in dense mode it only holds out-of-bounds states
         self.q_table = {}
 
+        # rows / dict states updated since the last checkpoint save
+        # (checkpoint.TrainingCheckpointer clears them)
+        self.dirty_keys = set()
+
+        # Dense storage: a StateDiscretizer maps each state to one row of a
+        # contiguous (num_states, actions) array. state_bounds is shorthand
+        # for one bin per integer value in [0, high]; states outside the
+        # bounds then stay in the dict. Integer states are used as row ids.
+        if discretizer is None and state_bounds is not None:
+            discretizer = StateDiscretizer.from_bounds(state_bounds, clip=False)
+
+        self.discretizer = discretizer
+        self.q_dense = None
+        if discretizer is not None:
+            self.num_states = discretizer.num_states
+            self.q_dense = np.zeros((self.num_states, action_size), dtype=self.dtype)
+            self.visited = np.zeros(self.num_states, dtype=bool)
+            self.dirty = np.zeros(self.num_states, dtype=bool)
+            self._index_cache = {}
+
+
+    @property
+    def dense(self):
+        return self.q_dense is not None
+
+    @property
+    def state_bounds(self):
+        if self.discretizer is None:
+            return None
+        return self.discretizer.max_values
+
+    def state_index(self, state):
+        # flat row index of a state, or -1 if it has no dense row
+        if isinstance(state, (int, np.integer)):
+            return int(state)
+        return self.discretizer.encode(state)
+
+    def _dense_index(self, state):
+        if isinstance(state, (int, np.integer)):
+            self.visited[state] = True
+            return int(state)
+
+        # encoding is memoised so repeat visits cost one dict probe
+        idx = self._index_cache.get(state)
+        if idx is None:
+            idx = self.state_index(state)
+            self._index_cache[state] = idx
+            if idx >= 0:
+                self.visited[idx] = True
+        return idx
+
+    def _q_row(self, state):
+        if self.q_dense is not None:
+            idx = self._dense_index(state)
+            if idx >= 0:
+                return self.q_dense[idx]
+
+        row = self.q_table.get(state)
+        if row is None:
+            row = np.zeros(self.action_size, dtype=self.dtype)
+            self.q_table[state] = row
+        return row
+
+    def num_states_seen(self):
+        seen = len(self.q_table)
+        if self.q_dense is not None:
+            seen += int(np.count_nonzero(self.visited))
+        return seen
+
+    def memory_usage(self):
+        # approximate bytes held by the Q-values (dense array + dict rows)
+        total = sys.getsizeof(self.q_table)
+        for state, row in self.q_table.items():
+            total += sys.getsizeof(state) + sys.getsizeof(row)
+        if self.q_dense is not None:
+            total += self.q_dense.nbytes + self.visited.nbytes
+        return total
+
+    # ----------------------------
+    # Pickling: dense tables store only visited rows
+    # ----------------------------
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_index_cache", None)
+        state.pop("dirty_keys", None)
+        if self.q_dense is not None:
+            rows = np.flatnonzero(self.visited)
+            state["q_dense"] = (rows, self.q_dense[rows])
+            state.pop("visited")
+            state.pop("dirty", None)
+        return state
+
+    def __setstate__(self, state):
+        # pickles from before dense mode existed are dict-only agents
+        state.setdefault("dtype", np.dtype(np.float64))
+        if "stream" not in state:
+            state["stream"] = BlockStream(make_generator(None), 2)
+        bounds = state.pop("state_bounds", None)
+        state.pop("_strides", None)
+        if "discretizer" not in state:
+            state["discretizer"] = (
+                StateDiscretizer.from_bounds(bounds, clip=False) if bounds else None
+            )
+
+        packed = state.setdefault("q_dense", None)
+        if packed is not None:
+            rows, values = packed
+            state["q_dense"] = np.zeros((state["num_states"], state["action_size"]), dtype=state["dtype"])
+            state["q_dense"][rows] = values
+            state["visited"] = np.zeros(state["num_states"], dtype=bool)
+            state["visited"][rows] = True
+            state["dirty"] = np.zeros(state["num_states"], dtype=bool)
+            state["_index_cache"] = {}
+        state["dirty_keys"] = set()
+        self.__dict__.update(state)
 
-    def select_action(self, state):
-        if state not in self.q_table:
-            self.q_table[state] = np.zeros(self.action_size)
 
-        if np.random.rand() < self.epsilon:
-            action = np.random.randint(self.action_size)
+    def select_action(self, state):
+        idx = self._dense_index(state) if self.q_dense is not None else -1
+        if idx < 0:
+            q_values = self._q_row(state)
+
+        u, v = self.stream.next()
+        if u < self.epsilon:
+            action = int(v * self.action_size)
+        elif idx >= 0:
+            q_values = self.q_dense[idx].tolist()
+            action = q_values.index(max(q_values))
         else:
-            action = np.argmax(self.q_table[state])
+            action = q_values.argmax()
 
         # ✅ epsilon decay (THIS WAS MISSING)
         self.epsilon = max(self.epsilon_min, self.epsilon * self.epsilon_decay)
@@ -44,20 +179,76 @@ class QLearningAgent:
 
 
     def update(self, state, action, reward, next_state):
-        # Initialize state if unseen
-        if state not in self.q_table:
-            self.q_table[state] = np.zeros(self.action_size)
-
-        # Initialize next_state if unseen  ✅ THIS FIXES THE ERROR
-        if next_state not in self.q_table:
-            self.q_table[next_state] = np.zeros(self.action_size)
-
-        best_next = np.max(self.q_table[next_state])
+        if self.q_dense is not None:
+            idx = self._dense_index(state)
+            next_idx = self._dense_index(next_state)
+            if idx >= 0 and next_idx >= 0:
+                q = self.q_dense
+                best_next = max(q[next_idx].tolist())
+                td_target = reward + self.gamma * best_next
+                q[idx, action] += self.alpha * (td_target - q[idx, action])
+                self.dirty[idx] = True
+                return
+
+        # Initialize state / next_state if unseen
+        q_values = self._q_row(state)
+        best_next = self._q_row(next_state).max()
 
         td_target = reward + self.gamma * best_next
-        td_error = td_target - self.q_table[state][action]
+        td_error = td_target - q_values[action]
 
-        self.q_table[state][action] += self.alpha * td_error
+        q_values[action] += self.alpha * td_error
+        if self.q_dense is not None and idx >= 0:
+            self.dirty[idx] = True
+        else:
+            self.dirty_keys.add(state)
+
+    def update_batch(self, states, actions, rewards, next_states, weights=None):
+        # minibatch TD step on the dense table (e.g. from a replay buffer):
+        # states / next_states are (batch, state_dim) raw observations or
+        # (batch,) state ids, all errors taken before the step; transitions
+        # outside the table are skipped. weights scale each step; rows
+        # hitting the same (state, action), e.g. a prioritized row drawn
+        # twice, share one averaged step (summing steps from the same
+        # stale Q overshoots).
+        # Returns the TD errors.
+        if self.q_dense is None:
+            raise ValueError("update_batch needs a dense Q-table (discretizer or state_bounds)")
+        idx = self._batch_index(states)
+        next_idx = self._batch_index(next_states)
+        actions = np.asarray(actions, dtype=np.int64)
+        valid = (idx >= 0) & (next_idx >= 0)
+
+        q = self.q_dense
+        td_error = np.zeros(len(idx))
+        idx, next_idx, actions = idx[valid], next_idx[valid], actions[valid]
+        td_error[valid] = (
+            np.asarray(rewards, dtype=np.float64)[valid]
+            + self.gamma * q[next_idx].max(axis=1)
+            - q[idx, actions]
+        )
+
+        step = self.alpha * td_error[valid]
+        if weights is not None:
+            step = step * np.asarray(weights)[valid]
+        flat = np.ravel_multi_index((idx, actions), q.shape)
+        cells, inverse, counts = np.unique(flat, return_inverse=True, return_counts=True)
+        total = np.bincount(inverse, weights=step, minlength=len(cells))
+        q[cells // q.shape[1], cells % q.shape[1]] += (total / counts).astype(self.dtype)
+        self.visited[idx] = True
+        self.visited[next_idx] = True
+        self.dirty[idx] = True
+        return td_error
+
+    def _batch_index(self, states):
+        states = np.asarray(states)
+        if states.ndim == 1:
+            return states.astype(np.int64)
+        return self.discretizer.encode_batch(states)
+
+    def reseed(self, seed):
+        # restart the exploration stream (int or SeedSequence)
+        self.stream = BlockStream(make_generator(seed), 2)
 
     def decay_epsilon(self, min_eps=0.05, decay=0.999):
         self.epsilon = max(min_eps, self.epsilon * decay)
@@ -0,0 +1,220 @@
+import numpy as np
+from rng_streams import make_generator
+
+
+# ============================================================
+# EXPERIENCE REPLAY
+# ============================================================
+# A preallocated ring of joint transitions: row t holds every agent's
+# (state, action, reward, next_state) for one env step, as one record of
+# a structured array. Adding writes into the next slot(s) in place, so
+# nothing is allocated per step; once full, the oldest rows are
+# overwritten.
+#
+# States are whatever the learner consumes: state ids (shape ()) for the
+# batched Q-learner, raw observations (shape (state_dim,)) for per-agent
+# update_batch() calls.
+#
+# sample() draws a minibatch of rows uniformly, or, with prioritized=True,
+# proportionally to priority^alpha through a sum-tree (a few vectorized
+# ops per tree level for the whole batch), returning importance-sampling weights
+# (size * P)^-beta normalized by their max. A row's priority is the mean
+# |TD error| over agents from its last replay; new rows get the largest
+# priority seen so far, so every transition is replayed at least once.
+
+class SumTree:
+    # k-ary sum-tree: every node holds the sum of its `fanout` children, so
+    # a draw or an update walks only log_fanout(capacity) levels (3 for a
+    # 32k-row buffer), each one vectorized over the whole batch.
+    # levels[0] is the root, levels[-1] the leaves.
+    def __init__(self, capacity, fanout=32):
+        self.capacity = capacity
+        self.fanout = fanout
+        self.depth = 1
+        while fanout ** self.depth < capacity:
+            self.depth += 1
+        self.levels = [np.zeros(fanout ** d) for d in range(self.depth + 1)]
+
+    @property
+    def total(self):
+        return self.levels[0][0]
+
+    def get(self, idx):
+        return self.levels[-1][idx]
+
+    def update(self, idx, priority):
+        f = self.fanout
+        self.levels[-1][idx] = priority
+        if np.ndim(idx) == 0:
+            # single leaf (one new transition): scalar walk up
+            node = int(idx)
+            for d in range(self.depth - 1, -1, -1):
+                node //= f
+                self.levels[d][node] = self.levels[d + 1][node * f:(node + 1) * f].sum()
+            return
+
+        # parents shared by several leaves are just recomputed repeatedly
+        node = np.asarray(idx, dtype=np.int64)
+        for d in range(self.depth - 1, -1, -1):
+            node = node // f
+            self.levels[d][node] = self.levels[d + 1].reshape(-1, f)[node].sum(axis=1)
+
+    def find(self, u):
+        # prefix sums u (array) → leaf indices
+        u = np.array(u, dtype=np.float64)
+        rows = np.arange(len(u))
+        node = np.zeros(len(u), dtype=np.int64)
+        for d in range(1, self.depth + 1):
+            children = self.levels[d].reshape(-1, self.fanout)[node]
+            prefix = np.cumsum(children, axis=1)
+            k = np.minimum((prefix <= u[:, None]).sum(axis=1), self.fanout - 1)
+            u -= prefix[rows, k] - children[rows, k]
+            node = node * self.fanout + k
+        return node
+
+    def clear(self):
+        for level in self.levels:
+            level[:] = 0.0
+
+
+class ReplayBuffer:
+    def __init__(
+        self,
+        capacity,
+        n_agents,
+        state_shape=(),
+        state_dtype=np.int64,
+        prioritized=False,
+        alpha=0.6,
+        beta=0.4,
+        eps=1e-3,
+        seed=None
+    ):
+        self.capacity = capacity
+        self.n_agents = n_agents
+        agent_state = (n_agents,) + tuple(state_shape)
+        self.dtype = np.dtype([
+            ("state", state_dtype, agent_state),
+            ("action", np.int64, (n_agents,)),
+            ("reward", np.float64, (n_agents,)),
+            ("next_state", state_dtype, agent_state),
+        ])
+        self.data = np.zeros(capacity, dtype=self.dtype)
+        self.pos = 0
+        self.size = 0
+        self.unsaved = 0    # rows added since the last get_state
+
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.beta = beta
+        self.eps = eps
+        self.tree = SumTree(capacity) if prioritized else None
+        self.max_priority = 1.0
+
+        self.rng = make_generator(seed)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, states, actions, rewards, next_states):
+        # one joint transition (arrays / dicts indexed by agent)
+        slot = self.pos
+        row = self.data[slot:slot + 1]
+        row["state"] = [states[i] for i in range(self.n_agents)]
+        row["action"] = [actions[i] for i in range(self.n_agents)]
+        row["reward"] = [rewards[i] for i in range(self.n_agents)]
+        row["next_state"] = [next_states[i] for i in range(self.n_agents)]
+        self._advance(slot, 1)
+
+    def add_batch(self, states, actions, rewards, next_states):
+        # k joint transitions, arrays with a leading axis of k (e.g. the
+        # lockstep env copies of one step)
+        k = len(states)
+        slots = (self.pos + np.arange(k)) % self.capacity
+        data = self.data
+        data["state"][slots] = states
+        data["action"][slots] = actions
+        data["reward"][slots] = rewards
+        data["next_state"][slots] = next_states
+        self._advance(slots, k)
+
+    def _advance(self, slots, k):
+        if self.tree is not None:
+            self.tree.update(slots, self.max_priority)
+        self.pos = (self.pos + k) % self.capacity
+        self.size = min(self.size + k, self.capacity)
+        self.unsaved = min(self.unsaved + k, self.capacity)
+
+    def sample(self, batch_size):
+        # → (indices, rows, importance weights or None)
+        if self.tree is None:
+            idx = self.rng.integers(0, self.size, size=batch_size)
+            return idx, self.data[idx], None
+
+        # one draw per equal slice of the total priority mass
+        total = self.tree.total
+        u = (np.arange(batch_size) + self.rng.random(batch_size)) * (total / batch_size)
+        idx = np.minimum(self.tree.find(np.minimum(u, total * (1 - 1e-12))), self.size - 1)
+
+        probs = self.tree.get(idx) / total
+        weights = (self.size * probs) ** -self.beta
+        return idx, self.data[idx], weights / weights.max()
+
+    def update_priorities(self, idx, td_error):
+        if self.tree is None:
+            return
+        td = np.abs(np.asarray(td_error, dtype=np.float64)).reshape(len(idx), -1).mean(axis=1)
+        priority = (td + self.eps) ** self.alpha
+        self.tree.update(idx, priority)
+        self.max_priority = max(self.max_priority, float(priority.max()))
+
+    def clear(self):
+        self.pos = 0
+        self.size = 0
+        self.unsaved = 0
+        self.max_priority = 1.0
+        if self.tree is not None:
+            self.tree.clear()
+
+    # ----------------------------
+    # Checkpoint state
+    # ----------------------------
+
+    def get_state(self, full=True):
+        # (arrays, JSON-able scalars) for TrainingCheckpointer.save;
+        # full=False stores only the rows added since the previous call
+        # (the ring slots before pos) and their slots. Priorities change
+        # on every sampled row, so they are always stored whole.
+        if full:
+            arrays = {"replay_data": self.data[:self.size]}
+        else:
+            rows = (self.pos - self.unsaved + np.arange(self.unsaved)) % self.capacity
+            arrays = {"replay_rows": rows, "replay_data": self.data[rows]}
+        self.unsaved = 0
+        if self.tree is not None:
+            arrays["replay_priority"] = self.tree.get(np.arange(self.size))
+        meta = {
+            "pos": self.pos,
+            "size": self.size,
+            "max_priority": self.max_priority,
+            "rng": self.rng.bit_generator.state,
+        }
+        return arrays, meta
+
+    def set_state(self, arrays, meta):
+        # arrays: get_state() arrays of a full save and the partial ones
+        # after it, oldest first; meta: those of the newest
+        self.clear()
+        for saved in arrays:
+            data = saved["replay_data"]
+            if "replay_rows" in saved:
+                self.data[saved["replay_rows"]] = data
+            else:
+                self.data[:len(data)] = data
+        size = meta["size"]
+        self.pos = meta["pos"]
+        self.size = size
+        self.max_priority = meta["max_priority"]
+        self.rng.bit_generator.state = meta["rng"]
+        if self.tree is not None:
+            self.tree.update(np.arange(size), arrays[-1]["replay_priority"])
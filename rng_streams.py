@@ -0,0 +1,136 @@
+import copy
+
+import numpy as np
+
+
+#          PER-ENV / PER-AGENT RANDOM STREAMS
+#
+# Every intersection and every agent owns a numpy Generator derived from
+# one root seed with SeedSequence.spawn, so its draws don't depend on
+# what else runs in the process (other envs, other agents, worker
+# scheduling). Child j of a root is the same stream no matter how many
+# siblings are spawned, which is what makes serial, vectorized and
+# multi-process runs produce identical trajectories.
+#
+# Uniforms are pre-drawn in blocks of `block` rows of `width` values and
+# handed out one row (or k rows) at a time, so the per-step cost is a
+# buffer read instead of a Generator call. Generator.random() yields the
+# same sequence however it is chunked, so the block size never changes
+# results.
+#
+# Stream state for checkpoints is (bit generator state, unconsumed rows).
+
+DEFAULT_BLOCK = 1024
+
+
+def as_seed_sequence(seed):
+    # int / None / SeedSequence → SeedSequence
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    return np.random.SeedSequence(seed)
+
+
+def make_generator(seed):
+    return np.random.Generator(np.random.PCG64(as_seed_sequence(seed)))
+
+
+class BlockStream:
+    # one generator; next() → one row as a list of Python floats
+    def __init__(self, rng, width, block=DEFAULT_BLOCK):
+        self.rng = rng
+        self.width = width
+        self.block = block
+        self.rows = []
+        self.pos = 0
+
+    def next(self):
+        if self.pos == len(self.rows):
+            self.rows = self.rng.random((self.block, self.width)).tolist()
+            self.pos = 0
+        row = self.rows[self.pos]
+        self.pos += 1
+        return row
+
+    def remaining(self):
+        return np.array(self.rows[self.pos:], dtype=np.float64).reshape(-1, self.width)
+
+    def get_state(self):
+        return [(self.rng.bit_generator.state, self.remaining())]
+
+    # pickle the unconsumed rows as an array, not a list of floats
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["rows"] = self.remaining()
+        state["pos"] = 0
+        return state
+
+    def __setstate__(self, state):
+        state["rows"] = state["rows"].tolist()
+        self.__dict__.update(state)
+
+    def set_state(self, state):
+        (bit_state, rows), = state
+        self.rng.bit_generator.state = bit_state
+        self.rows = np.asarray(rows, dtype=np.float64).tolist()
+        self.pos = 0
+
+
+class BatchBlockStream:
+    # n generators advanced together; take(k) → (n, k, width) array whose
+    # row i is exactly what BlockStream(rngs[i]) would hand out
+    def __init__(self, rngs, width, block=DEFAULT_BLOCK):
+        self.rngs = list(rngs)
+        self.width = width
+        self.block = block
+        self.buffer = np.zeros((len(self.rngs), 0, width))
+        self.pos = 0
+
+    def _refill(self):
+        self.buffer = np.stack([rng.random((self.block, self.width)) for rng in self.rngs])
+        self.pos = 0
+
+    def take(self, k=1):
+        if self.pos + k <= self.buffer.shape[1]:
+            out = self.buffer[:, self.pos:self.pos + k]
+            self.pos += k
+            return out
+
+        parts = []
+        while k > 0:
+            if self.pos == self.buffer.shape[1]:
+                self._refill()
+            m = min(k, self.buffer.shape[1] - self.pos)
+            parts.append(self.buffer[:, self.pos:self.pos + m])
+            self.pos += m
+            k -= m
+        return np.concatenate(parts, axis=1)
+
+    def stream(self, i):
+        # independent BlockStream continuing row i from here (a copy)
+        s = BlockStream(copy.deepcopy(self.rngs[i]), self.width, self.block)
+        s.rows = self.buffer[i, self.pos:].tolist()
+        return s
+
+    @classmethod
+    def from_streams(cls, streams, block=DEFAULT_BLOCK):
+        # continue several BlockStreams together (copies; rows are padded
+        # with fresh draws so every stream has the same number buffered)
+        width = streams[0].width
+        remaining = [s.remaining() for s in streams]
+        length = max(len(r) for r in remaining)
+        batch = cls([copy.deepcopy(s.rng) for s in streams], width, block)
+        batch.buffer = np.stack([
+            np.concatenate([r, rng.random((length - len(r), width))])
+            for r, rng in zip(remaining, batch.rngs)
+        ])
+        return batch
+
+    def get_state(self):
+        rest = self.buffer[:, self.pos:]
+        return [(rng.bit_generator.state, rest[i].copy()) for i, rng in enumerate(self.rngs)]
+
+    def set_state(self, state):
+        for rng, (bit_state, _) in zip(self.rngs, state):
+            rng.bit_generator.state = bit_state
+        self.buffer = np.stack([np.asarray(rows, dtype=np.float64).reshape(-1, self.width) for _, rows in state])
+        self.pos = 0
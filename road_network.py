@@ -0,0 +1,177 @@
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+
+# ============================================================
+# COUPLED ROAD NETWORK
+# ============================================================
+# Turns the independent intersections of BatchIntersectionEnv into a
+# network: vehicles discharged on a green approach travel along the
+# outgoing links of their junction and join the queue of the downstream
+# junction after the link's travel time.
+#
+# Queues are addressed as slots: junction * 2 + approach (0 = NS, 1 = EW).
+# A link l carries share[l] of the vehicles discharged from slot src[l]
+# into slot dst[l] after delay[l] steps. Everything is index arrays, so a
+# step is a few gathers / scatters over all links at once:
+#
+#   in-transit vehicles   ring buffer (links, max_delay + 1)
+#   fractional splits     per-link carry, so whole vehicles are sent and
+#                         nothing is lost to rounding (no extra RNG draws)
+#   spillback             a link holds at most capacity[l] vehicles
+#                         (in transit + queued at its destination); a
+#                         source only discharges what all its links accept
+#
+# Vehicles routed to edges that leave the network simply disappear.
+
+NS, EW = 0, 1
+
+
+def _approach(from_xy, to_xy):
+    # approach axis of an edge at its downstream end
+    dx, dy = np.subtract(to_xy, from_xy)
+    return NS if abs(dy) >= abs(dx) else EW
+
+
+class RoadNetwork:
+    def __init__(self, tls_ids, src, dst, share, delay, capacity):
+        self.tls_ids = tuple(tls_ids)
+        self.n = len(self.tls_ids)
+        self.src = np.asarray(src, dtype=np.int64)
+        self.dst = np.asarray(dst, dtype=np.int64)
+        self.share = np.asarray(share, dtype=np.float64)
+        self.delay = np.asarray(delay, dtype=np.int64)
+        self.capacity = np.asarray(capacity, dtype=np.int64)
+
+        if (self.delay < 1).any():
+            raise ValueError("link delays must be at least one step")
+
+    @property
+    def n_links(self):
+        return len(self.src)
+
+    def tiled(self, copies):
+        # the same network repeated for `copies` independent env copies
+        offsets = np.repeat(np.arange(copies) * 2 * self.n, self.n_links)
+        return RoadNetwork(
+            [f"{tls}#{c}" for c in range(copies) for tls in self.tls_ids],
+            np.tile(self.src, copies) + offsets,
+            np.tile(self.dst, copies) + offsets,
+            np.tile(self.share, copies),
+            np.tile(self.delay, copies),
+            np.tile(self.capacity, copies)
+        )
+
+    @classmethod
+    def from_sumo(
+        cls,
+        nodes_path="sumo/nodes.nod.xml",
+        edges_path="sumo/edges.edg.xml",
+        tls_ids=("J1", "J2", "J3", "J4"),
+        turn_ratio=0.2,
+        seconds_per_step=1.0,
+        jam_spacing=7.5,
+        default_speed=13.9
+    ):
+        # links = edges between two traffic-light junctions. Vehicles leaving
+        # an approach keep its axis with probability 1 - turn_ratio (split
+        # evenly over the junction's outgoing edges on that axis, exits
+        # included) and turn onto the other axis otherwise.
+        nodes = {
+            n.get("id"): (float(n.get("x")), float(n.get("y")))
+            for n in ET.parse(nodes_path).getroot().iter("node")
+        }
+        column = {tls: i for i, tls in enumerate(tls_ids)}
+
+        outgoing = {tls: [] for tls in tls_ids}
+        for e in ET.parse(edges_path).getroot().iter("edge"):
+            a, b = e.get("from"), e.get("to")
+            if a in outgoing:
+                outgoing[a].append((b, float(e.get("speed", default_speed))))
+
+        src, dst, share, delay, capacity = [], [], [], [], []
+        for tls in tls_ids:
+            axis_edges = {NS: [], EW: []}
+            for b, speed in outgoing[tls]:
+                # axis of travel leaving the junction
+                axis_edges[_approach(nodes[tls], nodes[b])].append((b, speed))
+
+            for approach in (NS, EW):
+                weights = {approach: 1.0 - turn_ratio, 1 - approach: turn_ratio}
+                # renormalize when one axis has no outgoing edges
+                total = sum(w for axis, w in weights.items() if axis_edges[axis])
+                for axis, w in weights.items():
+                    if w == 0:
+                        continue
+                    for b, speed in axis_edges[axis]:
+                        if b not in column:
+                            continue   # leaves the network
+                        length = float(np.hypot(*np.subtract(nodes[b], nodes[tls])))
+                        src.append(column[tls] * 2 + approach)
+                        dst.append(column[b] * 2 + _approach(nodes[tls], nodes[b]))
+                        share.append(w / total / len(axis_edges[axis]))
+                        delay.append(max(1, int(np.ceil(length / speed / seconds_per_step))))
+                        capacity.append(max(1, int(length // jam_spacing)))
+
+        return cls(tls_ids, src, dst, share, delay, capacity)
+
+
+class LinkBuffers:
+    # per-env dynamic state of a RoadNetwork
+    def __init__(self, network):
+        self.network = network
+        self.span = int(network.delay.max()) + 1
+        self.ring = np.zeros((network.n_links, self.span), dtype=np.int64)
+        self.load = np.zeros(network.n_links, dtype=np.int64)
+        self.carry = np.zeros(network.n_links)
+        self.t = 0
+        self._links = np.arange(network.n_links)
+
+    def reset(self):
+        self.ring[:] = 0
+        self.load[:] = 0
+        self.carry[:] = 0.0
+        self.t = 0
+
+    def deliver(self, n_slots):
+        # vehicles reaching the end of their link this step → per-slot counts
+        slot = self.t % self.span
+        arriving = self.ring[:, slot].copy()
+        self.ring[:, slot] = 0
+        self.load -= arriving
+        return np.bincount(self.network.dst, weights=arriving, minlength=n_slots).astype(np.int64)
+
+    def room(self, queues):
+        # most vehicles each slot may discharge without overfilling a link
+        net = self.network
+        free = np.maximum(0, net.capacity - self.load - queues[net.dst])
+        limit = np.full(len(queues), np.inf)
+        np.minimum.at(limit, net.src, free / net.share)
+        return limit
+
+    def send(self, discharged):
+        # route discharged vehicles (per slot) onto their links
+        net = self.network
+        flow = discharged[net.src] * net.share + self.carry
+        sent = np.floor(flow + 1e-9)
+        self.carry = flow - sent
+        sent = sent.astype(np.int64)
+        self.ring[self._links, (self.t + net.delay) % self.span] += sent
+        self.load += sent
+        self.t += 1
+
+    def in_transit(self):
+        return int(self.load.sum())
+
+
+NETWORKS = {
+    "sumo": RoadNetwork.from_sumo,
+}
+
+
+def get_network(network):
+    # name / RoadNetwork / None → RoadNetwork or None
+    if network is None or isinstance(network, RoadNetwork):
+        return network
+    return NETWORKS[network]()
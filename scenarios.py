@@ -0,0 +1,245 @@
+import heapq
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+
+# ============================================================
+# ARRIVAL SCENARIOS
+# ============================================================
+# A scenario is a demand table rates[t, i, d]: expected arrivals per step
+# at intersection i on approach d (0 = NS, 1 = EW) during step t of a
+# horizon of H steps (longer episodes wrap around). It is materialized
+# once into
+#
+#   base[t, i, d]  whole vehicles that always arrive  (uint8)
+#   frac[t, i, d]  probability of one more            (float64)
+#
+# and the envs index straight into these: an arrival count is
+# base + (u < frac) with u the env's usual per-step uniform, so a
+# scenario costs one table lookup per step. constant(0.9, 0.1) reproduces
+# the built-in toy demand draw for draw.
+#
+# The envs keep a demand clock that is NOT rewound by reset(), so
+# successive short training episodes walk through the whole horizon
+# (e.g. a full rush-hour profile) instead of replaying its first steps.
+#
+# A scenario with fewer columns than intersections is tiled: intersection
+# j uses column j % n_columns.
+
+class Scenario:
+    def __init__(self, rates, name="custom"):
+        rates = np.asarray(rates, dtype=np.float64)
+        if rates.ndim == 2:
+            rates = rates[:, None, :]
+        if rates.ndim != 3 or rates.shape[2] != 2:
+            raise ValueError("rates must have shape (horizon, n_intersections, 2)")
+        if (rates < 0).any() or (rates >= 256).any():
+            raise ValueError("rates must lie in [0, 256)")
+
+        self.name = name
+        self.rates = rates
+        self.base = np.floor(rates).astype(np.uint8)
+        self.frac = rates - self.base
+        self._columns = {}
+
+    @property
+    def horizon(self):
+        return self.rates.shape[0]
+
+    @property
+    def n_columns(self):
+        return self.rates.shape[1]
+
+    def tiled(self, n):
+        # (base, frac) for n intersections, each (horizon, n, 2)
+        cols = np.arange(n) % self.n_columns
+        return self.base[:, cols], self.frac[:, cols]
+
+    def column(self, i):
+        # per-step (base_ns, base_ew, frac_ns, frac_ew) tuples for
+        # intersection i, as Python numbers for the scalar env
+        i = i % self.n_columns
+        rows = self._columns.get(i)
+        if rows is None:
+            rows = [
+                tuple(b) + tuple(f)
+                for b, f in zip(self.base[:, i].tolist(), self.frac[:, i].tolist())
+            ]
+            self._columns[i] = rows
+        return rows
+
+    def mean_rates(self):
+        # (n_columns, 2) average arrivals per step
+        return self.rates.mean(axis=0)
+
+    def __repr__(self):
+        return f"Scenario({self.name!r}, horizon={self.horizon}, columns={self.n_columns})"
+
+
+# ----------------------------
+# Profiles
+# ----------------------------
+
+def constant(rate_ns=0.9, rate_ew=0.1, n=1):
+    return Scenario(np.tile([rate_ns, rate_ew], (1, n, 1)), name="constant")
+
+
+def piecewise(segments, horizon):
+    # segments: [(start_step, rate_ns, rate_ew), ...] shared by every
+    # intersection, or one such list per intersection
+    if np.ndim(segments[0]) == 1:
+        segments = [segments]
+
+    rates = np.zeros((horizon, len(segments), 2))
+    for i, segs in enumerate(segments):
+        segs = sorted(segs)
+        for k, (start, rate_ns, rate_ew) in enumerate(segs):
+            end = segs[k + 1][0] if k + 1 < len(segs) else horizon
+            rates[int(start):int(end), i] = (rate_ns, rate_ew)
+    return Scenario(rates, name="piecewise")
+
+
+def with_bursts(scenario, burst_rate=0.002, extra=0.5, duration=60, n=None, seed=0):
+    # add platoon bursts: start times form a Poisson process (burst_rate
+    # per step and intersection); each burst adds `extra` arrivals/step
+    # on one random approach for `duration` steps
+    n = n or scenario.n_columns
+    rates = scenario.rates[:, np.arange(n) % scenario.n_columns].copy()
+    horizon = scenario.horizon
+
+    rng = np.random.default_rng(seed)
+    for i in range(n):
+        starts = rng.uniform(0, horizon, size=rng.poisson(burst_rate * horizon)).astype(np.int64)
+        approaches = rng.integers(0, 2, size=len(starts))
+        for start, d in zip(starts.tolist(), approaches.tolist()):
+            rates[start:start + duration, i, d] += extra
+    return Scenario(rates, name=f"{scenario.name}+bursts")
+
+
+# ----------------------------
+# Demand from the SUMO route file
+# ----------------------------
+
+def _flow_rate(flow, begin, end):
+    # vehicles per second of a <flow>
+    if "vehsPerHour" in flow.attrib:
+        return float(flow.get("vehsPerHour")) / 3600.0
+    if "period" in flow.attrib:
+        return 1.0 / float(flow.get("period"))
+    if "probability" in flow.attrib:
+        return float(flow.get("probability"))
+    if "number" in flow.attrib:
+        return float(flow.get("number")) / max(end - begin, 1e-9)
+    raise ValueError(f"flow {flow.get('id')} has no rate attribute")
+
+
+def _shortest_edge_path(edges, start, goal):
+    # Dijkstra over edges; edge (a → b) continues with (b → c), c != a
+    lengths = {e: np.hypot(*np.subtract(edges[e]["to_xy"], edges[e]["from_xy"])) for e in edges}
+    best = {start: lengths[start]}
+    prev = {}
+    queue = [(lengths[start], start)]
+    while queue:
+        dist, e = heapq.heappop(queue)
+        if e == goal:
+            break
+        if dist > best[e]:
+            continue
+        for nxt, info in edges.items():
+            if info["from"] != edges[e]["to"] or info["to"] == edges[e]["from"]:
+                continue
+            d = dist + lengths[nxt]
+            if d < best.get(nxt, np.inf):
+                best[nxt] = d
+                prev[nxt] = e
+                heapq.heappush(queue, (d, nxt))
+
+    if goal not in best:
+        raise ValueError(f"no route from {start} to {goal}")
+    path = [goal]
+    while path[-1] != start:
+        path.append(prev[path[-1]])
+    return path[::-1]
+
+
+def from_routes(
+    routes_path="sumo/routes.rou.xml",
+    nodes_path="sumo/nodes.nod.xml",
+    edges_path="sumo/edges.edg.xml",
+    tls_ids=("J1", "J2", "J3", "J4"),
+    seconds_per_step=1.0,
+    scale=1.0,
+    entry_only=False
+):
+    # per-intersection demand implied by the <flow> definitions: each flow
+    # is routed along its shortest path and adds its rate to the approach
+    # (NS or EW, from the edge geometry) of every junction it enters.
+    # entry_only=True credits only the first junction, for the coupled
+    # network mode where downstream demand comes from upstream discharge.
+    nodes = {
+        n.get("id"): (float(n.get("x")), float(n.get("y")))
+        for n in ET.parse(nodes_path).getroot().iter("node")
+    }
+    edges = {
+        e.get("id"): {
+            "from": e.get("from"),
+            "to": e.get("to"),
+            "from_xy": nodes[e.get("from")],
+            "to_xy": nodes[e.get("to")],
+        }
+        for e in ET.parse(edges_path).getroot().iter("edge")
+    }
+    column = {tls: i for i, tls in enumerate(tls_ids)}
+
+    flows = list(ET.parse(routes_path).getroot().iter("flow"))
+    end_time = max(float(f.get("end", 3600)) for f in flows)
+    horizon = int(np.ceil(end_time / seconds_per_step))
+    rates = np.zeros((horizon, len(tls_ids), 2))
+
+    for flow in flows:
+        begin = float(flow.get("begin", 0))
+        end = float(flow.get("end", 3600))
+        rate = _flow_rate(flow, begin, end) * seconds_per_step * scale
+        t0 = int(begin / seconds_per_step)
+        t1 = int(np.ceil(end / seconds_per_step))
+
+        for edge in _shortest_edge_path(edges, flow.get("from"), flow.get("to")):
+            junction = edges[edge]["to"]
+            if junction not in column:
+                continue
+            dx, dy = np.subtract(edges[edge]["to_xy"], edges[edge]["from_xy"])
+            approach = 0 if abs(dy) >= abs(dx) else 1
+            rates[t0:t1, column[junction], approach] += rate
+            if entry_only:
+                break
+
+    return Scenario(rates, name="routes")
+
+
+# ----------------------------
+# Named presets
+# ----------------------------
+
+def rush_hour(horizon=2000):
+    # light start, NS morning peak, balanced midday, EW evening peak
+    return piecewise(
+        [(0, 0.3, 0.1), (400, 0.9, 0.2), (900, 0.4, 0.4), (1400, 0.2, 0.9)],
+        horizon
+    )
+
+
+SCENARIOS = {
+    "toy": constant,
+    "rush_hour": rush_hour,
+    "rush_hour_bursts": lambda: with_bursts(rush_hour(), n=4),
+    "sumo_routes": from_routes,
+    "sumo_entries": lambda: from_routes(entry_only=True),
+}
+
+
+def get_scenario(scenario):
+    # name / Scenario / None → Scenario or None
+    if scenario is None or isinstance(scenario, Scenario):
+        return scenario
+    return SCENARIOS[scenario]()
@@ -0,0 +1,61 @@
+try:
+    import libsumo
+except ImportError:
+    libsumo = None
+
+try:
+    import traci
+except ImportError:   # SUMO tools not on the path; pass conn= (e.g. MockTraci)
+    traci = None
+
+
+# ============================================================
+# EVALUATION PROFILES
+# ============================================================
+# gui  : sumo-gui over the TraCI socket, throttled so it can be watched
+# fast : headless, no delay, in-process libsumo when it is installed
+#        (falls back to the TraCI socket otherwise)
+EVAL_PROFILES = {
+    "gui": {"gui": True, "delay": 20, "use_libsumo": False},
+    "fast": {"gui": False, "delay": 0, "use_libsumo": True},
+}
+
+TIME_TO_TELEPORT = 900
+
+
+def build_cmd(sumo_cfg, gui=False, delay=20, seed=None):
+    cmd = ["sumo-gui" if gui else "sumo"]
+    cmd.extend(["-c", sumo_cfg, "--start"])
+    if delay:
+        cmd.extend(["--delay", str(delay)])
+    cmd.extend(["--time-to-teleport", str(TIME_TO_TELEPORT)])
+    if seed is not None:
+        cmd.extend(["--seed", str(seed)])
+    return cmd
+
+
+def start_sumo(sumo_cfg, gui=False, delay=20, use_libsumo=False, conn=None, seed=None):
+    # Start SUMO and return the connection to drive it with. An explicit
+    # conn (e.g. MockTraci) is started as given; libsumo cannot show a GUI.
+    cmd = build_cmd(sumo_cfg, gui=gui, delay=delay, seed=seed)
+
+    if conn is None:
+        conn = select_backend(gui=gui, use_libsumo=use_libsumo)
+
+    conn.start(cmd)
+    return conn
+
+
+def select_backend(gui=False, use_libsumo=False):
+    if use_libsumo and not gui and libsumo is not None:
+        return libsumo
+    if traci is not None:
+        return traci
+    raise ImportError("neither traci nor libsumo is available; is SUMO_HOME/tools on the path?")
+
+
+def resolve_profile(profile, gui):
+    # settings for a named profile, or the legacy behaviour (gui flag + delay)
+    if profile is None:
+        return {"gui": gui, "delay": 20, "use_libsumo": False}
+    return EVAL_PROFILES[profile]
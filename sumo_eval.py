@@ -1,5 +1,12 @@
-import traci
-import pickle
+import time
+
+import numpy as np
+from traci_metrics import SubscriptionMetrics
+from sumo_backend import start_sumo, resolve_profile
+from checkpoint import load_agents, load_policy, is_policy_dir
+from greedy_policy import GreedyPolicy
+from instrumentation import NULL_PROFILER
+from net_loader import resolve_network
 
 # ============================================================
 # CONTROL PARAMETERS (OPTIMIZED FOR REDUCED TELEPORTATIONS)
@@ -11,149 +18,207 @@ ALL_RED_TIME = 2
 MAX_RED = 40             # Slightly reduced for better fairness
 
 # ============================================================
-# PHASE MAPS - CORRECTED TO MATCH ACTUAL net.net.xml
+# PHASE MAPS
 # ============================================================
-# From net.net.xml analysis:
-# J1: 6 phases - phase 0,1 = NS direction; phase 4,5 = EW direction
-# J2: 6 phases - phase 0,1,2 = NS direction; phase 3,4,5 = turn phases
-# J3: 6 phases - phase 0,1 = EW direction; phase 2,3 = NS direction  
-# J4: 4 phases - phase 0,1 = through; phase 2,3 = turn
-
-# Agent action 0 = NS green, action 1 = EW green
-PHASE_MAP = {
-    "J1": {0: 0, 1: 4},   # NS green = phase 0, EW green = phase 4
-    "J2": {0: 0, 1: 3},   # NS green = phase 0, EW/turn = phase 3
-    "J3": {0: 2, 1: 0},   # NS green = phase 2, EW green = phase 0
-    "J4": {0: 0, 1: 2},   # through = phase 0, turn = phase 2
-}
-
-# Yellow phases (the phase index to use before switching)
-YELLOW_MAP = {
-    "J1": {0: 1, 1: 5},   # yellow after NS = 1, yellow after EW = 5
-    "J2": {0: 1, 1: 4},   # yellow phases
-    "J3": {0: 3, 1: 1},   # yellow phases
-    "J4": {0: 1, 1: 3},   # yellow phases
-}
+# Agent action 0 = NS green, action 1 = EW green. The green phases of
+# each action, the yellow phase that leaves each of them and the lanes
+# whose queues the agent sees all come from net_loader: read from the
+# network file named in the sumocfg (cached by file hash), or derived
+# over TraCI when there is none (MockTraci, trace replay).
+#
+# An action with several green phases (e.g. a T junction's three-phase
+# program) moves to its next one each time it is entered, and also once
+# its current phase has been green for MAX_RED steps, so movements that
+# only its later phases serve wait no longer than MAX_RED.
 
 
 # ============================================================
-# MAIN EVAL LOOP
+# STATE
 # ============================================================
-def run_sumo_eval(agents, tls_to_agent, sumo_cfg, steps=2000, gui=True):
+# Same layout as the toy env observation: (queue_NS, queue_EW, phase),
+# with queue_NS / queue_EW the halting vehicles on the approach lanes of
+# action 0 / action 1, and phase the current action.
+# Agents map it to a state id with their discretizer.
+MAX_QUEUE = 50
+
+
+# ============================================================
+# BATCHED AGENT QUERIES
+# ============================================================
+# The controller asks for all deciding TLS at once through
+# policy.select_actions(agent_ids, states) with states an (n, 3) array.
+# Objects that implement it (greedy_policy.GreedyPolicy: one table
+# lookup for all of them) are used directly; a dict of agents is wrapped
+# in AgentPolicy, which asks each agent in turn so decisions and
+# exploration draws are exactly those of agent.select_action.
+
+class AgentPolicy:
+    def __init__(self, agents):
+        self.agents = agents
+
+    def select_actions(self, agent_ids, states):
+        agents = self.agents
+        return np.fromiter(
+            (agents[i].select_action(tuple(s)) for i, s in zip(agent_ids.tolist(), states.tolist())),
+            dtype=np.int64, count=len(agent_ids)
+        )
 
-    cmd = ["sumo-gui" if gui else "sumo"]
-    cmd.extend([
-        "-c", sumo_cfg,
-        "--start",
-        "--delay", "20",
-        "--time-to-teleport", "900"
-    ])
-    
-    traci.start(cmd)
 
-    tls_ids = traci.trafficlight.getIDList()
+def as_policy(agents):
+    if hasattr(agents, "select_actions"):
+        return agents
+    return AgentPolicy(agents)
+
+
+# ============================================================
+# MAIN EVAL LOOP
+# ============================================================
+def run_sumo_eval(agents, tls_to_agent, sumo_cfg, steps=2000, gui=True, conn=None, profile=None, seed=None,
+                  profiler=None, network=None):
+    # agents: {agent_id: agent} or a batched policy (see as_policy).
+    # profile: "gui" / "fast" (see sumo_backend.EVAL_PROFILES); None keeps
+    # the gui flag with the usual --delay. conn overrides the backend;
+    # seed is passed to SUMO as --seed. profiler (instrumentation.Profiler)
+    # splits each step into simulation, metric collection and control time.
+    # network: net_loader.TLSNetwork or .net.xml path (default: the
+    # sumocfg's network file, else derived over TraCI).
+    prof = profiler or NULL_PROFILER
+    settings = resolve_profile(profile, gui)
+    conn = start_sumo(sumo_cfg, conn=conn, seed=seed, **settings)
+    start_time = time.perf_counter()
+
+    tls_ids = conn.trafficlight.getIDList()
+    n_tls = len(tls_ids)
+    policy = as_policy(agents)
+    agent_ids = np.array([tls_to_agent[tls] for tls in tls_ids])
+
+    # all per-step metrics (and the current phases) arrive through
+    # subscriptions; lanes and phase maps come from the network index
+    net = resolve_network(network, sumo_cfg, conn, tls_ids)
+    metrics = SubscriptionMetrics(conn, tls_ids, {tls: net.controlled_lanes(tls) for tls in tls_ids})
+    lanes_by_action = {tls: net.approach_lanes(tls) for tls in tls_ids}
+
+    # queue of (TLS t, action a) = sum of halting over pair_lanes with
+    # pair_group == t * 2 + a
+    lane_order = sorted({l for groups in lanes_by_action.values() for lanes in groups.values() for l in lanes})
+    lane_pos = {lane: k for k, lane in enumerate(lane_order)}
+    pair_lanes, pair_group = [], []
+    for t, tls in enumerate(tls_ids):
+        for action in (0, 1):
+            for lane in lanes_by_action[tls][action]:
+                pair_lanes.append(lane_pos[lane])
+                pair_group.append(t * 2 + action)
+    pair_lanes = np.array(pair_lanes, dtype=np.int64)
+    pair_group = np.array(pair_group, dtype=np.int64)
+
+    rows = net.rows(tls_ids)
+    action_phases = net.action_phases[rows]
+    action_yellows = net.action_yellows[rows]
+    n_phases = net.n_phases[rows]
 
     # --------------------------------------------------------
-    # Timers
+    # Timers (one entry per TLS)
     # --------------------------------------------------------
-    green_timer = {tls: 0 for tls in tls_ids}
-    red_timer = {tls: {0: 0, 1: 0} for tls in tls_ids}
-    yellow_timer = {tls: 0 for tls in tls_ids}
-    pending_phase = {tls: None for tls in tls_ids}
-    current_action = {tls: 0 for tls in tls_ids}  # Track current action per TLS
-
-    total_wait = 0
-    total_queue = 0
-    prev_wait = {}
-    teleport_count = 0
+    green_timer = np.zeros(n_tls, dtype=np.int64)
+    red_timer = np.zeros((n_tls, 2), dtype=np.int64)
+    yellow_timer = np.zeros(n_tls, dtype=np.int64)
+    pending_phase = np.full(n_tls, -1, dtype=np.int64)     # -1: none
+    current_action = np.zeros(n_tls, dtype=np.int64)
+    # phase of each action in use / last used (index into its phases);
+    # entering action 1 first gives its first phase
+    slot = np.zeros((n_tls, 2), dtype=np.int64)
+    slot[:, 1] = n_phases[:, 1] - 1
 
     for step in range(steps):
-        traci.simulationStep()
-        
-        # Track teleportations
-        teleport_count += traci.simulation.getStartingTeleportNumber()
+        prof.start()
+        conn.simulationStep()
+        prof.lap("traci_step")
 
         # -------------------------------
-        # METRICS
+        # METRICS (waiting time, edge queues, teleports)
         # -------------------------------
-        for veh in traci.vehicle.getIDList():
-            w = traci.vehicle.getAccumulatedWaitingTime(veh)
-            total_wait += w - prev_wait.get(veh, 0)
-            prev_wait[veh] = w
-
-        # Queue counting - use edges for consistency with fixed-time baseline
-        total_queue += sum(
-            traci.edge.getLastStepHaltingNumber(e)
-            for e in traci.edge.getIDList()
-        )
+        metrics.step()
+        prof.lap("traci_metrics")
 
         # -------------------------------
         # CONTROL
         # -------------------------------
-        for tls in tls_ids:
-
-            # handle yellow / all-red countdown
-            if yellow_timer[tls] > 0:
-                yellow_timer[tls] -= 1
-                if yellow_timer[tls] == 0 and pending_phase[tls] is not None:
-                    traci.trafficlight.setPhase(tls, pending_phase[tls])
-                    pending_phase[tls] = None
-                    green_timer[tls] = 0
-                continue
-
-            green_timer[tls] += 1
-
-            # Only make decisions at intervals
-            if step % DECISION_INTERVAL != 0:
-                continue
-
-            agent = agents[tls_to_agent[tls]]
-
-            # Get queue for controlled lanes
-            lanes = traci.trafficlight.getControlledLanes(tls)
-            queue = sum(traci.lane.getLastStepHaltingNumber(l) for l in lanes)
-
-            # Build state: (queue_binned, current_action)
-            state = (min(queue, 50), current_action[tls])
 
-            # Get action from agent
-            action = agent.select_action(state)
-            target_phase = PHASE_MAP[tls][action]
-
-            current_sumo_phase = traci.trafficlight.getPhase(tls)
+        # yellow / all-red countdown; on expiry switch to the pending phase
+        in_yellow = yellow_timer > 0
+        yellow_timer[in_yellow] -= 1
+        expired = np.flatnonzero(in_yellow & (yellow_timer == 0) & (pending_phase >= 0))
+        for t, phase in zip(expired.tolist(), pending_phase[expired].tolist()):
+            conn.trafficlight.setPhase(tls_ids[t], phase)
+        pending_phase[expired] = -1
+        green_timer[expired] = 0
+
+        green_timer[~in_yellow] += 1
+
+        # Only make decisions at intervals
+        if step % DECISION_INTERVAL != 0:
+            prof.lap("control")
+            prof.count("sim_steps")
+            continue
+
+        deciding = np.flatnonzero(~in_yellow)
+        if len(deciding):
+            # Queues on the NS (action 0) and EW (action 1) approaches
+            halting = metrics.lane_halting_array(lane_order)
+            queues = np.bincount(pair_group, weights=halting[pair_lanes], minlength=2 * n_tls)
+            queues = np.minimum(queues.reshape(n_tls, 2), MAX_QUEUE).astype(np.int64)
+
+            # State: (queue_NS, queue_EW, current_action); one batched query
+            states = np.column_stack([queues[deciding], current_action[deciding]])
+            action = policy.select_actions(agent_ids[deciding], states)
+            prof.count("decisions", len(deciding))
+
+            current_sumo_phase = metrics.phase_array(tls_ids)[deciding]
 
             # Update red timers for starvation prevention
-            for p in [0, 1]:
-                if p == action:
-                    red_timer[tls][p] = 0
-                else:
-                    red_timer[tls][p] += DECISION_INTERVAL
-
-            # FORCE SWITCH IF ONE DIRECTION IS STARVING
-            for p in [0, 1]:
-                if red_timer[tls][p] >= MAX_RED:
-                    action = p
-                    target_phase = PHASE_MAP[tls][p]
-                    red_timer[tls][p] = 0
-                    break
+            red = red_timer[deciding]
+            red += DECISION_INTERVAL
+            red[np.arange(len(deciding)), action] = 0
+
+            # FORCE SWITCH IF ONE DIRECTION IS STARVING (NS checked first)
+            starve_ns = red[:, 0] >= MAX_RED
+            starve_ew = ~starve_ns & (red[:, 1] >= MAX_RED)
+            action = np.where(starve_ns, 0, np.where(starve_ew, 1, action))
+            red[starve_ns, 0] = 0
+            red[starve_ew, 1] = 0
+            red_timer[deciding] = red
+
+            # next phase of the action when entering it, or when its phase
+            # has held MAX_RED steps and it has others
+            held = action == current_action[deciding]
+            n = n_phases[deciding, action]
+            advance = ~held | ((green_timer[deciding] >= MAX_RED) & (n > 1))
+            next_slot = np.where(advance, (slot[deciding, action] + 1) % n, slot[deciding, action])
+            target_phase = action_phases[deciding, action, next_slot]
 
             # Only switch if we've met minimum green and need different phase
-            if green_timer[tls] >= MIN_GREEN and target_phase != current_sumo_phase:
+            switch = (green_timer[deciding] >= MIN_GREEN) & (target_phase != current_sumo_phase)
+            switching = deciding[switch]
+            if len(switching):
                 # Transition through yellow
-                yellow_phase = YELLOW_MAP[tls][current_action[tls]]
-                traci.trafficlight.setPhase(tls, yellow_phase)
-                yellow_timer[tls] = YELLOW_TIME + ALL_RED_TIME
-                pending_phase[tls] = target_phase
-                current_action[tls] = action
-                green_timer[tls] = 0
-
-    traci.close()
-
-    return {
-        "avg_wait": total_wait / steps,
-        "avg_queue": total_queue / steps,
-        "teleportations": teleport_count
-    }
+                leaving = current_action[switching]
+                yellow_phase = action_yellows[switching, leaving, slot[switching, leaving]]
+                for t, phase in zip(switching.tolist(), yellow_phase.tolist()):
+                    conn.trafficlight.setPhase(tls_ids[t], phase)
+                yellow_timer[switching] = YELLOW_TIME + ALL_RED_TIME
+                pending_phase[switching] = target_phase[switch]
+                current_action[switching] = action[switch]
+                slot[switching, action[switch]] = next_slot[switch]
+                green_timer[switching] = 0
+
+        prof.lap("control")
+        prof.count("sim_steps")
+
+    conn.close()
+
+    results = metrics.results(steps)
+    results["steps_per_sec"] = steps / (time.perf_counter() - start_time)
+    return results
 
 
 # ============================================================
@@ -163,11 +228,11 @@ if __name__ == "__main__":
 
     print("Starting MARL SUMO evaluation (optimized)...")
 
-    with open("trained_agents.pkl", "rb") as f:
-        agents = pickle.load(f)
-
-    for agent in agents.values():
-        agent.epsilon = 0.0
+    # frozen policy written by train.py (else its agent checkpoint)
+    if is_policy_dir("trained_policy"):
+        policy = load_policy("trained_policy")
+    else:
+        policy = GreedyPolicy.from_agents(load_agents("trained_agents"))
 
     tls_to_agent = {
         "J1": 0,
@@ -177,7 +242,7 @@ if __name__ == "__main__":
     }
 
     results = run_sumo_eval(
-        agents,
+        policy,
         tls_to_agent,
         "./sumo/intersection.sumocfg",
         steps=2000
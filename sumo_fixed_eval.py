@@ -1,50 +1,27 @@
-import traci
-
-def run_fixed_gui(sumo_cfg, steps=2000, gui=False):
-    cmd = ["sumo-gui" if gui else "sumo"]
-    cmd.extend([
-        "-c", sumo_cfg,
-        "--start",
-        "--delay", "20",
-        "--time-to-teleport", "900"
-    ])
-    
-    traci.start(cmd)
-
-    total_wait = 0.0
-    total_queue = 0
-    prev_wait = {}
-    teleport_count = 0
+import time
+from traci_metrics import SubscriptionMetrics
+from sumo_backend import start_sumo, resolve_profile
+
+def run_fixed_gui(sumo_cfg, steps=2000, gui=False, conn=None, profile=None, seed=None):
+    # profile: "gui" / "fast" (see sumo_backend.EVAL_PROFILES); None keeps
+    # the gui flag with the usual --delay. conn overrides the backend;
+    # seed is passed to SUMO as --seed.
+    settings = resolve_profile(profile, gui)
+    conn = start_sumo(sumo_cfg, conn=conn, seed=seed, **settings)
+    start_time = time.perf_counter()
+
+    # waiting time, edge queues and teleports via subscriptions
+    metrics = SubscriptionMetrics(conn)
 
     for _ in range(steps):
-        traci.simulationStep()
-        
-        # Track teleportations
-        teleport_count += traci.simulation.getStartingTeleportNumber()
-
-        # -------------------------------
-        # VEHICLE-BASED WAITING TIME
-        # -------------------------------
-        for veh in traci.vehicle.getIDList():
-            w = traci.vehicle.getAccumulatedWaitingTime(veh)
-            total_wait += w - prev_wait.get(veh, 0)
-            prev_wait[veh] = w
-
-        # -------------------------------
-        # QUEUE (ALL EDGES)
-        # -------------------------------
-        total_queue += sum(
-            traci.edge.getLastStepHaltingNumber(e)
-            for e in traci.edge.getIDList()
-        )
-
-    traci.close()
-
-    return {
-        "avg_wait": total_wait / steps,
-        "avg_queue": total_queue / steps,
-        "teleportations": teleport_count
-    }
+        conn.simulationStep()
+        metrics.step()
+
+    conn.close()
+
+    results = metrics.results(steps)
+    results["steps_per_sec"] = steps / (time.perf_counter() - start_time)
+    return results
 
 
 # -------------------------------
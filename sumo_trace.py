@@ -0,0 +1,458 @@
+import json
+import os
+import shutil
+from types import SimpleNamespace
+
+import numpy as np
+from traci_metrics import (
+    LAST_STEP_VEHICLE_HALTING_NUMBER,
+    VAR_ACCUMULATED_WAITING_TIME,
+    VAR_DEPARTED_VEHICLES_IDS,
+    VAR_TELEPORT_STARTING_VEHICLES_NUMBER,
+    TL_CURRENT_PHASE,
+)
+from sumo_backend import select_backend
+
+
+# ============================================================
+# SUMO TRACES
+# ============================================================
+# TraceRecorder wraps a live connection (traci, libsumo, MockTraci) and,
+# on every simulationStep(), stores what the evaluators read through
+# their subscriptions: halting counts of every edge and every controlled
+# lane, the phase of every TLS, departures, teleports and the
+# accumulated waiting time of every vehicle. Pass it as conn= to
+# run_sumo_eval / run_fixed_gui; the run itself is unchanged.
+#
+# TraceReplay serves a recorded trace through the same connection API,
+# with no SUMO process, so the metric and controller code can be rerun,
+# debugged and profiled on fixed traffic. Replay is open loop: setPhase()
+# does not change the traffic, which is the recorded one whatever the
+# controller does. By default the TLS phases are the recorded ones too
+# (so replaying the recording run's policy reproduces it exactly);
+# phases="controlled" reports the last phase the controller set instead.
+#
+# A trace is a directory:
+#
+#   trace.json              ids, controlled lanes and their shapes, TLS
+#                           programs, step count
+#   vehicles.txt            vehicle ids, one per line (index = line number)
+#   chunk_<k>/<name>.npy    chunk_steps steps each:
+#       lane_halting        (steps, lanes) uint16, lanes in trace.json order
+#       edge_halting        (steps, edges) uint16
+#       phase               (steps, tls) int16
+#       teleports           (steps,) int32
+#       departed            vehicle indices, departed_offsets (steps + 1,)
+#       wait_vehicle        vehicle indices, wait_time float64,
+#                           wait_offsets (steps + 1,) (ragged per step)
+#
+# Chunks are written as the run goes (memory stays flat however long it
+# is) and memory-mapped on replay, one chunk at a time.
+
+TRACE_VERSION = 1
+
+CHUNK_STEPS = 1024
+
+
+def is_trace_dir(path):
+    return os.path.isfile(os.path.join(path, "trace.json"))
+
+
+def _chunk_dir(path, k):
+    return os.path.join(path, f"chunk_{k:05d}")
+
+
+def _offsets(counts):
+    return np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+
+# ----------------------------
+# Recording
+# ----------------------------
+
+class TraceRecorder:
+    def __init__(self, path, conn=None, chunk_steps=CHUNK_STEPS, use_libsumo=True):
+        # conn: the backend to record (default: libsumo if installed, else
+        # traci); every attribute not defined here is forwarded to it
+        self.path = path
+        self.conn = conn
+        self.chunk_steps = chunk_steps
+        self.use_libsumo = use_libsumo
+
+    def __getattr__(self, name):
+        if name == "conn":
+            raise AttributeError(name)
+        return getattr(self.conn, name)
+
+    def start(self, cmd, **kwargs):
+        if os.path.exists(self.path):
+            if not is_trace_dir(self.path):
+                raise ValueError(f"{self.path} exists and is not a trace directory")
+            shutil.rmtree(self.path)
+        os.makedirs(self.path)
+
+        if self.conn is None:
+            self.conn = select_backend(use_libsumo=self.use_libsumo)
+        conn = self.conn
+        conn.start(cmd, **kwargs)
+
+        self.tls_ids = tuple(conn.trafficlight.getIDList())
+        self.edges = tuple(conn.edge.getIDList())
+        self.controlled_lanes = {tls: tuple(conn.trafficlight.getControlledLanes(tls)) for tls in self.tls_ids}
+        self.lanes = tuple(sorted({l for lanes in self.controlled_lanes.values() for l in lanes}))
+        self.programs = {}
+        for tls in self.tls_ids:
+            logic = conn.trafficlight.getAllProgramLogics(tls)[0]
+            self.programs[tls] = {
+                "program_id": logic.programID,
+                "phases": [[p.state, float(p.duration)] for p in logic.phases],
+            }
+        self.lane_shapes = {lane: [list(point) for point in conn.lane.getShape(lane)] for lane in self.lanes}
+        self.cmd = list(cmd)
+
+        # the evaluators subscribe the same variables; re-subscribing an
+        # object with the same list is a no-op for TraCI
+        conn.simulation.subscribe([VAR_DEPARTED_VEHICLES_IDS, VAR_TELEPORT_STARTING_VEHICLES_NUMBER])
+        for edge in self.edges:
+            conn.edge.subscribe(edge, [LAST_STEP_VEHICLE_HALTING_NUMBER])
+        for lane in self.lanes:
+            conn.lane.subscribe(lane, [LAST_STEP_VEHICLE_HALTING_NUMBER])
+        for tls in self.tls_ids:
+            conn.trafficlight.subscribe(tls, [TL_CURRENT_PHASE])
+
+        self.steps = 0
+        self.n_chunks = 0
+        self.vehicle_index = {}
+        self._new_vehicles = []
+        self._reset_chunk()
+        self._write_header()
+
+    def _reset_chunk(self):
+        n = self.chunk_steps
+        self._t = 0
+        self._lane_halting = np.zeros((n, len(self.lanes)), dtype=np.uint16)
+        self._edge_halting = np.zeros((n, len(self.edges)), dtype=np.uint16)
+        self._phase = np.zeros((n, len(self.tls_ids)), dtype=np.int16)
+        self._teleports = np.zeros(n, dtype=np.int32)
+        self._departed = []
+        self._departed_count = np.zeros(n, dtype=np.int64)
+        self._wait_vehicle = []
+        self._wait_time = []
+        self._wait_count = np.zeros(n, dtype=np.int64)
+
+    def simulationStep(self, *args):
+        self.conn.simulationStep(*args)
+        self._capture()
+
+    def _capture(self):
+        conn = self.conn
+        t = self._t
+        halt = LAST_STEP_VEHICLE_HALTING_NUMBER
+
+        sim = conn.simulation.getSubscriptionResults()
+        self._teleports[t] = sim[VAR_TELEPORT_STARTING_VEHICLES_NUMBER]
+
+        index = self.vehicle_index
+        departed = sim[VAR_DEPARTED_VEHICLES_IDS]
+        for veh in departed:
+            if veh not in index:
+                index[veh] = len(index)
+                self._new_vehicles.append(veh)
+            conn.vehicle.subscribe(veh, [VAR_ACCUMULATED_WAITING_TIME])
+            self._departed.append(index[veh])
+        self._departed_count[t] = len(departed)
+
+        vehicles = conn.vehicle.getAllSubscriptionResults()
+        for veh, values in vehicles.items():
+            self._wait_vehicle.append(index[veh])
+            self._wait_time.append(values[VAR_ACCUMULATED_WAITING_TIME])
+        self._wait_count[t] = len(vehicles)
+
+        edges = conn.edge.getAllSubscriptionResults()
+        self._edge_halting[t] = [edges[e][halt] for e in self.edges]
+        lanes = conn.lane.getAllSubscriptionResults()
+        self._lane_halting[t] = [lanes[l][halt] for l in self.lanes]
+        if self.tls_ids:
+            phases = conn.trafficlight.getAllSubscriptionResults()
+            self._phase[t] = [phases[tls][TL_CURRENT_PHASE] for tls in self.tls_ids]
+
+        self._t += 1
+        self.steps += 1
+        if self._t == self.chunk_steps:
+            self._flush()
+
+    def _flush(self):
+        t = self._t
+        if t == 0:
+            return
+        chunk = _chunk_dir(self.path, self.n_chunks)
+        os.makedirs(chunk)
+        arrays = {
+            "lane_halting": self._lane_halting[:t],
+            "edge_halting": self._edge_halting[:t],
+            "phase": self._phase[:t],
+            "teleports": self._teleports[:t],
+            "departed": np.array(self._departed, dtype=np.int32),
+            "departed_offsets": _offsets(self._departed_count[:t]),
+            "wait_vehicle": np.array(self._wait_vehicle, dtype=np.int32),
+            "wait_time": np.array(self._wait_time, dtype=np.float64),
+            "wait_offsets": _offsets(self._wait_count[:t]),
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(chunk, f"{name}.npy"), array)
+
+        with open(os.path.join(self.path, "vehicles.txt"), "a") as f:
+            f.writelines(veh + "\n" for veh in self._new_vehicles)
+        self._new_vehicles = []
+
+        self.n_chunks += 1
+        self._reset_chunk()
+        self._write_header()
+
+    def _write_header(self):
+        header = {
+            "version": TRACE_VERSION,
+            "steps": self.steps,
+            "chunk_steps": self.chunk_steps,
+            "n_chunks": self.n_chunks,
+            "tls_ids": list(self.tls_ids),
+            "edges": list(self.edges),
+            "lanes": list(self.lanes),
+            "controlled_lanes": {tls: list(lanes) for tls, lanes in self.controlled_lanes.items()},
+            "programs": self.programs,
+            "lane_shapes": self.lane_shapes,
+            "cmd": self.cmd,
+        }
+        with open(os.path.join(self.path, "trace.json"), "w") as f:
+            json.dump(header, f, indent=1)
+
+    def close(self):
+        self._flush()
+        self.conn.close()
+
+
+# ----------------------------
+# Replay
+# ----------------------------
+
+class _ReplayDomain:
+    def __init__(self, trace):
+        self._trace = trace
+        self._subscriptions = {}
+
+    def subscribe(self, object_id, var_ids):
+        for var in var_ids:
+            if var not in self._variables:
+                raise KeyError(f"trace does not record {type(self).__name__} variable {var:#x}")
+        self._subscriptions[object_id] = tuple(var_ids)
+
+
+class _ReplayHalting(_ReplayDomain):
+    # edges / lanes: halting counts, one column per object
+    _variables = (LAST_STEP_VEHICLE_HALTING_NUMBER,)
+
+    def __init__(self, trace, ids, array):
+        super().__init__(trace)
+        self._ids = tuple(ids)
+        self._column = {object_id: k for k, object_id in enumerate(ids)}
+        self._array = array
+
+    def getIDList(self):
+        return self._ids
+
+    def getLastStepHaltingNumber(self, object_id):
+        return int(self._trace._row(self._array)[self._column[object_id]])
+
+    def getShape(self, lane):
+        return [tuple(point) for point in self._trace.header["lane_shapes"][lane]]
+
+    def getAllSubscriptionResults(self):
+        values = self._trace._row(self._array).tolist()
+        column = self._column
+        return {
+            object_id: {LAST_STEP_VEHICLE_HALTING_NUMBER: values[column[object_id]]}
+            for object_id in self._subscriptions
+        }
+
+
+class _ReplayVehicle(_ReplayDomain):
+    _variables = (VAR_ACCUMULATED_WAITING_TIME,)
+
+    def _current(self):
+        vehicle, wait = self._trace._ragged("wait_vehicle", "wait_time")
+        ids = self._trace.vehicle_ids
+        return {ids[v]: w for v, w in zip(vehicle.tolist(), wait.tolist())}
+
+    def getIDList(self):
+        return tuple(self._current())
+
+    def getAccumulatedWaitingTime(self, veh):
+        return self._current()[veh]
+
+    def getAllSubscriptionResults(self):
+        vehicle, wait = self._trace._ragged("wait_vehicle", "wait_time")
+        ids = self._trace.vehicle_ids
+        subscribed = self._subscriptions
+        results = {}
+        for v, w in zip(vehicle.tolist(), wait.tolist()):
+            veh = ids[v]
+            if veh in subscribed:
+                results[veh] = {VAR_ACCUMULATED_WAITING_TIME: w}
+        return results
+
+
+class _ReplaySimulation:
+    def __init__(self, trace):
+        self._trace = trace
+        self._vars = ()
+
+    def subscribe(self, var_ids):
+        for var in var_ids:
+            if var not in (VAR_DEPARTED_VEHICLES_IDS, VAR_TELEPORT_STARTING_VEHICLES_NUMBER):
+                raise KeyError(f"trace does not record simulation variable {var:#x}")
+        self._vars = tuple(var_ids)
+
+    def getStartingTeleportNumber(self):
+        return int(self._trace._row("teleports"))
+
+    def getDepartedIDList(self):
+        ids = self._trace.vehicle_ids
+        return tuple(ids[v] for v in self._trace._ragged("departed")[0].tolist())
+
+    def getSubscriptionResults(self):
+        results = {}
+        if VAR_DEPARTED_VEHICLES_IDS in self._vars:
+            results[VAR_DEPARTED_VEHICLES_IDS] = self.getDepartedIDList()
+        if VAR_TELEPORT_STARTING_VEHICLES_NUMBER in self._vars:
+            results[VAR_TELEPORT_STARTING_VEHICLES_NUMBER] = self.getStartingTeleportNumber()
+        return results
+
+
+class _ReplayTrafficLight(_ReplayDomain):
+    _variables = (TL_CURRENT_PHASE,)
+
+    def getIDList(self):
+        return self._trace.tls_ids
+
+    def getControlledLanes(self, tls):
+        return tuple(self._trace.header["controlled_lanes"][tls])
+
+    def getAllProgramLogics(self, tls):
+        program = self._trace.header["programs"][tls]
+        phases = [SimpleNamespace(state=state, duration=duration) for state, duration in program["phases"]]
+        return [SimpleNamespace(programID=program["program_id"], phases=phases)]
+
+    def getPhase(self, tls):
+        return self._trace._phase(tls)
+
+    def setPhase(self, tls, phase):
+        self._trace.set_phases[tls] = phase
+
+    def getAllSubscriptionResults(self):
+        return {tls: {TL_CURRENT_PHASE: self._trace._phase(tls)} for tls in self._subscriptions}
+
+
+class TraceReplay:
+    def __init__(self, path, phases="recorded"):
+        if not is_trace_dir(path):
+            raise ValueError(f"{path} is not a trace directory")
+        if phases not in ("recorded", "controlled"):
+            raise ValueError(f"unknown phases mode {phases!r}")
+        with open(os.path.join(path, "trace.json")) as f:
+            self.header = json.load(f)
+        if self.header["version"] != TRACE_VERSION:
+            raise ValueError(f"unsupported trace version {self.header['version']}")
+
+        self.path = path
+        self.phases = phases
+        self.steps = self.header["steps"]
+        self.chunk_steps = self.header["chunk_steps"]
+        self.tls_ids = tuple(self.header["tls_ids"])
+        self._tls_column = {tls: k for k, tls in enumerate(self.tls_ids)}
+
+        vehicles = os.path.join(path, "vehicles.txt")
+        if os.path.exists(vehicles):
+            with open(vehicles) as f:
+                self.vehicle_ids = f.read().splitlines()
+        else:
+            self.vehicle_ids = []
+
+        self._reset()
+
+    def _reset(self):
+        self.time = 0
+        self.set_phases = {}
+        self._chunk_index = -1
+        self._chunk = None
+        self._r = 0
+
+        self.simulation = _ReplaySimulation(self)
+        self.vehicle = _ReplayVehicle(self)
+        self.edge = _ReplayHalting(self, self.header["edges"], "edge_halting")
+        self.lane = _ReplayHalting(self, self.header["lanes"], "lane_halting")
+        self.trafficlight = _ReplayTrafficLight(self)
+
+    # ----------------------------
+    # Connection lifecycle
+    # ----------------------------
+
+    def start(self, cmd, label="default", **kwargs):
+        # the command (config, seed, ...) is ignored: the traffic is the
+        # recorded one
+        self.cmd = list(cmd)
+        self._reset()
+
+    def close(self):
+        self._chunk = None
+
+    def simulationStep(self, *args):
+        if self.time >= self.steps:
+            raise ValueError(f"trace {self.path} ends after {self.steps} steps")
+        k, self._r = divmod(self.time, self.chunk_steps)
+        if k != self._chunk_index:
+            self._load_chunk(k)
+        self.time += 1
+
+    def _load_chunk(self, k):
+        chunk = _chunk_dir(self.path, k)
+        self._chunk = {
+            name[:-4]: np.load(os.path.join(chunk, name), mmap_mode="r")
+            for name in os.listdir(chunk)
+        }
+        self._chunk_index = k
+
+    # ----------------------------
+    # Values of the current step
+    # ----------------------------
+
+    def _row(self, name):
+        if self._chunk is None:
+            raise ValueError("no step replayed yet; call simulationStep() first")
+        return self._chunk[name][self._r]
+
+    def _ragged(self, *names):
+        # this step's slice of ragged arrays sharing one offsets array
+        offsets = self._chunk[names[0].split("_")[0] + "_offsets"]
+        start, end = offsets[self._r], offsets[self._r + 1]
+        return tuple(self._chunk[name][start:end] for name in names)
+
+    def _phase(self, tls):
+        if self.phases == "controlled" and tls in self.set_phases:
+            return self.set_phases[tls]
+        if self._chunk is None:
+            return 0
+        return int(self._row("phase")[self._tls_column[tls]])
+
+
+# ============================================================
+# ENTRY
+# ============================================================
+if __name__ == "__main__":
+    from sumo_fixed_eval import run_fixed_gui
+
+    print("Recording fixed-time run to traces/fixed ...")
+    live = run_fixed_gui("./sumo/intersection.sumocfg", steps=2000, conn=TraceRecorder("traces/fixed"), profile="fast", seed=0)
+    replay = run_fixed_gui("./sumo/intersection.sumocfg", steps=2000, conn=TraceReplay("traces/fixed"))
+
+    print("Live:  ", live)
+    print("Replay:", replay)
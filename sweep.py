@@ -0,0 +1,151 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from marl_trainer import MARLTrainer
+from batched_q_learner import BatchedQLearner
+
+
+#          PARALLEL HYPERPARAMETER SWEEPS
+#
+# Each configuration trains its own MARLTrainer in a worker process.
+# Worker seeds are spawned from one root SeedSequence, so a sweep is
+# reproducible regardless of how many workers run it or in what order
+# the jobs finish. Workers send back the stacked Q-table array (a single
+# contiguous buffer) instead of a pickled dict of agent objects.
+
+SWEEP_KEYS = ("global_reward_weight", "alpha", "gamma", "epsilon_decay")
+
+
+def make_grid(**values):
+    # make_grid(alpha=[0.1, 0.2], epsilon_decay=[0.99]) → list of configs
+    keys = list(values)
+    return [dict(zip(keys, combo)) for combo in itertools.product(*values.values())]
+
+
+def _train_one(job):
+    config, seed, n_agents, episodes, max_steps, eval_episodes, warm, replay, metrics_path = job
+
+    trainer = MARLTrainer(
+        n_agents=n_agents,
+        episodes=episodes,
+        max_steps=max_steps,
+        alpha=config.get("alpha", 0.1),
+        gamma=config.get("gamma", 0.99),
+        epsilon_decay=config.get("epsilon_decay", 0.995),
+        batched=True,
+        seed=seed,
+        verbose=False,
+        metrics_path=metrics_path,
+        **(replay or {})
+    )
+    trainer.env.global_reward_weight = config.get("global_reward_weight", 0.25)
+
+    if warm is not None:
+        # continue from a previous result's Q-tables and epsilons
+        agents = agents_from_result(warm)
+        for i, agent in agents.items():
+            agent.epsilon = float(warm["epsilon"][i])
+        trainer.warm_start(agents)
+
+    trainer.train()
+    train_tail = float(np.mean(list(trainer.episode_rewards)[-min(20, episodes):]))
+
+    eval_rewards = trainer.evaluate(episodes=eval_episodes, rewards_path=None)
+
+    learner = trainer.learner
+    return {
+        "config": config,
+        "seed": seed,
+        "eval_reward": float(np.mean(eval_rewards)),
+        "eval_std": float(np.std(eval_rewards)),
+        "train_reward": train_tail,
+        "q": learner.q,
+        "visited": learner.visited,
+        "epsilon": learner.epsilon,
+        "discretizer": learner.discretizer,
+    }
+
+
+def run_sweep(
+    configs,
+    root_seed=0,
+    n_agents=4,
+    episodes=300,
+    max_steps=200,
+    eval_episodes=5,
+    max_workers=None,
+    warm_start=None,
+    replay=None,
+    metrics_dir=None
+):
+    # returns results ranked best-first by mean evaluation reward;
+    # warm_start=<earlier result> starts every config from its agents;
+    # replay: MARLTrainer replay_* keyword arguments for every job;
+    # metrics_dir: each job streams its training log to
+    # <metrics_dir>/<config_label>.bin (for plot_training.py overlays)
+    seeds = [
+        int(s.generate_state(1)[0])
+        for s in np.random.SeedSequence(root_seed).spawn(len(configs))
+    ]
+    if metrics_dir is not None:
+        os.makedirs(metrics_dir, exist_ok=True)
+    jobs = [
+        (
+            dict(config), seed, n_agents, episodes, max_steps, eval_episodes, warm_start, replay,
+            None if metrics_dir is None else os.path.join(metrics_dir, config_label(config) + ".bin")
+        )
+        for config, seed in zip(configs, seeds)
+    ]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(_train_one, jobs))
+
+    results.sort(key=lambda r: r["eval_reward"], reverse=True)
+    return results
+
+
+def config_label(config):
+    # "alpha=0.1_gamma=0.99": file name / legend label of a configuration
+    return "_".join(f"{k}={v}" for k, v in config.items())
+
+
+def agents_from_result(result):
+    # rebuild QLearningAgents (evaluation mode) from a sweep result
+    config = result["config"]
+    n_agents = result["q"].shape[0]
+    learner = BatchedQLearner(
+        n_agents=n_agents,
+        discretizer=result["discretizer"],
+        action_size=result["q"].shape[2],
+        alpha=config.get("alpha", 0.1),
+        gamma=config.get("gamma", 0.99),
+        epsilon=0.0,
+        epsilon_decay=config.get("epsilon_decay", 0.995),
+        dtype=result["q"].dtype
+    )
+    learner.q[:] = result["q"]
+    learner.visited[:] = result["visited"]
+    return learner.to_agents()
+
+
+def format_results(results):
+    header = ["rank"] + list(SWEEP_KEYS) + ["seed", "eval_reward", "eval_std", "train_reward"]
+    lines = [" | ".join(f"{h:>20s}" for h in header)]
+    for rank, r in enumerate(results):
+        row = [str(rank)]
+        row += [str(r["config"].get(k, "-")) for k in SWEEP_KEYS]
+        row += [str(r["seed"]), f"{r['eval_reward']:.2f}", f"{r['eval_std']:.2f}", f"{r['train_reward']:.2f}"]
+        lines.append(" | ".join(f"{c:>20s}" for c in row))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    grid = make_grid(
+        global_reward_weight=[0.1, 0.25, 0.4],
+        alpha=[0.05, 0.1, 0.2],
+        epsilon_decay=[0.99, 0.995],
+    )
+    results = run_sweep(grid, root_seed=0, episodes=300, metrics_dir="sweep_logs")
+    print(format_results(results))
@@ -0,0 +1,54 @@
+import numpy as np
+from multi_intersection_env import MultiIntersectionEnv
+
+# The vectorized env must replay the scalar envs exactly: same seeds and
+# actions give the same observations and rewards (values and types), and
+# lockstep copy 0 matches too.
+
+STEPS = 300
+
+
+def rollout(steps=STEPS, **kwargs):
+    env = MultiIntersectionEnv(n=4, seed=7, **kwargs)
+    actions = np.random.default_rng(0).integers(0, 2, size=(steps, 4))
+    trace = [env.reset()]
+    for a in actions:
+        states, rewards, _ = env.step(dict(enumerate(a.tolist())))
+        trace.append((states, rewards))
+    return trace
+
+
+def assert_same(scalar, batch):
+    assert scalar[0] == batch[0]
+    for t, ((s_states, s_rewards), (b_states, b_rewards)) in enumerate(zip(scalar[1:], batch[1:])):
+        assert s_states == b_states, f"step {t}: observations differ"
+        assert s_rewards == b_rewards, f"step {t}: rewards differ"
+        assert all(type(s_rewards[i]) is type(b_rewards[i]) for i in s_rewards), f"step {t}: reward types differ"
+
+
+def test_batch_matches_scalar():
+    for scenario in (None, "rush_hour"):
+        for mixing in (None, "1hop"):
+            assert_same(
+                rollout(scenario=scenario, reward_mixing=mixing),
+                rollout(scenario=scenario, reward_mixing=mixing, vectorized=True),
+            )
+
+
+def test_lockstep_copy_matches_scalar():
+    scalar = rollout()
+    env = MultiIntersectionEnv(n=4, seed=7, num_envs=3)
+    actions = np.random.default_rng(0).integers(0, 2, size=(STEPS, 4))
+    obs = env.reset_batch()
+    assert [tuple(o) for o in obs[0]] == list(scalar[0].values())
+    for t, a in enumerate(actions):
+        obs, rewards, _ = env.step_batch(np.tile(a, (3, 1)))
+        states, expected = scalar[t + 1]
+        assert [tuple(o) for o in obs[0]] == list(states.values()), f"step {t}: observations differ"
+        assert rewards[0].tolist() == list(expected.values()), f"step {t}: rewards differ"
+
+
+if __name__ == "__main__":
+    test_batch_matches_scalar()
+    test_lockstep_copy_matches_scalar()
+    print("batch env matches the scalar env")
@@ -0,0 +1,31 @@
+import numpy as np
+from marl_trainer import MARLTrainer
+
+# Replayed minibatches hit the same weights many times from one stale
+# estimate; summing those steps makes a large alpha diverge. With the
+# steps averaged per cell the weights stay on the scale of the returns.
+
+
+def max_weight(**kwargs):
+    trainer = MARLTrainer(episodes=40, max_steps=100, alpha=0.5, seed=0, verbose=False, **kwargs)
+    trainer.train()
+    return max(
+        float(np.abs(agent.weights if kwargs.get("agent_type") == "linear" else agent.q_dense).max())
+        for agent in trainer.agents.values()
+    )
+
+
+def test_linear_replay_stays_bounded():
+    assert max_weight(agent_type="linear", replay_capacity=5000) < 1e3
+
+
+def test_dense_replay_stays_bounded():
+    assert max_weight(dense_q=True, replay_capacity=5000) < 1e3
+
+
+if __name__ == "__main__":
+    for name, kwargs in [
+        ("linear + replay", dict(agent_type="linear", replay_capacity=5000)),
+        ("dense + replay", dict(dense_q=True, replay_capacity=5000)),
+    ]:
+        print(f"{name}: max |weight| = {max_weight(**kwargs):.2f}")
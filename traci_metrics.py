@@ -0,0 +1,123 @@
+import numpy as np
+
+
+# ============================================================
+# SUBSCRIPTION-BASED METRIC COLLECTION
+# ============================================================
+# Every value the evaluators need each step is fetched through TraCI
+# variable subscriptions, so one simulationStep() brings back all of it
+# instead of one socket round trip per vehicle / edge / lane.
+
+# TraCI variable ids (same values as traci.constants; fixed by the protocol)
+LAST_STEP_VEHICLE_HALTING_NUMBER = 0x14
+VAR_ACCUMULATED_WAITING_TIME = 0x87
+VAR_DEPARTED_VEHICLES_IDS = 0x74
+VAR_TELEPORT_STARTING_VEHICLES_NUMBER = 0x75
+TL_CURRENT_PHASE = 0x28
+
+
+class SubscriptionMetrics:
+    def __init__(self, conn, tls_ids=(), controlled_lanes=None):
+        # controlled_lanes: {tls: lanes} when already known (e.g. from
+        # net_loader), else queried over TraCI
+        self.conn = conn
+
+        # simulation-level: departures (to subscribe new vehicles) + teleports
+        conn.simulation.subscribe([
+            VAR_DEPARTED_VEHICLES_IDS,
+            VAR_TELEPORT_STARTING_VEHICLES_NUMBER
+        ])
+
+        # halting count on every edge, for the network-wide queue
+        for edge in conn.edge.getIDList():
+            conn.edge.subscribe(edge, [LAST_STEP_VEHICLE_HALTING_NUMBER])
+
+        # controlled lanes are static: query once, subscribe each lane once
+        # (the per-TLS lists keep duplicates, one entry per controlled link)
+        if controlled_lanes is None:
+            self.controlled_lanes = {
+                tls: tuple(conn.trafficlight.getControlledLanes(tls))
+                for tls in tls_ids
+            }
+        else:
+            self.controlled_lanes = {tls: tuple(controlled_lanes[tls]) for tls in tls_ids}
+        for lane in {l for lanes in self.controlled_lanes.values() for l in lanes}:
+            conn.lane.subscribe(lane, [LAST_STEP_VEHICLE_HALTING_NUMBER])
+
+        # current phase of every TLS (read by the controller each step)
+        for tls in tls_ids:
+            conn.trafficlight.subscribe(tls, [TL_CURRENT_PHASE])
+
+        self.total_wait = 0.0
+        self.total_queue = 0
+        self.teleport_count = 0
+        self.prev_wait = {}
+        self.lane_halting = {}
+        self.tls_phase = {}
+
+    def step(self):
+        # call once after every simulationStep()
+        conn = self.conn
+
+        sim = conn.simulation.getSubscriptionResults()
+        self.teleport_count += sim[VAR_TELEPORT_STARTING_VEHICLES_NUMBER]
+
+        for veh in sim[VAR_DEPARTED_VEHICLES_IDS]:
+            conn.vehicle.subscribe(veh, [VAR_ACCUMULATED_WAITING_TIME])
+
+        # waiting time: accumulate per-vehicle increments; vehicles that
+        # left the network drop out of the results (and of prev_wait)
+        prev_wait = self.prev_wait
+        wait = {}
+        total = 0.0
+        for veh, values in conn.vehicle.getAllSubscriptionResults().items():
+            w = values[VAR_ACCUMULATED_WAITING_TIME]
+            total += w - prev_wait.get(veh, 0)
+            wait[veh] = w
+        self.total_wait += total
+        self.prev_wait = wait
+
+        self.total_queue += sum(
+            values[LAST_STEP_VEHICLE_HALTING_NUMBER]
+            for values in conn.edge.getAllSubscriptionResults().values()
+        )
+
+        self.lane_halting = conn.lane.getAllSubscriptionResults()
+        if self.controlled_lanes:
+            self.tls_phase = conn.trafficlight.getAllSubscriptionResults()
+
+    def tls_queue(self, tls):
+        # halting vehicles on the TLS's controlled lanes (current step)
+        lane_halting = self.lane_halting
+        return sum(
+            lane_halting[lane][LAST_STEP_VEHICLE_HALTING_NUMBER]
+            for lane in self.controlled_lanes[tls]
+        )
+
+    def lane_queue(self, lanes):
+        # halting vehicles summed over the given (subscribed) lanes
+        lane_halting = self.lane_halting
+        return sum(lane_halting[lane][LAST_STEP_VEHICLE_HALTING_NUMBER] for lane in lanes)
+
+    def lane_halting_array(self, lanes):
+        # halting vehicles of the given (subscribed) lanes, as an array
+        lane_halting = self.lane_halting
+        return np.fromiter(
+            (lane_halting[lane][LAST_STEP_VEHICLE_HALTING_NUMBER] for lane in lanes),
+            dtype=np.int64, count=len(lanes)
+        )
+
+    def phase_array(self, tls_ids):
+        # current phase of each TLS, as an array
+        tls_phase = self.tls_phase
+        return np.fromiter(
+            (tls_phase[tls][TL_CURRENT_PHASE] for tls in tls_ids),
+            dtype=np.int64, count=len(tls_ids)
+        )
+
+    def results(self, steps):
+        return {
+            "avg_wait": self.total_wait / steps,
+            "avg_queue": self.total_queue / steps,
+            "teleportations": self.teleport_count
+        }
@@ -2,6 +2,8 @@ import numpy as np
 import pickle
 from gymnasium import Env
 from gymnasium.spaces import Discrete, Box
+from rng_streams import BlockStream, make_generator
+from scenarios import get_scenario
 
 
 #                TRAFFIC ENVIRONMENT
@@ -10,7 +12,7 @@ class TrafficIntersectionEnv(Env):
     metadata = {"render_modes": []}
     def _get_obs(self):
         return np.array([self.queue_NS, self.queue_EW, self.phase], dtype=np.int32)
-    def __init__(self):
+    def __init__(self, seed=None, scenario=None, column=0):
         super().__init__()
 
         # Action = “Should I switch?”
@@ -47,10 +49,31 @@ class TrafficIntersectionEnv(Env):
         self.arrival_rate_EW = 0.1
         self.pass_rate = 2
 
+        # arrivals come from this env's own generator (self.np_random),
+        # pre-drawn in blocks: one (NS, EW) uniform pair per step; unseeded
+        # envs draw from gymnasium's default (entropy-seeded) np_random
+        if seed is not None:
+            self.seed_stream(seed)
+        else:
+            self._arrivals = BlockStream(self.np_random, 2)
+
+        # optional time-varying demand (scenarios.py), column of this env;
+        # replaces the constant arrival rates above
+        self.scenario = get_scenario(scenario)
+        self._demand = self.scenario.column(column) if self.scenario is not None else None
+        self.demand_t = 0
+
+    def seed_stream(self, seed):
+        # seed: int or SeedSequence (e.g. a child spawned from a root seed)
+        self.np_random = make_generator(seed)
+        self._arrivals = BlockStream(self.np_random, 2)
 
 
     def reset(self, seed=None, options=None):
         super().reset(seed=seed)
+        if seed is not None:
+            self._arrivals = BlockStream(self.np_random, 2)
+            self.demand_t = 0
         self.queue_NS = 0
         self.queue_EW = 0
         self.phase = 0
@@ -113,10 +136,17 @@ class TrafficIntersectionEnv(Env):
         # ----------------------------
 
         # spawn vehicles
-        if np.random.rand() < self.arrival_rate_NS:
-            self.queue_NS += 1
-        if np.random.rand() < self.arrival_rate_EW:
-            self.queue_EW += 1
+        u_ns, u_ew = self._arrivals.next()
+        if self._demand is None:
+            if u_ns < self.arrival_rate_NS:
+                self.queue_NS += 1
+            if u_ew < self.arrival_rate_EW:
+                self.queue_EW += 1
+        else:
+            base_ns, base_ew, p_ns, p_ew = self._demand[self.demand_t % len(self._demand)]
+            self.queue_NS += base_ns + (u_ns < p_ns)
+            self.queue_EW += base_ew + (u_ew < p_ew)
+            self.demand_t += 1
 
         # vehicles pass ONLY during green
         if self.phase == 0:      # NS green
@@ -1,14 +1,33 @@
+import os
+
 from marl_trainer import MARLTrainer
-import pickle
+from checkpoint import save_agents, save_policy
+from instrumentation import Profiler
 
 if __name__ == "__main__":
+    # MARL_PROFILE=1 python train.py → stage timings + Chrome trace
+    profiler = Profiler(trace=True) if os.environ.get("MARL_PROFILE") else None
+
     trainer = MARLTrainer(
         n_agents=4,
         episodes=1000,
-        max_steps=200
+        max_steps=200,
+        profiler=profiler,
+        metrics_path="training_metrics.bin",
+        # a preempted run picks up from its newest checkpoint
+        checkpoint_dir="train_checkpoints",
+        checkpoint_every=50,
+        resume=True
     )
 
     trainer.train()
+
+    if profiler is not None:
+        print(profiler.report())
+        profiler.export_json("train_profile.json")
+        profiler.export_chrome_trace("train_trace.json")
+
     trainer.evaluate(episodes=5)
-    with open("trained_agents.pkl", "wb") as f:
-        pickle.dump(trainer.agents, f)
+    save_agents(trainer.agents, "trained_agents")
+    # frozen greedy export for evaluation (memory-mappable, read-only)
+    save_policy(trainer.export_policy(), "trained_policy")